@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for the validate-and-upload pipeline. Each result is printed as one JSON line.
+
+    python3 bench.py memory --sizes 10000,100000,1000000
+    python3 bench.py merge --size 1000000
+    python3 bench.py farm --fast 200 --slow 50 --blackhole 50 --refused 50 --liar 50
+    python3 bench.py query --size 100000 --clients 8 --seconds 10
+    python3 bench.py parse --size 1000000
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import http.client
+
+FARM_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "proxy_farm.py")
+QUERY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_service.py")
+FARM_BEHAVIOURS = ("fast", "slow", "blackhole", "refused", "liar", "flaky")
+
+TYPES = ["http", "https"]
+ANONYMITIES = ["transparent", "anonymous", "high_anonymous"]
+COUNTRIES = ["CN", "US", "DE", "RU", "BR", "IN", "--"]
+
+
+def synthetic_proxy(rng, host_space=2 ** 24):
+    """One getproxy-style record; a small host space produces realistic duplicates"""
+    host_id = rng.randrange(host_space)
+    proxy = {
+        "type": rng.choice(TYPES),
+        "host": f"10.{host_id >> 16 & 255}.{host_id >> 8 & 255}.{host_id & 255}",
+        "port": rng.choice([80, 3128, 8080, 8888, 1080]),
+        "anonymity": rng.choice(ANONYMITIES),
+        "country": rng.choice(COUNTRIES),
+        "response_time": round(rng.uniform(0.1, 5.0), 2),
+        "from": "synthetic",
+    }
+    if rng.random() < 0.5:
+        proxy["export_address"] = [proxy["host"]]
+    return proxy
+
+
+def write_synthetic_file(path, count, seed=0):
+    """Write count synthetic JSON lines to path"""
+    rng = random.Random(seed)
+    host_space = max(count // 2, 1)
+    with open(path, 'w') as f:
+        for _ in range(count):
+            f.write(json.dumps(synthetic_proxy(rng, host_space)) + '\n')
+
+
+def emit(result):
+    print(json.dumps(result), flush=True)
+
+
+def _memory_run(impl, path, out_dir):
+    """Run the non-network pipeline stages once; validation is the identity (all proxies pass)"""
+    import validate_and_upload as vu
+
+    tracemalloc.start()
+    start = time.time()
+    if impl == "legacy":
+        with open(path, 'r') as f:
+            new_proxies = vu.parse_json_lines(f.read())
+        merged = vu.merge_proxies([], new_proxies)
+        outputs = (vu.generate_proxyinfo_json(merged), vu.generate_proxyinfo_txt(merged), vu.generate_db_json(merged))
+        count = len(merged)
+    else:
+        with open(path, 'r') as f:
+            count = vu.write_outputs(vu.iter_merged(iter([]), vu.iter_json_lines(f)), out_dir)
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    return {
+        "written": count,
+        "seconds": round(elapsed, 3),
+        "peak_traced_mb": round(peak / 2 ** 20, 2),
+        "max_rss_mb": round(max_rss / 2 ** 10, 2),
+    }
+
+
+def legacy_merge_proxies(existing_proxies, new_proxies):
+    """merge_proxies as it was before ProxyIndex: string key and json.dumps size comparison"""
+    merged = {}
+    for proxy in existing_proxies + new_proxies:
+        key = f"{proxy.get('host')}:{proxy.get('port')}:{proxy.get('type', 'http')}"
+        if key not in merged or len(json.dumps(proxy)) > len(json.dumps(merged[key])):
+            merged[key] = proxy
+    return list(merged.values())
+
+
+def _stream_merge(existing, new, memory_records=None):
+    """iter_merged as validate_and_write runs it, with its progress lines silenced"""
+    import validate_and_upload as vu
+
+    if memory_records is None:
+        memory_records = vu.MERGE_MEMORY_RECORDS
+
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return list(vu.iter_merged(iter(existing), iter(new), memory_records=memory_records))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+
+def bench_merge(size, repeat=3, overlap=0.5):
+    """
+    Best-of-repeat wall time of the legacy merge, the in-memory ProxyIndex (merge_proxies,
+    used by the daemon), the iter_merged the cron pipeline runs (in memory up to
+    MERGE_MEMORY_RECORDS) and iter_merged forced onto its on-disk spool, on size
+    synthetic records.
+    overlap is the share of new records that re-list an existing proxy, as happens
+    when getproxy re-scrapes proxies already published in ip_ports.
+    """
+    import validate_and_upload as vu
+
+    rng = random.Random(0)
+    existing = [synthetic_proxy(rng) for _ in range(size // 2)]
+    new = []
+    for _ in range(size - len(existing)):
+        if existing and rng.random() < overlap:
+            proxy = dict(rng.choice(existing), country=rng.choice(COUNTRIES))
+        else:
+            proxy = synthetic_proxy(rng)
+        new.append(proxy)
+
+    timings = {}
+    impls = (("legacy", legacy_merge_proxies), ("index", vu.merge_proxies), ("stream", _stream_merge),
+             ("spool", lambda existing, new: _stream_merge(existing, new, memory_records=0)))
+    for impl, merge in impls:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            merged = merge(existing, new)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[impl] = best
+        emit({"bench": "merge", "impl": impl, "size": size, "overlap": overlap,
+              "unique": len(merged), "seconds": round(best, 3)})
+    emit({"bench": "merge", "size": size, "overlap": overlap,
+          "speedup": round(timings["legacy"] / timings["index"], 2),
+          "stream_speedup": round(timings["legacy"] / timings["stream"], 2),
+          "spool_speedup": round(timings["legacy"] / timings["spool"], 2)})
+
+
+def legacy_parse_json_lines(content):
+    """parse_json_lines as it was before jsonl.py: split the whole string, json.loads per line"""
+    proxies = []
+    for line in content.strip().split('\n'):
+        line = line.strip()
+        if line:
+            try:
+                proxies.append(json.loads(line))
+            except:
+                pass
+    return proxies
+
+
+def bench_parse(size, repeat=3, malformed=0.001, processes=None):
+    """
+    Best-of-repeat wall time to load a size-line candidate file: the legacy string parser
+    vs jsonl.iter_file in-process and in worker processes, with each available backend.
+    A malformed share of lines is corrupted to check they are counted, not just dropped.
+    """
+    import jsonl
+    from metrics import metrics
+
+    processes = processes or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "proxy.list.out")
+        rng = random.Random(0)
+        corrupted = 0
+        with open(path, 'w') as f:
+            for _ in range(size):
+                line = json.dumps(synthetic_proxy(rng, max(size // 2, 1)))
+                if rng.random() < malformed:
+                    line = line[:len(line) // 2]
+                    corrupted += 1
+                f.write(line + '\n')
+        file_mb = round(os.path.getsize(path) / 2 ** 20, 1)
+
+        def legacy():
+            with open(path, 'r') as f:
+                return len(legacy_parse_json_lines(f.read()))
+
+        def loader(workers):
+            def run():
+                return sum(1 for _ in jsonl.iter_file(path, processes=workers))
+            return run
+
+        runs = [("legacy", "json", 1, legacy)]
+        for backend in ("json", "orjson") if jsonl.orjson is not None else ("json",):
+            for workers in sorted({1, processes}):
+                runs.append(("jsonl", backend, workers, loader(workers)))
+
+        timings = {}
+        real_stdout = sys.stdout
+        jsonl.PARALLEL_PARSE_MIN_BYTES = 0  # Let the processes count decide, whatever the file size
+        for impl, backend, workers, run in runs:
+            jsonl.FAST_JSON = backend == "orjson"
+            metrics.reset()
+            best = None
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    count = run()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+            finally:
+                sys.stdout.close()
+                sys.stdout = real_stdout
+            timings[(impl, backend, workers)] = best
+            emit({"bench": "parse", "impl": impl, "backend": backend, "processes": workers, "size": size,
+                  "file_mb": file_mb, "records": count,
+                  "malformed_reported": metrics.value("parse_malformed_lines_total", source="proxy.list.out") // repeat
+                  if impl == "jsonl" else None,
+                  "malformed_written": corrupted, "seconds": round(best, 3),
+                  "lines_per_sec": round(size / best)})
+        baseline = timings[("legacy", "json", 1)]
+        emit({"bench": "parse", "size": size, "speedup": {f"{impl}-{backend}-x{workers}": round(baseline / seconds, 2)
+                                                          for (impl, backend, workers), seconds in timings.items()
+                                                          if impl != "legacy"}})
+
+
+def bench_memory(sizes):
+    """Peak traced memory of the legacy in-memory pipeline vs the streaming one, per input size"""
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"candidates-{size}.jsonl")
+            write_synthetic_file(path, size)
+            for impl in ("legacy", "stream"):
+                # Fresh interpreter per run so peaks do not leak between measurements
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "_memory-run", impl, path, os.path.join(tmp, "out")],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                result.update({"bench": "memory", "impl": impl, "size": size})
+                emit(result)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list; None when empty"""
+    if not ordered:
+        return None
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def _instrument_probes(vu, latencies):
+    """Wrap the thread and async probe functions so every probe's wall time is recorded"""
+    test_proxy, async_test_proxy = vu.test_proxy, vu.async_test_proxy
+
+    def timed_test_proxy(proxy):
+        start = time.perf_counter()
+        try:
+            return test_proxy(proxy)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    async def timed_async_test_proxy(proxy, semaphore, ssl_context=None):
+        start = time.perf_counter()
+        try:
+            return await async_test_proxy(proxy, semaphore, ssl_context)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    def restore():
+        vu.test_proxy, vu.async_test_proxy = test_proxy, async_test_proxy
+
+    vu.test_proxy, vu.async_test_proxy = timed_test_proxy, timed_async_test_proxy
+    return restore
+
+
+def _publish(vu, github, valid, out_dir):
+    """Download, merge, write and commit the outputs once; returns seconds and mock API call counts"""
+    calls_before, requests_before = dict(github.calls), github.requests
+    start = time.perf_counter()
+    existing = vu.get_contents("parserpp", "ip_ports", ["/proxyinfo.json"], "bench")["/proxyinfo.json"]
+    merged = vu.iter_merged(vu.iter_json_lines(io.StringIO(existing)), iter(valid))
+    vu.write_outputs(vu.iter_sorted(merged), out_dir)
+    files = {name: vu.read_output(name, out_dir) for name in vu.output_names()}
+    commit_sha = vu.commit_files("parserpp", "ip_ports", files, "bench", "bench")
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "committed": bool(commit_sha),
+        "api_requests": github.requests - requests_before,
+        "api_calls": {call: count - calls_before.get(call, 0) for call, count in github.calls.items()
+                      if count != calls_before.get(call, 0)},
+    }
+
+
+def bench_farm(counts, modes, slow_delay, per_network=0):
+    """
+    Validate a local proxy farm (see proxy_farm.py) in each mode, then run the merge/write/commit
+    stages against mock_github twice: once into an empty repo and once with unchanged data.
+    The farm runs in its own process so it competes with neither the GIL nor the RSS figure.
+    """
+    import mock_github
+
+    github = mock_github.serve()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Endpoints are read at import time, so point them at the mocks before importing the pipeline
+        os.environ["GITHUB_API_URL"] = github.url
+        os.environ["GITHUB_CACHE_DIR"] = os.path.join(tmp, "cache")
+        os.environ.setdefault("JUDGE_URLS", "http://judge.farm.invalid/get")
+        import validate_and_upload as vu
+
+        farm_path = os.path.join(tmp, "farm.jsonl")
+        command = [sys.executable, FARM_SCRIPT, "--output", farm_path, "--slow-delay", str(slow_delay),
+                   "--per-network", str(per_network)]
+        for behaviour in FARM_BEHAVIOURS:
+            command += [f"--{behaviour}", str(counts[behaviour])]
+        farm = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        try:
+            if "ready" not in farm.stdout.readline():
+                raise RuntimeError("proxy farm failed to start")
+            with open(farm_path, 'r') as f:
+                candidates = vu.parse_json_lines(f.read())
+
+            for mode in modes:
+                latencies = []
+                network_before = vu.networks.counters()
+                restore = _instrument_probes(vu, latencies)
+                real_stdout = sys.stdout
+                sys.stdout = open(os.devnull, 'w')
+                try:
+                    start = time.perf_counter()
+                    valid = vu.validate_proxies(candidates, mode=mode)
+                    elapsed = time.perf_counter() - start
+                    first = _publish(vu, github, valid, os.path.join(tmp, "out"))
+                    repeat = _publish(vu, github, valid, os.path.join(tmp, "out"))
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = real_stdout
+                    restore()
+
+                # Reset the repo so every mode publishes into the same starting state
+                with github.lock:
+                    github.files.clear()
+                latencies.sort()
+                valid_by_behaviour = {behaviour: 0 for behaviour in FARM_BEHAVIOURS}
+                for proxy in valid:
+                    valid_by_behaviour[proxy["from"][len("farm-"):]] += 1
+                result = {
+                    "bench": "farm", "mode": mode, "candidates": len(candidates), "farm": counts,
+                    "slow_delay": slow_delay, "valid": len(valid), "valid_by_behaviour": valid_by_behaviour,
+                    "seconds": round(elapsed, 3),
+                    "proxies_per_sec": round(len(candidates) / elapsed, 1),
+                    "probes": len(latencies),
+                }
+                for fraction in (0.50, 0.95, 0.99):
+                    value = percentile(latencies, fraction)
+                    result[f"probe_p{round(fraction * 100)}"] = None if value is None else round(value, 4)
+                result.update({
+                    "stages": {stage: dict(counter) for stage, counter in vu.stage_counters.items()},
+                    "network_throttle": {name: value - network_before[name]
+                                         for name, value in vu.networks.counters().items()},
+                    "publish_first": first,
+                    "publish_repeat": repeat,
+                    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 2),
+                })
+                emit(result)
+        finally:
+            farm.terminate()
+            farm.wait()
+    github.shutdown()
+
+
+def _query_paths(rng):
+    """A mix of the queries a consumer sends: filtered top-N and random picks"""
+    params = []
+    if rng.random() < 0.7:
+        params.append(f"type={rng.choice(TYPES)}")
+    if rng.random() < 0.5:
+        params.append(f"anonymity={rng.choice(ANONYMITIES)}")
+    if rng.random() < 0.3:
+        params.append(f"country={rng.choice(COUNTRIES)}")
+    if rng.random() < 0.5:
+        params.append(f"max_latency={rng.choice([0.5, 1, 3])}")
+    if rng.random() < 0.5:
+        return "/random?" + "&".join(params)
+    return "/top?" + "&".join(params + [f"limit={rng.choice([1, 10, 50])}"])
+
+
+def bench_query(size, clients, seconds, reload_at=0.5):
+    """
+    In-process index speed, then requests/sec of query_service.py under clients
+    keep-alive connections; the source file is replaced after reload_at of the run to
+    check that readers keep being served across the hot swap.
+    """
+    import query_service
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "proxyinfo.json")
+        write_synthetic_file(source, size)
+
+        start = time.perf_counter()
+        snapshot = query_service.load_snapshot(source)
+        load_seconds = time.perf_counter() - start
+        queries = [query_service.parse_query(_query_paths(rng).split('?', 1)[1]) for _ in range(2000)]
+        start = time.perf_counter()
+        for filters, max_latency, limit in queries:
+            snapshot.top(filters, max_latency, limit)
+            snapshot.random(filters, max_latency, rng)
+        elapsed = time.perf_counter() - start
+        emit({"bench": "query", "impl": "index", "size": len(snapshot), "load_seconds": round(load_seconds, 3),
+              "queries_per_sec": round(2 * len(queries) / elapsed)})
+
+        server = subprocess.Popen(
+            [sys.executable, QUERY_SCRIPT, "--port", "0", "--source", source, "--reload-interval", "0.2"],
+            stdout=subprocess.PIPE, text=True)
+        try:
+            line = ""
+            while "listening on" not in line:
+                line = server.stdout.readline()
+                if not line:
+                    raise RuntimeError("query service exited before listening")
+            host, port = line.rsplit("//", 1)[1].strip().split(":")
+
+            latencies, errors, versions = [], [], {}  # version -> first time served
+            stop = threading.Event()
+
+            def client(seed):
+                client_rng = random.Random(seed)
+                conn = http.client.HTTPConnection(host, int(port), timeout=10)
+                local = []
+                while not stop.is_set():
+                    path = _query_paths(client_rng)
+                    began = time.perf_counter()
+                    try:
+                        conn.request("GET", path)
+                        response = conn.getresponse()
+                        body = response.read()
+                    except (OSError, http.client.HTTPException) as e:
+                        errors.append(str(e))
+                        conn.close()
+                        conn = http.client.HTTPConnection(host, int(port), timeout=10)
+                        continue
+                    local.append(time.perf_counter() - began)
+                    if response.status == 200:
+                        versions.setdefault(json.loads(body)["version"], time.perf_counter())
+                    elif response.status != 404:
+                        errors.append(f"HTTP {response.status}")
+                conn.close()
+                latencies.extend(local)
+
+            threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds * reload_at)
+            # A new validation run publishes a different set
+            write_synthetic_file(source + ".tmp", size, seed=1)
+            os.replace(source + ".tmp", source)
+            replaced = time.perf_counter()
+            time.sleep(seconds * (1 - reload_at))
+            stop.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies.sort()
+    emit({"bench": "query", "impl": "http", "size": size, "clients": clients, "requests": len(latencies),
+          "requests_per_sec": round(len(latencies) / elapsed), "errors": len(errors),
+          "versions_served": sorted(versions),
+          "swap_seconds": round(versions[2] - replaced, 2) if 2 in versions else None,
+          "p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+          "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    memory = sub.add_parser("memory", help="peak memory of parse/merge/write, legacy vs streaming")
+    memory.add_argument("--sizes", default="10000,100000,1000000")
+
+    merge = sub.add_parser("merge", help="merge_proxies micro-benchmark, legacy vs ProxyIndex")
+    merge.add_argument("--size", type=int, default=1000000)
+    merge.add_argument("--repeat", type=int, default=3)
+    merge.add_argument("--overlap", type=float, default=0.5)
+
+    farm = sub.add_parser("farm", help="validation throughput and publish API calls against a local proxy farm")
+    for behaviour, default in zip(FARM_BEHAVIOURS, (200, 50, 50, 50, 50, 0)):
+        farm.add_argument(f"--{behaviour}", type=int, default=default, help=f"number of {behaviour} proxies")
+    farm.add_argument("--slow-delay", type=float, default=4.0)
+    farm.add_argument("--modes", default="thread,async")
+    farm.add_argument("--per-network", type=int, default=10, help="farm proxies per loopback /24 (0: one address)")
+
+    query = sub.add_parser("query", help="query_service.py index speed and HTTP requests/sec across a hot swap")
+    query.add_argument("--size", type=int, default=100000)
+    query.add_argument("--clients", type=int, default=8)
+    query.add_argument("--seconds", type=float, default=10.0)
+
+    parse = sub.add_parser("parse", help="candidate file loading, legacy parse_json_lines vs jsonl.iter_file")
+    parse.add_argument("--size", type=int, default=1000000)
+    parse.add_argument("--repeat", type=int, default=3)
+    parse.add_argument("--processes", type=int, default=None, help="parser worker processes (default: CPU count)")
+
+    run = sub.add_parser("_memory-run")
+    run.add_argument("impl", choices=["legacy", "stream"])
+    run.add_argument("path")
+    run.add_argument("out_dir")
+
+    args = parser.parse_args(argv)
+    if args.command == "memory":
+        bench_memory([int(size) for size in args.sizes.split(',')])
+    elif args.command == "merge":
+        bench_merge(args.size, args.repeat, args.overlap)
+    elif args.command == "farm":
+        counts = {behaviour: getattr(args, behaviour) for behaviour in FARM_BEHAVIOURS}
+        bench_farm(counts, args.modes.split(','), args.slow_delay, args.per_network)
+    elif args.command == "parse":
+        bench_parse(args.size, args.repeat, processes=args.processes)
+    elif args.command == "query":
+        bench_query(args.size, args.clients, args.seconds)
+    elif args.command == "_memory-run":
+        # Silence pipeline progress output; only the JSON result goes to stdout
+        real_stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            result = _memory_run(args.impl, args.path, args.out_dir)
+        finally:
+            sys.stdout = real_stdout
+        emit(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Long-running alternative to the 15 minute cron run.
+
+The candidate set, health store and the GitHub client's keep-alive session and download
+cache stay in memory. The probe trackers (judge pool, network throttle, adaptive timeouts)
+are summarised and reset at every publish interval, so they only reflect recent probes. Every DAEMON_TICK seconds the
+candidates the health store says are due (good proxies after DAEMON_RECHECK seconds,
+failing ones on their backoff) are re-probed, at most DAEMON_PROBE_BATCH per round,
+and the live set is updated. Every DAEMON_PUBLISH_INTERVAL seconds, if the live set
+changed, it is written and published to ip_ports like a cron run would.
+DAEMON_SOURCE (the getproxy output) is re-read whenever the file changes.
+
+SIGTERM / SIGINT finish the current round, publish pending changes
+(DAEMON_PUBLISH_ON_EXIT) and persist the state to DAEMON_STATE_PATH and the health
+store, from which the next start resumes.
+
+    GTOKEN=... python3 daemon.py
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+
+import jsonl
+import validate_and_upload as vu
+from validate_and_upload import ProxyIndex, proxy_key, write_outputs, iter_sorted, publish_outputs, \
+    print_github_stats, report_metrics, MAX_WORKERS, OUTPUT_DIR
+from health_store import HealthStore, HEALTH_DB_PATH, STREAK, health_key
+from delta_feed import record_changed
+from github_api import get_contents, GithubError
+from metrics import metrics
+
+DAEMON_SOURCE = os.getenv('DAEMON_SOURCE', 'proxy.list.out')  # Candidate list, re-read when it changes
+DAEMON_STATE_PATH = os.getenv('DAEMON_STATE_PATH', 'daemon_state.jsonl')
+DAEMON_TICK = float(os.getenv('DAEMON_TICK', '15'))  # seconds between re-probe rounds
+DAEMON_PROBE_BATCH = int(os.getenv('DAEMON_PROBE_BATCH', '1000'))  # Most proxies probed per round
+DAEMON_ROUND_BUDGET = float(os.getenv('DAEMON_ROUND_BUDGET', '60'))  # seconds before a round's open probes wait for the next
+DAEMON_RECHECK = float(os.getenv('DAEMON_RECHECK', '300'))  # Re-probe proxies that passed after this many seconds
+DAEMON_PUBLISH_INTERVAL = float(os.getenv('DAEMON_PUBLISH_INTERVAL', '300'))  # seconds between commits to ip_ports
+DAEMON_SAVE_INTERVAL = float(os.getenv('DAEMON_SAVE_INTERVAL', '300'))  # seconds between state checkpoints
+DAEMON_PUBLISH_ON_EXIT = os.getenv('DAEMON_PUBLISH_ON_EXIT', '1') == '1'
+DAEMON_DROP_AFTER = int(os.getenv('DAEMON_DROP_AFTER', '8'))  # Consecutive failures before a candidate is forgotten
+DAEMON_QUERY_PORT = int(os.getenv('DAEMON_QUERY_PORT', '0'))  # Serve query_service.py on the live set; 0 disables
+DAEMON_QUERY_HOST = os.getenv('DAEMON_QUERY_HOST', '127.0.0.1')
+
+
+class ProxyDaemon:
+    """Continuous validation over an in-memory candidate set, with periodic publishing"""
+
+    def __init__(self, token, state_path=DAEMON_STATE_PATH, source=DAEMON_SOURCE):
+        self.token = token
+        self.state_path = state_path
+        self.source = source
+        self.mode = vu.VALIDATION_MODE
+        self.candidates = ProxyIndex()
+        self.live = {}  # proxy_key -> published record
+        self.store = HealthStore.load(HEALTH_DB_PATH)
+        self.store.recheck_interval = DAEMON_RECHECK
+        self.dirty = False  # Live set changed since the last publish
+        self.last_publish = self.last_save = time.monotonic()
+        self.rounds = 0
+        self.service = None
+        self._server = None
+        self._source_signature = None
+        self._stop = threading.Event()
+
+    def stop(self, signum=None, frame=None):
+        if signum is not None:
+            print(f"[*] Received {signal.Signals(signum).name}, finishing the current round...", flush=True)
+        self._stop.set()
+
+    def load_state(self):
+        """
+        Resume from the state saved at the last shutdown or checkpoint
+        Returns: True if a state file was loaded
+        """
+        if not os.path.exists(self.state_path):
+            return False
+        for entry in jsonl.iter_file(self.state_path):
+            candidate = entry.get('candidate')
+            if isinstance(candidate, dict):
+                self.candidates.add(candidate)
+                if entry.get('live'):
+                    self.live[proxy_key(candidate)] = entry['live']
+        print(f"[*] Resumed from {self.state_path}: {len(self.candidates)} candidates, {len(self.live)} live")
+        return True
+
+    def save_state(self):
+        """Write candidates and live records (atomically) and the health store"""
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for candidate in self.candidates.values():
+                live = self.live.get(proxy_key(candidate))
+                f.write(json.dumps({"candidate": candidate, "live": live}) + '\n')
+        os.replace(tmp_path, self.state_path)
+        self.store.save()
+        self.last_save = time.monotonic()
+
+    def bootstrap(self):
+        """Start from the saved state, or from what ip_ports publishes and the health store remembers"""
+        if self.load_state():
+            return
+        print("[*] Downloading existing data from ip_ports...")
+        try:
+            existing = get_contents("parserpp", "ip_ports", ["/proxyinfo.json"], self.token)["/proxyinfo.json"]
+        except GithubError as e:
+            print(f"[-] Warning: Could not download existing data: {e}")
+            existing = ""
+        self.candidates.update(jsonl.iter_text(existing, source="proxyinfo.json"))
+        # Proxies that passed recently stay live until their re-probe is due
+        for candidate in self.candidates.values():
+            carried = self.store.carry_over(candidate)
+            if carried is not None:
+                self.live[proxy_key(candidate)] = carried
+        print(f"[*] Starting with {len(self.candidates)} candidates, {len(self.live)} live from the health store")
+
+    def ingest(self):
+        """Merge the candidate list into the set if the file changed since it was last read"""
+        try:
+            stat = os.stat(self.source)
+        except OSError:
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._source_signature:
+            return
+        self._source_signature = signature
+        before = len(self.candidates)
+        self.candidates.update(jsonl.iter_file(self.source))
+        print(f"[*] Read {self.source}: {len(self.candidates) - before} new candidates, {len(self.candidates)} in total")
+
+    def probe_round(self):
+        """
+        Re-probe the candidates that are due and fold the results into the live set
+        Returns: number of proxies probed
+        """
+        to_probe, _ = self.store.select(self.candidates.values())
+        to_probe = to_probe[:DAEMON_PROBE_BATCH]
+        if not to_probe:
+            return 0
+        start_time = time.time()
+        unfinished = []
+        valid = vu.validate_batch(to_probe, self.mode, MAX_WORKERS, deadline=start_time + DAEMON_ROUND_BUDGET,
+                                  unfinished=unfinished)
+        unfinished_keys = {proxy_key(proxy) for proxy in unfinished}
+        probed = [proxy for proxy in to_probe if proxy_key(proxy) not in unfinished_keys]
+        self.store.update(probed, valid)
+
+        valid_by_key = {proxy_key(proxy): proxy for proxy in valid}
+        changed = 0
+        for proxy in probed:
+            key = proxy_key(proxy)
+            new, old = valid_by_key.get(key), self.live.get(key)
+            if new is not None:
+                if old is None or record_changed(old, new):
+                    changed += 1
+                self.live[key] = new
+            elif old is not None:
+                del self.live[key]
+                changed += 1
+            record = self.store.records.get(health_key(proxy))
+            if record is not None and record[STREAK] <= -DAEMON_DROP_AFTER:
+                self.candidates.discard(key)
+        self.dirty = self.dirty or changed > 0
+
+        self.rounds += 1
+        metrics.inc("daemon_rounds_total")
+        metrics.inc("daemon_probes_total", len(probed))
+        metrics.observe("daemon_round_seconds", time.time() - start_time)
+        print(f"[*] Round {self.rounds}: probed {len(probed)}, {len(valid)} valid, {changed} changes, "
+              f"{len(self.live)} live" + (f", {len(unfinished)} left for the next round" if unfinished else ""),
+              flush=True)
+        if self.service is not None:
+            self.service.publish(self.live.values())
+        return len(probed)
+
+    def publish(self):
+        """Write the live set and publish it to ip_ports if it changed"""
+        self.last_publish = time.monotonic()
+        if not self.dirty or not self.live:
+            return
+        with metrics.timer("generate"):
+            count = write_outputs(iter_sorted(iter(self.live.values())), OUTPUT_DIR)
+        if publish_outputs(self.token):
+            self.dirty = False
+            metrics.inc("daemon_publishes_total")
+            print(f"[✓] Published {count} live proxies", flush=True)
+
+    def rotate_trackers(self):
+        """Print what the probes since the last rotation saw, then start the trackers afresh"""
+        vu.end_validation()
+        vu.begin_validation(self.mode)
+
+    def _start_query_service(self):
+        import query_service
+
+        self.service = query_service.ProxyService(source=None)
+        self.service.publish(self.live.values())
+        self._server = query_service.serve(self.service, DAEMON_QUERY_HOST, DAEMON_QUERY_PORT)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"[*] Query service listening on http://{DAEMON_QUERY_HOST}:{self._server.server_address[1]}")
+
+    def run(self):
+        """Run until SIGTERM / SIGINT or stop(), then shut down gracefully"""
+        started = time.perf_counter()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        vu.begin_validation(self.mode)
+        self.bootstrap()
+        if DAEMON_QUERY_PORT:
+            self._start_query_service()
+
+        while not self._stop.is_set():
+            probed = 0
+            try:
+                self.ingest()
+                probed = self.probe_round()
+                if time.monotonic() - self.last_publish >= DAEMON_PUBLISH_INTERVAL:
+                    # A judge dropped or a host skipped hours ago should not stay that way
+                    self.rotate_trackers()
+                    self.publish()
+                if time.monotonic() - self.last_save >= DAEMON_SAVE_INTERVAL:
+                    self.save_state()
+            except Exception as e:
+                # One failed round (network, disk, GitHub) must not end the daemon
+                print(f"[-] Warning: Round failed: {e}", flush=True)
+            if probed < DAEMON_PROBE_BATCH:
+                # Caught up: nothing else is due until the next tick
+                self._stop.wait(DAEMON_TICK)
+
+        print("[*] Shutting down...")
+        if self._server is not None:
+            self._server.shutdown()
+        if DAEMON_PUBLISH_ON_EXIT:
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"[-] Warning: Final publish failed: {e}")
+        self.save_state()
+        print(f"[✓] Saved state for {len(self.candidates)} candidates ({len(self.live)} live) to {self.state_path}")
+        vu.end_validation()
+        print_github_stats()
+        report_metrics(time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    token = os.getenv('GTOKEN') or os.getenv('GITHUB_TOKEN')
+    if not token:
+        print("[-] Error: No GitHub token found")
+        sys.exit(1)
+
+    ProxyDaemon(token).run()
+    sys.exit(0)
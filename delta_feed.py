@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sequence-numbered delta feed published next to the full snapshots.
+
+Each run that changes the validated set writes deltas/delta-<seq>.json listing the
+records added, removed and changed since the previous run, and rewrites
+deltas/index.json. Every completed block of DELTA_COMPACT_SPAN deltas is compacted
+into one deltas/delta-<from>-<to>.json; deltas older than DELTA_RETENTION sequence
+numbers are dropped.
+
+Delta entries are upserts (added, changed: the full new record) and deletes
+(removed: the key), so a compacted delta can be applied to any state inside its range.
+A consumer at sequence s follows the feed with catch_up_paths(manifest, s) and
+apply_delta(); when that returns None it has fallen behind and re-syncs from
+proxyinfo.json, which is the snapshot at manifest["seq"].
+"""
+
+import os
+import json
+
+import jsonl
+from github_api import git_blob_sha
+from scoring import SCORE_FIELDS
+from keys import proxy_key, sql_key
+from spool import spool_db
+
+DELTA_FEED = os.getenv('DELTA_FEED', '1') == '1'
+DELTA_DIR = 'deltas'
+DELTA_LATENCY_CHANGE = float(os.getenv('DELTA_LATENCY_CHANGE', '0.25'))  # Smaller response_time moves are not published
+DELTA_COMPACT_SPAN = int(os.getenv('DELTA_COMPACT_SPAN', '16'))  # Deltas per compacted block (16 runs = 4 hours)
+DELTA_RETENTION = int(os.getenv('DELTA_RETENTION', '96'))  # Sequence numbers kept in the feed (96 runs = 1 day)
+MANIFEST = f"{DELTA_DIR}/index.json"
+
+
+def _key_dict(key):
+    return {"host": key[0], "port": key[1], "type": key[2]}
+
+
+def record_changed(old, new, threshold=DELTA_LATENCY_CHANGE):
+    """
+    True if the records differ in any field, or their response_time by at least threshold.
+    Throughput scores are re-measured every run and never count as a change on their own.
+    """
+    measured = ('response_time',) + SCORE_FIELDS
+    old_rest = {k: v for k, v in old.items() if k not in measured}
+    new_rest = {k: v for k, v in new.items() if k not in measured}
+    if old_rest != new_rest:
+        return True
+    old_time, new_time = old.get('response_time'), new.get('response_time')
+    if old_time is None or new_time is None:
+        return old_time is not new_time
+    return abs(new_time - old_time) >= threshold
+
+
+def diff_snapshots(old_proxies, new_proxies, threshold=DELTA_LATENCY_CHANGE, spool_dir=None):
+    """
+    Compare two proxy streams by proxy_key. Both sides are spooled to an on-disk
+    SQLite table and joined there, so memory holds only the differences.
+    Returns: {"added": [records], "changed": [records], "removed": [keys]}, each sorted by key
+    """
+    with spool_db(spool_dir) as db:
+        for table, proxies in (("old", old_proxies), ("new", new_proxies)):
+            db.execute(f"CREATE TABLE {table} (host, port, type, line TEXT, PRIMARY KEY (host, port, type))")
+            db.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)", (
+                sql_key(proxy) + (json.dumps(proxy),)
+                for proxy in proxies
+            ))
+        db.commit()
+
+        added = [json.loads(line) for (line,) in db.execute(
+            "SELECT new.line FROM new LEFT JOIN old USING (host, port, type) WHERE old.line IS NULL "
+            "ORDER BY host, port, type")]
+        removed = [_key_dict(row) for row in db.execute(
+            "SELECT host, port, type FROM old LEFT JOIN new USING (host, port, type) WHERE new.line IS NULL "
+            "ORDER BY host, port, type")]
+        changed = []
+        for old_line, new_line in db.execute(
+                "SELECT old.line, new.line FROM old JOIN new USING (host, port, type) WHERE old.line != new.line "
+                "ORDER BY host, port, type"):
+            new = json.loads(new_line)
+            if record_changed(json.loads(old_line), new, threshold):
+                changed.append(new)
+        return {"added": added, "changed": changed, "removed": removed}
+
+
+def compose(deltas):
+    """
+    Fold consecutive deltas (oldest first) into one covering the whole range: the last
+    operation on a key wins; a key first seen as added stays "added"
+    Returns: the composed delta
+    """
+    ops = {}  # key -> (kind, record)
+    for delta in deltas:
+        for kind in ("added", "changed"):
+            for record in delta[kind]:
+                key = proxy_key(record)
+                first = ops.get(key, (kind,))[0]
+                ops[key] = ("added" if first == "added" else "changed", record)
+        for key in delta["removed"]:
+            ops[proxy_key(key)] = ("removed", key)
+
+    result = {"from_seq": deltas[0]["from_seq"], "seq": deltas[-1]["seq"], "added": [], "changed": [], "removed": []}
+    for key in sorted(ops, key=lambda key: tuple('' if part is None else str(part) for part in key)):
+        kind, record = ops[key]
+        result[kind].append(record)
+    return result
+
+
+def apply_delta(records, delta):
+    """Apply a delta to {proxy_key: record} in place (consumer side)"""
+    for record in delta["added"] + delta["changed"]:
+        records[proxy_key(record)] = record
+    for key in delta["removed"]:
+        records.pop(proxy_key(key), None)
+    return records
+
+
+def catch_up_paths(manifest, seq):
+    """
+    Deltas a consumer at seq applies, in order, to reach manifest["seq"]
+    Returns: list of repo paths, or None when the feed no longer reaches back to seq
+    """
+    paths = []
+    for entry in sorted(manifest["deltas"], key=lambda entry: entry["seq"]):
+        if entry["seq"] <= seq:
+            continue
+        if entry["from_seq"] > seq + 1:
+            return None
+        paths.append(entry["path"])
+        seq = entry["seq"]
+    return paths if seq == manifest["seq"] else None
+
+
+def _write_delta(out_dir, delta):
+    """Write one delta file; returns its manifest entry"""
+    if delta["from_seq"] == delta["seq"]:
+        path = f"{DELTA_DIR}/delta-{delta['seq']:08d}.json"
+    else:
+        path = f"{DELTA_DIR}/delta-{delta['from_seq']:08d}-{delta['seq']:08d}.json"
+    data = json.dumps(delta, separators=(',', ':'))
+    with open(os.path.join(out_dir, path), 'w') as f:
+        f.write(data)
+    return {"path": path, "from_seq": delta["from_seq"], "seq": delta["seq"], "added": len(delta["added"]),
+            "changed": len(delta["changed"]), "removed": len(delta["removed"]),
+            "bytes": len(data.encode('utf-8')), "sha": git_blob_sha(data)}
+
+
+def update_feed(out_dir, previous_snapshot, previous_manifest, fetch, snapshot_name='proxyinfo.json'):
+    """
+    Diff the snapshot written to out_dir against the previously published one, append
+    the delta to the feed, compact a completed block and drop expired deltas.
+    fetch(paths) -> {path: text} downloads published deltas for compaction ("" if missing).
+    The feed restarts (consumers re-sync) when the previous snapshot is not the one the
+    previous manifest describes, e.g. after a failed or partial upload.
+    Returns: (repo paths written, manifest last; published delta paths still in the feed)
+    """
+    os.makedirs(os.path.join(out_dir, DELTA_DIR), exist_ok=True)
+    snapshot_path = os.path.join(out_dir, snapshot_name)
+    with open(snapshot_path, 'rb') as f:
+        snapshot_sha = git_blob_sha(f.read())
+
+    manifest = json.loads(previous_manifest) if previous_manifest else None
+    written = []
+    if manifest is None or manifest.get("snapshot_sha") != git_blob_sha(previous_snapshot):
+        seq = manifest["seq"] + 1 if manifest else 1
+        print(f"[*] Delta feed {'started' if manifest is None else 'restarted'} at seq {seq}: "
+              f"consumers re-sync from {snapshot_name}")
+        entries = []
+    else:
+        seq = manifest["seq"]
+        entries = manifest["deltas"]
+        delta = diff_snapshots(jsonl.iter_text(previous_snapshot, source=f"published {snapshot_name}"),
+                               jsonl.iter_file(snapshot_path, source=snapshot_name), spool_dir=out_dir)
+        if delta["added"] or delta["changed"] or delta["removed"]:
+            seq += 1
+            delta = {"from_seq": seq, "seq": seq, **delta}
+            entries.append(_write_delta(out_dir, delta))
+            written.append(entries[-1]["path"])
+            print(f"[*] Delta {seq}: {len(delta['added'])} added, {len(delta['changed'])} changed, "
+                  f"{len(delta['removed'])} removed")
+            if seq % DELTA_COMPACT_SPAN == 0:
+                entries, written = _compact(out_dir, entries, written, delta, fetch)
+        else:
+            print(f"[*] Delta feed: no changes, staying at seq {seq}")
+
+    entries = [entry for entry in entries if entry["seq"] > seq - DELTA_RETENTION]
+    oldest = min(entry["from_seq"] for entry in entries) - 1 if entries else seq
+    manifest = {"seq": seq, "oldest_seq": oldest, "snapshot": snapshot_name, "snapshot_sha": snapshot_sha,
+                "deltas": entries}
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        f.write(json.dumps(manifest, indent=2))
+    kept = [entry["path"] for entry in entries if entry["path"] not in written]
+    return written + [MANIFEST], kept
+
+
+def _compact(out_dir, entries, written, latest, fetch):
+    """Replace the single deltas of the block ending at latest with one compacted delta"""
+    block = [entry for entry in entries
+             if entry["from_seq"] == entry["seq"] and entry["seq"] > latest["seq"] - DELTA_COMPACT_SPAN]
+    if len(block) < 2:
+        return entries, written
+    published = fetch([entry["path"] for entry in block[:-1]])
+    if not all(published.values()):
+        print("[-] Warning: Could not download the deltas to compact, keeping them as they are")
+        return entries, written
+    deltas = [json.loads(published[entry["path"]]) for entry in block[:-1]] + [latest]
+    compacted = _write_delta(out_dir, compose(deltas))
+    print(f"[*] Compacted deltas {compacted['from_seq']}-{compacted['seq']} into {compacted['path']}")
+    replaced = {entry["path"] for entry in block}
+    return ([entry for entry in entries if entry["path"] not in replaced] + [compacted],
+            [path for path in written if path not in replaced] + [compacted["path"]])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Minimal self-hosted judge: answers every GET with the caller's origin in httpbin's /get shape.
+Deploy it on a publicly reachable host and add http://<host>:<port>/get to JUDGE_URLS.
+GET /bytes/<n> returns n bytes like httpbin, for the throughput scoring download.
+
+    python3 echo_server.py --port 8080
+"""
+
+import re
+import sys
+import json
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MAX_BYTES = 10 * 1024 * 1024  # Largest /bytes/<n> download served
+_BYTES_PATH = re.compile(r'/bytes/(\d+)')
+_BLOCK = bytes(range(256)) * 256  # 64 KB written repeatedly for /bytes
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        match = _BYTES_PATH.fullmatch(self.path.split('?', 1)[0])
+        if match:
+            self._send_bytes(min(int(match.group(1)), MAX_BYTES))
+            return
+
+        # Same origin format as httpbin: forwarded-for chain followed by the peer address
+        forwarded = [ip.strip() for ip in self.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+        origin = ", ".join(forwarded + [self.client_address[0]])
+        body = json.dumps({
+            "origin": origin,
+            "headers": dict(self.headers.items()),
+            "url": self.path,
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, size):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        while size > 0:
+            self.wfile.write(_BLOCK[:size])
+            size -= len(_BLOCK)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host="0.0.0.0", port=8080):
+    """Create a threaded echo server; the caller runs serve_forever()"""
+    return ThreadingHTTPServer((host, port), EchoHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-hosted proxy judge (echo server)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port)
+    print(f"[*] Echo judge listening on {args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        sys.exit(0)
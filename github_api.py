@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 import base64
+import hashlib
 import json
 import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
+
+from metrics import metrics
 
 urllib3.disable_warnings()
 requests.packages.urllib3.disable_warnings()
@@ -21,6 +31,43 @@ _EMAIL = "sanbo.xyz@gmail.com"
 _COMMIT_MSG = "commit by python api[{}]. proxy2. .".format(_VERSION)
 isDebug = False
 
+# GITHUB_API_URL is set by GitHub Actions; point it at a mock server for local runs
+API_ROOT = os.getenv('GITHUB_API_URL', "https://api.github.com")
+POOL_SIZE = int(os.getenv('GITHUB_POOL_SIZE', "4"))  # Keep-alive connections per host
+MAX_RETRIES = int(os.getenv('GITHUB_MAX_RETRIES', "3"))  # Retries on connection errors and 5xx
+BRANCH = os.getenv('GITHUB_BRANCH', "main")  # Branch updated by commit_files
+CACHE_DIR = os.getenv('GITHUB_CACHE_DIR', ".github_cache")  # ETag + body cache for get_content; "" disables
+RATE_LIMIT_RESERVE = int(os.getenv('GITHUB_RATE_RESERVE', "10"))  # Requests left for other users of the token
+RATE_LIMIT_PACE = int(os.getenv('GITHUB_RATE_PACE', "100"))  # Below this many spare requests, spread them until the reset
+MAX_RATE_WAIT = float(os.getenv('GITHUB_MAX_RATE_WAIT', "60"))  # Longest single wait for a rate limit, seconds
+RATE_LIMIT_RETRIES = 4  # Retries of a rate-limited (403/429) request
+RATE_LIMIT_BACKOFF = 2.0  # First secondary-limit backoff without Retry-After, doubled per retry, seconds
+
+
+class GithubError(Exception):
+    """A GitHub API call failed; status is the HTTP status, or None for transport errors"""
+
+    def __init__(self, message, status=None, url=None):
+        super().__init__(message)
+        self.status = status
+        self.url = url
+
+
+class NotFoundError(GithubError):
+    """404: the file, branch or object does not exist"""
+
+
+class ConflictError(GithubError):
+    """409/422: the write was rejected, e.g. a stale or missing file sha"""
+
+
+class RateLimitError(GithubError):
+    """403/429 from a primary or secondary rate limit that outlasted the retries"""
+
+    def __init__(self, message, status=None, url=None, retry_at=None):
+        super().__init__(message, status, url)
+        self.retry_at = retry_at
+
 
 # support full path: README.md、/Users/root/Desktop/test.txt, and so on
 # @TODO not support: ~/Desktop/test.txt
@@ -63,6 +110,58 @@ def prepareContent(_content_base64ed: str = "", _content_not_base64: str = "", _
         return ""
 
 
+def git_blob_sha(data):
+    """SHA-1 git (and the contents API "sha" field) assigns to a file with this content"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def stale_paths(paths, prefixes, keep=()):
+    """Paths under one of prefixes (a directory or a tuple of them) that are not in keep, sorted"""
+    keep = {path.lstrip("/") for path in keep}
+    return [path for path in sorted(paths) if path.startswith(prefixes) and path not in keep]
+
+
+def api_endpoint(url):
+    """Low-cardinality metrics label for an API URL: contents, branches, git/trees, ..."""
+    parts = urlsplit(url).path.strip("/").split("/")
+    # repos/{owner}/{repo}/{kind}[/...]
+    if len(parts) > 3 and parts[0] == "repos":
+        return "/".join(parts[3:5]) if parts[3] == "git" else parts[3]
+    return parts[0]
+
+
+def is_rate_limited(resp):
+    """True for a 429, or a 403 caused by the primary or a secondary rate limit"""
+    if resp.status_code == 429:
+        return True
+    if resp.status_code != 403:
+        return False
+    return resp.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in resp.headers \
+        or "rate limit" in resp.text.lower()
+
+
+def raise_for_status(resp, action):
+    """Raise the GithubError subclass matching an error response; no-op below 400"""
+    status = resp.status_code
+    if status < 400:
+        return
+    try:
+        detail = resp.json().get("message", "")
+    except (ValueError, AttributeError):
+        detail = resp.text[:200]
+    message = f"GitHub {action} returned {status}: {detail}"
+    if status == 404:
+        raise NotFoundError(message, status, resp.url)
+    if status in (409, 422):
+        raise ConflictError(message, status, resp.url)
+    if is_rate_limited(resp):
+        reset = resp.headers.get("X-RateLimit-Reset")
+        raise RateLimitError(message, status, resp.url, retry_at=float(reset) if reset else None)
+    raise GithubError(message, status, resp.url)
+
+
 #  masure prefix
 def preparePath(info, make_prefix):
     if info.startswith(make_prefix) != True:
@@ -70,30 +169,507 @@ def preparePath(info, make_prefix):
     return info
 
 
-#  support file: public/private repo , result: single file sha
-#  support dir: public/private repo ,  result: all files sha
-def getSha(_owner, _repo, _path=""
-           , __token=os.getenv('GITHUB_TOKEN', "")):
-    # check path, the data which not startwith "/", will append "/" add the header
-    _path = preparePath(_path, make_prefix="/")
-    sha_url = "https://api.github.com/repos/{}/{}/contents{}".format(_owner, _repo, _path)
-    _headers = getGithubRequestHeader(__token)
-
-    print(f"Fetching from GitHub: {sha_url}")
-    try:
-        resp = requests.request("get", url=sha_url, headers=_headers, verify=False, timeout=10)
+class GithubClient:
+    """
+    GitHub contents API client sharing one pooled keep-alive session, so every call
+    after the first reuses an open TLS connection to the API host.
+    """
+
+    def __init__(self, _token=os.getenv('GITHUB_TOKEN', ""), _api_root=API_ROOT,
+                 _pool_size=POOL_SIZE, _max_retries=MAX_RETRIES, _cache_dir=CACHE_DIR):
+        self.token = _token
+        self.cache_dir = _cache_dir
+        self.api_root = _api_root.rstrip("/")
+        self.session = requests.Session()
+        self.session.verify = False
+        # Retry connection errors and 5xx with backoff; the Retry also covers PUT/DELETE.
+        # Retry-After is left to request(), which handles all rate limiting in one place
+        retry = Retry(total=_max_retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                      raise_on_status=False, respect_retry_after_header=False)
+        self.adapter = HTTPAdapter(pool_connections=_pool_size, pool_maxsize=_pool_size, max_retries=retry)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.files_skipped = 0  # Uploads avoided because the remote blob already matched
+        self.bytes_skipped = 0
+        self.calls_skipped = 0
+        # Primary rate limit as last reported by X-RateLimit-* headers
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.rate_reset = None
+        self.rate_limited = 0  # 403/429 responses seen
+        self._paced_until = 0.0  # Earliest send time of the next paced request
+        self.rate_wait_seconds = 0.0
+        # Request times on a newly opened vs a reused connection: {"cold"|"warm": [count, seconds]}
+        self.request_times = {"cold": [0, 0.0], "warm": [0, 0.0]}
+
+    def contents_url(self, _owner, _repo, _path=""):
+        # check path, the data which not startwith "/", will append "/" add the header
+        _path = preparePath(_path, make_prefix="/")
+        return "{}/repos/{}/{}/contents{}".format(self.api_root, _owner, _repo, _path)
+
+    def request(self, method, url, _token=None, timeout=10, headers=None, **kwargs):
+        """
+        Send one API request, pacing it against the rate limit. A rate-limited (403/429)
+        response is retried after Retry-After, the limit reset, or an exponential backoff
+        with jitter; the last response is returned once RATE_LIMIT_RETRIES are used up.
+        Raises: GithubError on transport errors, RateLimitError when the wait would exceed MAX_RATE_WAIT
+        """
+        _headers = getGithubRequestHeader(_token if _token is not None else self.token)
+        if headers:
+            _headers.update(headers)
+        labels = {"method": method.upper(), "endpoint": api_endpoint(url)}
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self._wait_for_budget(url)
+            with self._lock:
+                self.requests_sent += 1
+            opened = self.connections_opened()
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(method, url=url, headers=_headers, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                metrics.inc("github_responses_total", status="error", **labels)
+                raise GithubError(f"GitHub request failed: {method.upper()} {url}: {e}", url=url) from e
+            finally:
+                metrics.observe("github_request_seconds", time.perf_counter() - start, **labels)
+            self._record_request_time(self.connections_opened() > opened, time.perf_counter() - start)
+            metrics.inc("github_responses_total", status=str(resp.status_code), **labels)
+            self._update_rate_limit(resp)
+
+            if not is_rate_limited(resp) or attempt == RATE_LIMIT_RETRIES:
+                return resp
+            with self._lock:
+                self.rate_limited += 1
+            self._sleep(self._rate_limit_delay(resp, attempt), url)
+        return resp
+
+    def _update_rate_limit(self, resp):
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset = resp.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            self.rate_limit = int(resp.headers.get("X-RateLimit-Limit", 0)) or self.rate_limit
+            self.rate_remaining = int(remaining)
+            self.rate_reset = float(reset)
+
+    def _rate_limit_delay(self, resp, attempt):
+        """Seconds to wait before retrying a rate-limited response"""
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        if resp.headers.get("X-RateLimit-Remaining") == "0" and resp.headers.get("X-RateLimit-Reset"):
+            return max(float(resp.headers["X-RateLimit-Reset"]) - time.time(), 0) + 1
+        # Secondary limit without a hint: exponential backoff with full jitter
+        return random.uniform(0.5, 1.0) * RATE_LIMIT_BACKOFF * 2 ** attempt
+
+    def _wait_for_budget(self, url):
+        """
+        Before a request: once fewer than RATE_LIMIT_PACE requests above the reserve are left,
+        space requests evenly over the time until the reset (at most MAX_RATE_WAIT apart), so
+        the budget lasts the window instead of running dry; at the reserve, wait for the reset.
+        Raises: RateLimitError when the budget is spent and the reset is more than MAX_RATE_WAIT away
+        """
+        with self._lock:
+            remaining, reset = self.rate_remaining, self.rate_reset
+        if remaining is None or remaining > RATE_LIMIT_RESERVE + RATE_LIMIT_PACE or reset is None:
+            return
+        delay = reset - time.time() + 1
+        if delay <= 0:
+            return
+        if remaining > RATE_LIMIT_RESERVE:
+            interval = min(delay / (remaining - RATE_LIMIT_RESERVE), MAX_RATE_WAIT)
+            # Parallel callers take consecutive slots rather than all waking at once
+            with self._lock:
+                now = time.time()
+                send_at = max(now, self._paced_until)
+                self._paced_until = send_at + interval
+            if send_at > now:
+                print(f"GitHub rate limit: {remaining} requests left until reset, pacing them {interval:.1f}s apart")
+                self._sleep(min(send_at - now, MAX_RATE_WAIT), url)
+            return
+        print(f"GitHub rate limit: {remaining} requests left until reset")
+        self._sleep(delay, url)
+        with self._lock:
+            if self.rate_reset == reset:
+                self.rate_remaining = None  # Unknown until the next response
+
+    def _sleep(self, delay, url):
+        if delay > MAX_RATE_WAIT:
+            raise RateLimitError(f"GitHub rate limit would need a {delay:.0f}s wait (max {MAX_RATE_WAIT:g}s)",
+                                 url=url, retry_at=time.time() + delay)
+        print(f"GitHub rate limited, waiting {delay:.1f}s")
+        metrics.inc("github_rate_limit_waits_total")
+        metrics.inc("github_rate_limit_wait_seconds_total", delay)
+        with self._lock:
+            self.rate_wait_seconds += delay
+        time.sleep(delay)
+
+    def connections_opened(self):
+        """TCP(+TLS) connections opened so far across all pooled hosts"""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def _record_request_time(self, cold, seconds):
+        # With parallel requests a new connection may be credited to its neighbour; close enough for an estimate
+        with self._lock:
+            entry = self.request_times["cold" if cold else "warm"]
+            entry[0] += 1
+            entry[1] += seconds
+
+    def handshake_seconds(self):
+        """
+        Estimated cost of opening a connection: mean request time on a new connection
+        minus mean request time on a reused one, or None until both have been seen
+        """
+        with self._lock:
+            (cold, cold_seconds), (warm, warm_seconds) = self.request_times["cold"], self.request_times["warm"]
+        if not cold or not warm:
+            return None
+        return max(cold_seconds / cold - warm_seconds / warm, 0.0)
+
+    def stats(self):
+        opened = self.connections_opened()
+        handshakes_saved = max(self.requests_sent - opened, 0)
+        handshake = self.handshake_seconds()
+        return {"requests": self.requests_sent, "connections": opened,
+                "handshakes_saved": handshakes_saved,
+                "handshake_seconds": None if handshake is None else round(handshake, 4),
+                "latency_saved_seconds": None if handshake is None else round(handshakes_saved * handshake, 2),
+                "files_skipped": self.files_skipped, "bytes_skipped": self.bytes_skipped,
+                "calls_skipped": self.calls_skipped, "rate_limited": self.rate_limited,
+                "rate_wait_seconds": round(self.rate_wait_seconds, 1), "rate_remaining": self.rate_remaining}
+
+    def _record_skip(self, content, calls):
+        self.files_skipped += 1
+        self.bytes_skipped += len(content.encode("utf-8") if isinstance(content, str) else content)
+        self.calls_skipped += calls
+
+    #  support file: public/private repo , result: single file sha
+    #  support dir: public/private repo ,  result: all files sha
+    #  raises NotFoundError when the path does not exist
+    def get_sha(self, _owner, _repo, _path="", _token=None):
+        sha_url = self.contents_url(_owner, _repo, _path)
+
+        print(f"Fetching from GitHub: {sha_url}")
+        resp = self.request("get", sha_url, _token)
         rsult = resp.text
         if isDebug:
             print("getSha url: " + sha_url)
             print("getSha result: " + rsult)
         print(f"GitHub response status: {resp.status_code}")
+        raise_for_status(resp, "get sha")
         return rsult
-    except requests.exceptions.Timeout:
-        print(f"TIMEOUT: GitHub API request took too long: {sha_url}")
-        return ""
-    except requests.exceptions.RequestException as e:
-        print(f"ERROR: GitHub API request failed: {e}")
-        return ""
+
+    def _parse_sha(self, sha_text, action):
+        try:
+            return json.loads(sha_text)['sha']
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            raise GithubError(f"Failed to parse SHA response, aborting {action}: {e}") from e
+
+    def _write(self, method, url, _data, _token, action):
+        resp = self.request(method, url, _token, timeout=15, data=_data)
+        result = resp.text
+        print(f"GitHub {action} status: {resp.status_code}")
+        if isDebug:
+            print(action + " url:" + url)
+            print(action + " data:" + _data)
+            print(action + " resp:" + result)
+        raise_for_status(resp, action)
+        return result
+
+    def create_file(self, _owner, _repo, _path="", _token=None, _filename: str = "",
+                    _content_not_base64: str = "", _content_base64ed: str = "",
+                    _commit_msg=_COMMIT_MSG, _name=_NAME, _email=_EMAIL):
+        content_final = prepareContent(_content_base64ed, _content_not_base64, _filename)
+        create_url = self.contents_url(_owner, _repo, _path)
+        _data = json.dumps({"content": content_final, "message": _commit_msg,
+                            "committer": {"name": _name, "email": _email}})
+
+        print(f"Creating GitHub file: {create_url}")
+        return self._write("put", create_url, _data, _token, "create")
+
+    def update_content(self, _owner, _repo, _path="", _token=None, _filename: str = "",
+                       _content_not_base64: str = "", _content_base64ed: str = "",
+                       _commit_msg=_COMMIT_MSG, _name=_NAME, _email=_EMAIL):
+        content_final = prepareContent(_content_base64ed, _content_not_base64, _filename)
+        update_url = self.contents_url(_owner, _repo, _path)
+
+        print(f"Updating GitHub file: {update_url}")
+        sha_text = self.get_sha(_owner, _repo, _path, _token)
+        sha = self._parse_sha(sha_text, "update")
+
+        # Same blob already published: skip the PUT (and the empty commit it would create).
+        # Hashed over the decoded bytes, so text, base64 and gzip content all qualify
+        data = base64.b64decode(content_final)
+        if sha == git_blob_sha(data):
+            print(f"GitHub update skipped, content unchanged: {update_url}")
+            self._record_skip(data, 1)
+            return sha_text
+
+        _data = json.dumps({"content": content_final, "message": _commit_msg, "sha": sha,
+                            "committer": {"name": _name, "email": _email}})
+        return self._write("put", update_url, _data, _token, "update")
+
+    def delete_file(self, _owner, _repo, _path="", _token=None,
+                    _commit_msg=_COMMIT_MSG, _name=_NAME, _email=_EMAIL):
+        delete_url = self.contents_url(_owner, _repo, _path)
+
+        print(f"Deleting GitHub file: {delete_url}")
+        sha = self._parse_sha(self.get_sha(_owner, _repo, _path, _token), "delete")
+
+        _data = json.dumps({"message": _commit_msg, "sha": sha,
+                            "committer": {"name": _name, "email": _email}})
+        return self._write("delete", delete_url, _data, _token, "delete")
+
+    def list_files(self, _owner, _repo, _path="", _token=None):
+        """
+        Repo paths of the files under a directory, subdirectories included, through the contents API
+        Returns: [] for a directory that does not exist
+        Raises: GithubError
+        """
+        listing_url = self.contents_url(_owner, _repo, _path)
+        resp = self.request("get", listing_url, _token)
+        if resp.status_code == 404:
+            return []
+        raise_for_status(resp, "list")
+        try:
+            items = resp.json()
+            if not isinstance(items, list):
+                raise TypeError("not a directory listing")
+            paths = []
+            for item in items:
+                if item["type"] == "dir":
+                    paths += self.list_files(_owner, _repo, item["path"], _token)
+                else:
+                    paths.append(item["path"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise GithubError(f"Failed to parse directory listing: {e}", resp.status_code, listing_url) from e
+        return paths
+
+    def prune_files(self, _owner, _repo, _prefixes, _keep=(), _token=None, _commit_msg=_COMMIT_MSG,
+                    _name=_NAME, _email=_EMAIL):
+        """
+        commit_files' _prune_prefix for the per-file contents API path: delete the files under
+        _prefixes (a directory or a tuple of them) that are not in _keep, one commit each
+        Returns: the deleted paths
+        Raises: GithubError
+        """
+        prefixes = (_prefixes,) if isinstance(_prefixes, str) else tuple(_prefixes)
+        deleted = []
+        for prefix in prefixes:
+            for path in stale_paths(self.list_files(_owner, _repo, prefix.rstrip("/"), _token), prefixes, _keep):
+                print(f"GitHub file no longer published, deleting: {path}")
+                self.delete_file(_owner, _repo, "/" + path, _token, _commit_msg, _name, _email)
+                deleted.append(path)
+        return deleted
+
+    def _cache_paths(self, _owner, _repo, _path):
+        key = hashlib.sha1("{}/{}/{}".format(_owner, _repo, _path.lstrip("/")).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".json"), os.path.join(self.cache_dir, key + ".body")
+
+    def _cache_load(self, _owner, _repo, _path):
+        """Cached (etag, body) for a repo path, or None"""
+        if not self.cache_dir:
+            return None
+        meta_path, body_path = self._cache_paths(_owner, _repo, _path)
+        try:
+            with open(meta_path, "r") as f:
+                etag = json.load(f)["etag"]
+            with open(body_path, "r", encoding="utf-8") as f:
+                return etag, f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _cache_store(self, _owner, _repo, _path, etag, body):
+        if not self.cache_dir or not etag:
+            return
+        meta_path, body_path = self._cache_paths(_owner, _repo, _path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Body first: a meta file must never point at a missing or partial body
+            with open(body_path, "w", encoding="utf-8") as f:
+                f.write(body)
+            with open(meta_path, "w") as f:
+                json.dump({"etag": etag, "path": "{}/{}/{}".format(_owner, _repo, _path)}, f)
+        except OSError as e:
+            print(f"WARNING: Could not write GitHub cache: {e}")
+
+    def _get_raw_blob(self, _owner, _repo, sha, _token=None):
+        """Raw blob bytes by sha; works for files the contents API will not inline (> 1 MB)"""
+        blob_url = "{}/repos/{}/{}/git/blobs/{}".format(self.api_root, _owner, _repo, sha)
+        resp = self.request("get", blob_url, _token, timeout=60,
+                            headers={"Accept": "application/vnd.github.raw"})
+        raise_for_status(resp, "blob download")
+        return resp.content.decode("utf-8")
+
+    def get_content(self, _owner, _repo, _path="", _token=None):
+        """
+        Decoded file content. A cached ETag is sent as If-None-Match,
+        so an unchanged file costs one 304 with no transfer and no base64 decode.
+        Raises: NotFoundError for a missing file, GithubError for other failures
+        """
+        print(f"Fetching from GitHub: {self.contents_url(_owner, _repo, _path)}")
+        res, status = self._fetch_content(_owner, _repo, _path, _token)
+        print(f"GitHub response status: {status}")
+        if status == 304:
+            print(f"GitHub content not modified, using cache: {_path}")
+        return res
+
+    def _fetch_content(self, _owner, _repo, _path, _token=None):
+        """
+        get_content without logging, safe to run from worker threads
+        Returns: (content, HTTP status of the contents request; 304 means served from the cache)
+        """
+        content_url = self.contents_url(_owner, _repo, _path)
+        cached = self._cache_load(_owner, _repo, _path)
+        resp = self.request("get", content_url, _token,
+                            headers={"If-None-Match": cached[0]} if cached else None)
+
+        if resp.status_code == 304 and cached:
+            return cached[1], 304
+        raise_for_status(resp, "download")
+
+        try:
+            sha_json = resp.json()
+        except ValueError as e:
+            raise GithubError(f"Failed to parse GitHub response as JSON: {e}", resp.status_code, content_url) from e
+
+        if isDebug:
+            print(sha_json)
+
+        # suport base64
+        try:
+            ct = sha_json['content']
+            eds = sha_json['encoding']
+            if "base64" == eds and ct:
+                res = str(base64.b64decode(ct.encode("utf-8")), "utf-8")
+            elif "none" == eds or (not ct and sha_json.get('size')):
+                # Above the contents API inline limit: fetch the blob raw
+                res = self._get_raw_blob(_owner, _repo, sha_json['sha'], _token)
+            else:
+                res = ct
+        except (KeyError, TypeError) as e:
+            raise GithubError(f"Missing key in GitHub response: {e}", resp.status_code, content_url) from e
+
+        self._cache_store(_owner, _repo, _path, resp.headers.get("ETag"), res)
+        return res, resp.status_code
+
+    def get_contents(self, _owner, _repo, _paths, _token=None):
+        """
+        get_content for several paths in parallel over the shared pool.
+        Workers stay quiet; one line per path is logged, in order, once all have returned.
+        Returns: {path: content}, "" for files that do not exist
+        Raises: GithubError for failures other than a missing file
+        """
+        def fetch(path):
+            try:
+                return self._fetch_content(_owner, _repo, path, _token)
+            except NotFoundError:
+                return "", None
+
+        with ThreadPoolExecutor(max_workers=max(len(_paths), 1)) as executor:
+            results = dict(zip(_paths, executor.map(fetch, _paths)))
+        for path, (content, status) in results.items():
+            if status is None:
+                print(f"GitHub file not found: {path}")
+            elif status == 304:
+                print(f"GitHub content not modified, using cache: {path}")
+            else:
+                print(f"Fetched from GitHub: {path} (status {status}, {len(content)} chars)")
+        return {path: content for path, (content, _) in results.items()}
+
+    def _git_call(self, method, url, _token, payload=None):
+        """One Git Data API call; returns the decoded JSON body, raises GithubError on failure"""
+        resp = self.request(method, url, _token, timeout=15,
+                            data=None if payload is None else json.dumps(payload))
+        raise_for_status(resp, f"{method.upper()} {api_endpoint(url)}")
+        return resp.json()
+
+    def commit_files(self, _owner, _repo, _files, _token=None, _commit_msg=_COMMIT_MSG,
+                     _branch=BRANCH, _name=_NAME, _email=_EMAIL, _prune_prefix=None, _keep=()):
+        """
+        Publish several files as one commit through the Git Data API:
+        read the branch head, build a tree on top of it, commit, then move the ref once.
+        _files maps repo path -> str (sent inline in the tree) or bytes (uploaded as a blob first).
+        Files whose git blob sha matches the branch are skipped; if none changed, no commit is made.
+        With _prune_prefix (a directory or a tuple of them), files on the branch under it that are
+        neither in _files nor in _keep are deleted.
+        Returns: new commit sha (the current head if nothing changed)
+        Raises: GithubError; ConflictError when the branch moved while committing
+        """
+        repo_url = "{}/repos/{}/{}".format(self.api_root, _owner, _repo)
+
+        branch = self._git_call("get", "{}/branches/{}".format(repo_url, _branch), _token)
+        parent_sha = branch["commit"]["sha"]
+        base_tree = branch["commit"]["commit"]["tree"]["sha"]
+
+        # Blob shas already on the branch; files whose content hashes the same are left out
+        listing = self._git_call("get", "{}/git/trees/{}?recursive=1".format(repo_url, base_tree), _token)
+        remote_shas = {item["path"]: item["sha"] for item in listing.get("tree", []) if item.get("type") == "blob"}
+
+        tree = []
+        for path, content in _files.items():
+            path = path.lstrip("/")
+            if remote_shas.get(path) == git_blob_sha(content):
+                print(f"GitHub file unchanged, skipping: {path}")
+                self._record_skip(content, 1 if isinstance(content, bytes) else 0)
+                continue
+            entry = {"path": path, "mode": "100644", "type": "blob"}
+            if isinstance(content, bytes):
+                blob = self._git_call("post", repo_url + "/git/blobs", _token, {
+                    "content": str(base64.b64encode(content), "utf-8"), "encoding": "base64"})
+                entry["sha"] = blob["sha"]
+            else:
+                entry["content"] = content
+            tree.append(entry)
+
+        if _prune_prefix:
+            for path in stale_paths(remote_shas, _prune_prefix, list(_files) + list(_keep)):
+                print(f"GitHub file no longer published, deleting: {path}")
+                tree.append({"path": path, "mode": "100644", "type": "blob", "sha": None})
+
+        if not tree:
+            # Nothing changed: no tree, commit or ref update needed
+            self.calls_skipped += 3
+            print(f"GitHub: all {len(_files)} files unchanged, nothing to commit")
+            return parent_sha
+
+        new_tree = self._git_call("post", repo_url + "/git/trees", _token, {"base_tree": base_tree, "tree": tree})
+
+        committer = {"name": _name, "email": _email}
+        commit = self._git_call("post", repo_url + "/git/commits", _token, {
+            "message": _commit_msg, "tree": new_tree["sha"], "parents": [parent_sha],
+            "author": committer, "committer": committer})
+
+        # Fast-forward only: if someone pushed meanwhile this fails instead of clobbering them
+        self._git_call("patch", "{}/git/refs/heads/{}".format(repo_url, _branch), _token,
+                       {"sha": commit["sha"], "force": False})
+        print(f"GitHub commit {commit['sha'][:7]}: {len(tree)} files -> {_owner}/{_repo}@{_branch}")
+        return commit["sha"]
+
+
+_default_client = None
+
+
+def default_client():
+    """Process-wide GithubClient used by the module-level functions below"""
+    global _default_client
+    if _default_client is None:
+        _default_client = GithubClient()
+    return _default_client
+
+
+#  support file: public/private repo , result: single file sha
+#  support dir: public/private repo ,  result: all files sha
+def getSha(_owner, _repo, _path=""
+           , __token=os.getenv('GITHUB_TOKEN', "")):
+    return default_client().get_sha(_owner, _repo, _path, __token)
 
 
 def create_file(_owner, _repo, _path=""
@@ -109,31 +685,8 @@ def create_file(_owner, _repo, _path=""
     # 1. text about base64ed.           need do nothing
     # 2. text about has not base64.     need base64
     # 3. file name.                     need read content,and base64
-    content_final = prepareContent(_content_base64ed, _content_not_base64, _filename)
-
-    # check path, the data which not startwith "/", will append "/" add the header
-    _path = preparePath(_path, make_prefix="/")
-
-    create_url = "https://api.github.com/repos/{}/{}/contents{}".format(_owner, _repo, _path)
-    _data = "{\"content\":\"" + content_final + "\",\"message\":\"" + _commit_msg + "\" ,\"committer\":{ \"name\":\"" + _name + "\",\"email\":\"" + _email + "\" }}"
-    _headers = getGithubRequestHeader(_token)
-
-    print(f"Creating GitHub file: {create_url}")
-    try:
-        resp = requests.request(method="put", url=create_url, data=_data, headers=_headers, verify=False, timeout=15)
-        result = resp.text
-        print(f"GitHub create status: {resp.status_code}")
-        if isDebug:
-            print("create_file url:" + create_url)
-            print("create_file data:" + _data)
-            print("create_file resp:" + result)
-        return result
-    except requests.exceptions.Timeout:
-        print(f"TIMEOUT: GitHub create request took too long")
-        return ""
-    except requests.exceptions.RequestException as e:
-        print(f"ERROR: GitHub create request failed: {e}")
-        return ""
+    return default_client().create_file(_owner, _repo, _path, _token, _filename, _content_not_base64,
+                                        _content_base64ed, _commit_msg, _name, _email)
 
 
 #  support private/public repo file
@@ -146,48 +699,8 @@ def update_content(_owner, _repo, _path=""
                    , _name=_NAME
                    , _email=_EMAIL
                    ):
-    # content. from args. priority:
-    # 1. text about base64ed.           need do nothing
-    # 2. text about has not base64.     need base64
-    # 3. file name.                     need read content,and base64
-    content_final = prepareContent(_content_base64ed, _content_not_base64, _filename)
-
-    # check path, the data which not startwith "/", will append "/" add the header
-    _path = preparePath(_path, make_prefix="/")
-    update_url = "https://api.github.com/repos/{}/{}/contents{}".format(_owner, _repo, _path)
-
-    print(f"Updating GitHub file: {update_url}")
-    sha_text = getSha(_owner, _repo, _path, __token=_token)
-    if not sha_text:
-        print("ERROR: Failed to get SHA from GitHub, aborting update")
-        return ""
-
-    try:
-        sha_json = json.loads(sha_text)
-        sha = sha_json['sha']
-    except (json.JSONDecodeError, KeyError) as e:
-        print(f"ERROR: Failed to parse SHA response: {e}")
-        return ""
-
-    _data = "{\"content\":\"" + content_final + "\",\"message\":\"" + _commit_msg + "\" ,\"sha\":\"" + sha + "\" ,\"committer\":{ \"name\":\"" + _name + "\",\"email\":\"" + _email + "\" }}"
-    _headers = getGithubRequestHeader(_token)
-
-    try:
-        resp = requests.request(method="put", url=update_url, data=_data, headers=_headers, verify=False, timeout=15)
-        result = resp.text
-        print(f"GitHub update status: {resp.status_code}")
-        if isDebug:
-            print("update_content url:" + update_url)
-            print(_headers)
-            print("update_content data:" + _data)
-            print("update_content resp:" + result)
-        return result
-    except requests.exceptions.Timeout:
-        print(f"TIMEOUT: GitHub update request took too long")
-        return ""
-    except requests.exceptions.RequestException as e:
-        print(f"ERROR: GitHub update request failed: {e}")
-        return ""
+    return default_client().update_content(_owner, _repo, _path, _token, _filename, _content_not_base64,
+                                           _content_base64ed, _commit_msg, _name, _email)
 
 
 def delete_file(_owner, _repo, _path=""
@@ -196,76 +709,25 @@ def delete_file(_owner, _repo, _path=""
                 , _name=_NAME
                 , _email=_EMAIL
                 ):
-    # check path, the data which not startwith "/", will append "/" add the header
-    _path = preparePath(_path, make_prefix="/")
-    update_url = "https://api.github.com/repos/{}/{}/contents{}".format(_owner, _repo, _path)
-
-    print(f"Deleting GitHub file: {update_url}")
-    sha_text = getSha(_owner, _repo, _path, __token=_token)
-    if not sha_text:
-        print("ERROR: Failed to get SHA from GitHub, aborting delete")
-        return ""
+    return default_client().delete_file(_owner, _repo, _path, _token, _commit_msg, _name, _email)
 
-    try:
-        sha_json = json.loads(sha_text)
-        sha = sha_json['sha']
-    except (json.JSONDecodeError, KeyError) as e:
-        print(f"ERROR: Failed to parse SHA response: {e}")
-        return ""
-
-    _data = "{\"message\":\"" + _commit_msg + "\" ,\"sha\":\"" + sha + "\" ,\"committer\":{ \"name\":\"" + _name + "\",\"email\":\"" + _email + "\" }}"
-    _headers = getGithubRequestHeader(_token)
 
-    try:
-        resp = requests.request(method="delete", url=update_url, data=_data, headers=_headers, verify=False, timeout=15)
-        result = resp.text
-        print(f"GitHub delete status: {resp.status_code}")
-        if isDebug:
-            print("delete_file url:" + update_url)
-            print(_headers)
-            print("delete_file data:" + _data)
-            print("delete_file resp:" + result)
-        return result
-    except requests.exceptions.Timeout:
-        print(f"TIMEOUT: GitHub delete request took too long")
-        return ""
-    except requests.exceptions.RequestException as e:
-        print(f"ERROR: GitHub delete request failed: {e}")
-        return ""
+def prune_files(_owner, _repo, _prefixes, _keep=(), _token=os.getenv('GITHUB_TOKEN', ""), _commit_msg=_COMMIT_MSG):
+    return default_client().prune_files(_owner, _repo, _prefixes, _keep, _token, _commit_msg)
 
 
 def get_content(_owner, _repo, _path="", _token=os.getenv('GITHUB_TOKEN', "")):
-    # check path, the data which not startwith "/", will append "/" add the header
-    _path = preparePath(_path, make_prefix="/")
-    info = getSha(_owner, _repo, _path, _token)
+    return default_client().get_content(_owner, _repo, _path, _token)
 
-    if not info:
-        print("ERROR: Failed to get content from GitHub (getSha returned empty)")
-        return ""
 
-    if isDebug:
-        print("get_content sha info:" + info)
+def get_contents(_owner, _repo, _paths, _token=os.getenv('GITHUB_TOKEN', "")):
+    return default_client().get_contents(_owner, _repo, _paths, _token)
 
-    try:
-        sha_json = json.loads(info)
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Failed to parse GitHub response as JSON: {e}")
-        return ""
-
-    if isDebug:
-        print(sha_json)
 
-    # suport base64
-    try:
-        ct = sha_json['content']
-        eds = sha_json['encoding']
-        if "base64" == eds:
-            res = str(base64.b64decode(ct.encode("utf-8")), "utf-8")
-            return res
-        return ct
-    except KeyError as e:
-        print(f"ERROR: Missing key in GitHub response: {e}")
-        return ""
+def commit_files(_owner, _repo, _files, _token=os.getenv('GITHUB_TOKEN', ""), _commit_msg=_COMMIT_MSG,
+                 _prune_prefix=None, _keep=()):
+    return default_client().commit_files(_owner, _repo, _files, _token, _commit_msg,
+                                         _prune_prefix=_prune_prefix, _keep=_keep)
 
 
 if __name__ == '__main__':
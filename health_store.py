@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+
+# Health database configuration
+HEALTH_DB_PATH = os.getenv('HEALTH_DB_PATH', 'proxy_health.json')
+EWMA_ALPHA = 0.3  # Weight of the newest latency sample
+GOOD_RECHECK_INTERVAL = 30 * 60  # Re-probe proxies that passed last time after this many seconds
+FAIL_BACKOFF_BASE = 15 * 60  # First retry delay after a failure, doubled per consecutive failure
+FAIL_BACKOFF_MAX = 24 * 3600  # Upper bound on the failure backoff
+PRUNE_AFTER = 7 * 24 * 3600  # Forget proxies not checked for this long
+CARRY_OVER_TTL = 2 * 3600  # A good proxy the run deadline left unprobed stays published this long
+
+# Positions inside a compact record: [last_checked, streak, ewma_latency]
+# streak > 0 counts consecutive successes, streak < 0 consecutive failures
+LAST_CHECKED, STREAK, EWMA = 0, 1, 2
+UNKNOWN_LATENCY = 1e9  # Sorts proxies without a latency figure last within their tier
+
+
+def health_key(proxy):
+    """Key a proxy by host:port:type"""
+    return f"{proxy.get('host')}:{proxy.get('port')}:{proxy.get('type', 'http')}"
+
+
+class HealthStore:
+    """Per-proxy probe history persisted as one compact JSON file between runs"""
+
+    recheck_interval = GOOD_RECHECK_INTERVAL  # The daemon re-probes good proxies more often
+
+    def __init__(self, path=HEALTH_DB_PATH, records=None):
+        self.path = path
+        self.records = records if records is not None else {}
+        # select() outcomes: the last call's, and the totals since the store was loaded
+        self.last_selection = {}
+        self.selected = {"fresh": 0, "due": 0, "carried_over": 0, "backoff": 0}
+
+    @classmethod
+    def load(cls, path=HEALTH_DB_PATH):
+        """Load the store from disk, starting empty if it is missing or unreadable"""
+        records = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    records = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[-] Warning: Could not read health store {path}: {e}")
+        return cls(path, records)
+
+    def save(self, now=None):
+        """Prune long-unchecked entries and write the store to disk"""
+        now = now or time.time()
+        self.records = {
+            key: record for key, record in self.records.items()
+            if now - record[LAST_CHECKED] <= PRUNE_AFTER
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.records, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def record(self, proxy, is_valid, response_time=None, now=None):
+        """Fold one probe outcome into the proxy's streak and latency EWMA"""
+        now = now or time.time()
+        key = health_key(proxy)
+        last_checked, streak, ewma = self.records.get(key, [0, 0, None])
+
+        if is_valid:
+            streak = streak + 1 if streak > 0 else 1
+            if response_time is not None:
+                ewma = response_time if ewma is None else EWMA_ALPHA * response_time + (1 - EWMA_ALPHA) * ewma
+                ewma = round(ewma, 3)
+        else:
+            streak = streak - 1 if streak < 0 else -1
+
+        self.records[key] = [round(now), streak, ewma]
+
+    def update(self, probed_proxies, valid_proxies, now=None):
+        """Record the outcome of every probed proxy given the list that passed"""
+        valid_by_key = {health_key(proxy): proxy for proxy in valid_proxies}
+        for proxy in probed_proxies:
+            valid = valid_by_key.get(health_key(proxy))
+            if valid is not None:
+                self.record(proxy, True, valid.get('response_time'), now)
+            else:
+                self.record(proxy, False, now=now)
+
+    def next_due(self, record):
+        """Timestamp after which a proxy should be probed again"""
+        last_checked, streak, _ = record
+        if streak > 0:
+            return last_checked + self.recheck_interval
+        failures = max(-streak, 1)
+        return last_checked + min(FAIL_BACKOFF_BASE * 2 ** (failures - 1), FAIL_BACKOFF_MAX)
+
+    def priority(self, proxy):
+        """
+        Probe order under a run budget, lowest first
+        Returns: (tier, rank)
+            tier 0: never seen (new from a source), rank = advertised response_time
+            tier 1: passed last time, rank = EWMA latency
+            tier 2: failed last time, rank = consecutive failures
+        """
+        record = self.records.get(health_key(proxy))
+        if record is None:
+            latency = proxy.get('response_time')
+            return 0, latency if isinstance(latency, (int, float)) else UNKNOWN_LATENCY
+        if record[STREAK] > 0:
+            return 1, record[EWMA] if record[EWMA] is not None else UNKNOWN_LATENCY
+        return 2, -record[STREAK]
+
+    def carry_over(self, proxy, now=None, ttl=CARRY_OVER_TTL):
+        """
+        Copy of a proxy left unprobed by the run deadline, if its last probe passed within ttl
+        Returns: proxy annotated with its EWMA latency, or None
+        """
+        now = now or time.time()
+        record = self.records.get(health_key(proxy))
+        if record is None or record[STREAK] <= 0 or now - record[LAST_CHECKED] > ttl:
+            return None
+        proxy_copy = proxy.copy()
+        if record[EWMA] is not None:
+            proxy_copy['response_time'] = round(record[EWMA], 2)
+        return proxy_copy
+
+    def select(self, proxies, now=None):
+        """
+        Split candidates into those to probe this run and those to carry over
+        Returns: (to_probe, carried_over)
+            to_probe: unseen proxies first, then due proxies ordered by success streak
+            carried_over: recently good proxies annotated with their EWMA latency
+        """
+        now = now or time.time()
+        fresh, due, carried_over = [], [], []
+
+        for proxy in proxies:
+            record = self.records.get(health_key(proxy))
+            if record is None:
+                fresh.append(proxy)
+            elif now >= self.next_due(record):
+                due.append((record, proxy))
+            elif record[STREAK] > 0:
+                proxy_copy = proxy.copy()
+                if record[EWMA] is not None:
+                    proxy_copy['response_time'] = round(record[EWMA], 2)
+                carried_over.append(proxy_copy)
+            # else: chronic failure still inside its backoff window, skipped
+
+        due.sort(key=lambda item: -item[0][STREAK])
+        to_probe = fresh + [proxy for _, proxy in due]
+        self.last_selection = {"fresh": len(fresh), "due": len(due), "carried_over": len(carried_over),
+                               "backoff": len(proxies) - len(to_probe) - len(carried_over)}
+        for name, count in self.last_selection.items():
+            self.selected[name] += count
+        print(f"[*] Health store: {self.summary(self.last_selection)}")
+        return to_probe, carried_over
+
+    def summary(self, counts=None):
+        """One log line of select() outcomes, by default the totals since the store was loaded"""
+        counts = self.selected if counts is None else counts
+        return (f"{counts['fresh']} fresh, {counts['due']} due, {counts['carried_over']} carried over, "
+                f"{counts['backoff']} in backoff")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON-lines loader for candidate lists and downloaded snapshots.
+
+A file is memory-mapped and cut into PARSE_CHUNK_BYTES chunks at newline boundaries;
+large inputs are parsed by a pool of PARSE_PROCESSES workers, each mapping the file
+itself, and records come back in file order with at most two chunks per worker in
+flight, so memory stays flat. The garbage collector is paused while a chunk is parsed:
+the records are acyclic, and collections triggered by the allocations otherwise cost
+more than the parsing.
+
+orjson is used when installed (FAST_JSON=1). It parses faster in-process than the
+parent can unpickle results from workers, so with orjson the default is one process.
+
+Lines that are not a JSON object are skipped and counted: the total is printed once
+the input is exhausted and added to parse_malformed_lines_total{source=...}.
+"""
+
+import gc
+import os
+import json
+import mmap
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = os.getenv('FAST_JSON', '1') == '1'  # Use orjson when it is installed
+PARSE_PROCESSES = int(os.getenv('PARSE_PROCESSES', '1' if orjson is not None and FAST_JSON else str(os.cpu_count() or 1)))
+PARSE_CHUNK_BYTES = int(os.getenv('PARSE_CHUNK_BYTES', str(1024 * 1024)))
+PARALLEL_PARSE_MIN_BYTES = int(os.getenv('PARALLEL_PARSE_MIN_BYTES', str(16 * 1024 * 1024)))  # Smaller inputs parse in-process
+
+
+def backend():
+    """Name of the JSON parser in use"""
+    return "orjson" if orjson is not None and FAST_JSON else "json"
+
+
+def dumps(obj):
+    """
+    Compact JSON bytes for spooling records to disk (orjson when available). Published
+    files keep json.dumps formatting.
+    """
+    if orjson is not None and FAST_JSON:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:  # e.g. an int beyond 64 bits
+            pass
+    return json.dumps(obj).encode('utf-8')
+
+
+def loads(data):
+    """Parse bytes written by dumps()"""
+    return orjson.loads(data) if orjson is not None and FAST_JSON else json.loads(data)
+
+
+def parse_lines(data):
+    """
+    Parse a block of JSON lines
+    Returns: (list of objects, number of malformed lines)
+    """
+    loads = orjson.loads if orjson is not None and FAST_JSON else json.loads
+    records = []
+    malformed = 0
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for line in data.split(b'\n'):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = loads(line)
+            except ValueError:  # json, orjson and utf-8 decode errors all derive from it
+                malformed += 1
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+            else:
+                malformed += 1
+    finally:
+        if collecting:
+            gc.enable()
+    return records, malformed
+
+
+def _parse_span(path, start, end):
+    """Worker entry: parse bytes [start, end) of path through the worker's own mapping"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return parse_lines(mapped[start:end])
+
+
+def chunk_bounds(data, chunk_bytes=PARSE_CHUNK_BYTES):
+    """
+    Split a buffer (bytes or mmap) into spans that end just after a newline
+    Returns: list of (start, end)
+    """
+    bounds = []
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find(b'\n', min(start + chunk_bytes, size) - 1)
+        end = size if end == -1 else end + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _iter_parsed(blocks, source):
+    """Yield the records of (records, malformed) blocks, then report the malformed total"""
+    malformed = 0
+    for records, bad in blocks:
+        malformed += bad
+        yield from records
+    if malformed:
+        metrics.inc("parse_malformed_lines_total", malformed, source=source)
+        print(f"[-] Warning: Skipped {malformed} malformed lines in {source}")
+
+
+def _pooled(path, bounds, processes):
+    """Parse spans of path in worker processes, yielding blocks in order"""
+    window = processes * 2
+    with ProcessPoolExecutor(processes) as pool:
+        futures = []
+        for start, end in bounds:
+            futures.append(pool.submit(_parse_span, path, start, end))
+            if len(futures) >= window:
+                yield futures.pop(0).result()
+        for future in futures:
+            yield future.result()
+
+
+def iter_file(path, processes=PARSE_PROCESSES, chunk_bytes=PARSE_CHUNK_BYTES, source=None):
+    """
+    Lazily parse a JSON-lines file, in processes workers if it is large enough
+    Returns: iterator of objects
+    """
+    source = source or os.path.basename(path)
+    if os.path.getsize(path) == 0:
+        return _iter_parsed([], source)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        bounds = chunk_bounds(mapped, chunk_bytes)
+        if processes > 1 and len(mapped) >= PARALLEL_PARSE_MIN_BYTES:
+            return _iter_parsed(_pooled(path, bounds, processes), source)
+    return _iter_parsed((_parse_span(path, start, end) for start, end in bounds), source)
+
+
+def iter_text(content, chunk_bytes=PARSE_CHUNK_BYTES, source="text"):
+    """
+    Lazily parse JSON lines held in memory, e.g. a downloaded snapshot. Parsed in-process:
+    shipping the text to workers costs about as much as parsing it with orjson.
+    Returns: iterator of objects
+    """
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    return _iter_parsed((parse_lines(data[start:end]) for start, end in chunk_bounds(data, chunk_bytes)), source)
+
+
+def iter_lines(lines, source="lines", batch_lines=10000):
+    """
+    Lazily parse an iterable of JSON lines (str or bytes), e.g. an open file or a stream
+    that cannot be mapped, batch_lines at a time
+    Returns: iterator of objects
+    """
+    def blocks():
+        iterator = iter(lines)
+        while True:
+            batch = list(islice(iterator, batch_lines))
+            if not batch:
+                return
+            yield parse_lines(b'\n'.join(line.encode('utf-8') if isinstance(line, str) else line for line in batch))
+
+    return _iter_parsed(blocks(), source)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import threading
+
+# Judge endpoints, comma separated; every one must echo the caller's IP
+JUDGE_URLS = [url.strip() for url in os.getenv('JUDGE_URLS', "http://httpbin.org/get").split(',') if url.strip()]
+JUDGE_MIN_SAMPLES = 20  # Answers needed before a judge can be dropped
+JUDGE_ERROR_MARGIN = 0.3  # Drop a judge whose error rate exceeds the rest of the pool's by this much
+JUDGE_SLOW_FACTOR = 3.0  # Drop a judge whose latency EWMA exceeds the healthy median by this factor
+JUDGE_EWMA_ALPHA = 0.2
+
+_IP_PATTERN = re.compile(r'\d{1,3}(?:\.\d{1,3}){3}|[0-9a-fA-F]*:[0-9a-fA-F:]+')
+
+
+def extract_origin(body):
+    """
+    Pull the caller IP out of a judge response body, whatever the judge type
+    Supports httpbin ("origin"), ipify/ipinfo ("ip"), ip-api ("query") and plain-text echoes
+    Returns: origin string, or None if the body does not look like a judge answer
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    text = body.strip()
+
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+
+    if isinstance(data, dict):
+        for field in ('origin', 'ip', 'query'):
+            value = data.get(field)
+            if isinstance(value, str) and value:
+                return value
+        return None
+
+    # Plain-text judges (icanhazip, ifconfig.me) answer with the bare address
+    if _IP_PATTERN.fullmatch(text):
+        return text
+    return None
+
+
+def _decode_chunked(body):
+    """Decode an HTTP/1.1 chunked transfer-encoded body"""
+    decoded = b''
+    while body:
+        size_line, _, rest = body.partition(b'\r\n')
+        size = int(size_line.split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            break
+        decoded += rest[:size]
+        body = rest[size + 2:]
+    return decoded
+
+
+def parse_http_response(raw):
+    """
+    Split a raw HTTP/1.x response, or just its head (the body is then b'')
+    Returns: (status_code, headers with lower-case names, body)
+    Raises: ValueError if the status line is not "HTTP/x.y <code> ..."
+    """
+    head, _, body = raw.partition(b'\r\n\r\n')
+    lines = head.decode('iso-8859-1').split('\r\n')
+    status = lines[0].split(' ', 2)
+    if len(status) < 2 or not status[0].startswith('HTTP/') or not status[1].isdigit():
+        raise ValueError(f"Malformed HTTP status line: {lines[0][:80]!r}")
+    status_code = int(status[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = _decode_chunked(body)
+    elif 'content-length' in headers:
+        body = body[:int(headers['content-length'])]
+    return status_code, headers, body
+
+
+class JudgePool:
+    """Round-robin over judge endpoints, dropping ones that turn slow or error-prone"""
+
+    def __init__(self, urls=None):
+        self._lock = threading.Lock()
+        self._next = 0
+        self.stats = {
+            url: {"ok": 0, "errors": 0, "ewma": None, "dropped": False}
+            for url in (urls or JUDGE_URLS)
+        }
+
+    def healthy(self, http_only=False):
+        return [
+            url for url, stat in self.stats.items()
+            if not stat["dropped"] and (not http_only or url.startswith("http://"))
+        ]
+
+    def pick(self, http_only=False):
+        """Next judge URL; http_only restricts to judges reachable without CONNECT"""
+        with self._lock:
+            urls = self.healthy(http_only)
+            if not urls:
+                raise ValueError("No usable judge URL configured" + (" (http:// required)" if http_only else ""))
+            url = urls[self._next % len(urls)]
+            self._next += 1
+            return url
+
+    def report(self, url, ok, latency=None):
+        """
+        Record one answer from a judge. Only judge-side failures count as errors:
+        an HTTP error status or a body without an origin. Proxy timeouts are not reported.
+        """
+        with self._lock:
+            stat = self.stats[url]
+            if ok:
+                stat["ok"] += 1
+                if latency is not None:
+                    stat["ewma"] = latency if stat["ewma"] is None else \
+                        JUDGE_EWMA_ALPHA * latency + (1 - JUDGE_EWMA_ALPHA) * stat["ewma"]
+            else:
+                stat["errors"] += 1
+            self._maybe_drop(url)
+
+    def _maybe_drop(self, url):
+        stat = self.stats[url]
+        answers = stat["ok"] + stat["errors"]
+        if stat["dropped"] or answers < JUDGE_MIN_SAMPLES or len(self.healthy()) <= 1:
+            return
+
+        # Broken proxies answer with errors too, so compare against the other judges
+        # rather than an absolute threshold: they see the same mix of proxies
+        others = [
+            other for other_url, other in self.stats.items()
+            if other_url != url and not other["dropped"]
+        ]
+        other_answers = sum(other["ok"] + other["errors"] for other in others)
+        other_rate = sum(other["errors"] for other in others) / other_answers if other_answers else 0.0
+        if stat["errors"] / answers > other_rate + JUDGE_ERROR_MARGIN:
+            stat["dropped"] = True
+            print(f"[-] Dropping judge {url}: {stat['errors']}/{answers} errors vs {other_rate:.0%} on other judges")
+            return
+
+        latencies = sorted(other["ewma"] for other in others if other["ewma"] is not None)
+        if stat["ewma"] is not None and latencies:
+            median = latencies[len(latencies) // 2]
+            if stat["ewma"] > median * JUDGE_SLOW_FACTOR:
+                stat["dropped"] = True
+                print(f"[-] Dropping judge {url}: latency {stat['ewma']:.2f}s vs median {median:.2f}s")
+
+    def merge(self, stats):
+        """
+        Fold in answers counted by another pool (a worker process): ok and error counts add up,
+        the latency averages are weighted by successful answers, and a judge dropped there stays dropped
+        """
+        with self._lock:
+            for url, other in stats.items():
+                stat = self.stats.get(url)
+                if stat is None:
+                    continue
+                if other["ewma"] is not None and other["ok"]:
+                    stat["ewma"] = other["ewma"] if stat["ewma"] is None or not stat["ok"] else \
+                        (stat["ewma"] * stat["ok"] + other["ewma"] * other["ok"]) / (stat["ok"] + other["ok"])
+                stat["ok"] += other["ok"]
+                stat["errors"] += other["errors"]
+                stat["dropped"] = stat["dropped"] or other["dropped"]
+
+    def summary(self):
+        """One line per judge for the end-of-run log"""
+        lines = []
+        for url, stat in self.stats.items():
+            ewma = "-" if stat["ewma"] is None else f"{stat['ewma']:.2f}s"
+            dropped = " (dropped)" if stat["dropped"] else ""
+            lines.append(f"{url}: ok={stat['ok']} errors={stat['errors']} ewma={ewma}{dropped}")
+        return lines
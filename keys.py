@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+The identity of a proxy record, shared by the merge, sort, validation and delta feed,
+so every stage agrees on when two records are the same proxy.
+"""
+
+
+def proxy_key(proxy):
+    """Dedupe key (host, port, type); numeric string ports compare equal to int ports"""
+    port = proxy.get('port')
+    if port.__class__ is str and port.isdigit():
+        port = int(port)
+    return proxy.get('host'), port, proxy.get('type', 'http')
+
+
+def sql_key(proxy):
+    """proxy_key for SQLite key columns: NULLs never match in a key or a join, so a missing host/port becomes ''"""
+    return tuple('' if part is None else part for part in proxy_key(proxy))
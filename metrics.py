@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Process-wide run metrics: counters, histograms and stage timers, dumped as JSON or
+Prometheus text at the end of a run.
+
+    from metrics import metrics
+    metrics.inc("probe_outcomes_total", outcome="timeout")
+    metrics.observe("github_request_seconds", 0.21, endpoint="contents", method="GET")
+    with metrics.timer("download"):
+        ...
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+METRICS_FILE = os.getenv('METRICS_FILE', 'metrics.json')  # ".prom" extension selects Prometheus text
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_METRIC = "stage_seconds_total"
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _prom_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in items) + "}"
+
+
+class Metrics:
+    """
+    Thread-safe registry. Stage timers are exclusive: time spent in a nested stage
+    (including a timed iterator pulled from inside another stage) is charged to the
+    inner stage only, so the stage totals add up to the wall time of the run.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"counts": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["counts"][index] += 1
+                    break
+            histogram["count"] += 1
+            histogram["sum"] += value
+
+    def value(self, name, **labels):
+        """Current value of a counter, 0 if it was never incremented"""
+        with self._lock:
+            return self.counters.get((name, _label_key(labels)), 0)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def timer(self, stage):
+        """Charge the exclusive wall time of the block to stage_seconds_total{stage=...}"""
+        stack = self._stack()
+        frame = [stage, 0.0]  # [stage, seconds spent in nested stages]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            self.inc(STAGE_METRIC, max(elapsed - frame[1], 0.0), stage=stage)
+
+    def timed_iter(self, stage, iterable):
+        """Yield from iterable, charging the time spent producing each item to stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.timer(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def stage_seconds(self):
+        """Returns: {stage: seconds} in the order stages were first timed"""
+        with self._lock:
+            return {dict(labels)["stage"]: value for (name, labels), value in self.counters.items()
+                    if name == STAGE_METRIC}
+
+    def to_json(self):
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in self.counters.items()],
+                "histograms": [{"name": name, "labels": dict(labels), "count": histogram["count"],
+                                "sum": histogram["sum"],
+                                "buckets": dict(zip([str(bound) for bound in self.buckets], histogram["counts"]))}
+                               for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_prom_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_prom_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_prom_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{_prom_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{_prom_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=METRICS_FILE):
+        """Write the registry to path: Prometheus text for *.prom, JSON otherwise"""
+        if not path:
+            return
+        with open(path, 'w') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=2)
+
+    def snapshot(self):
+        """Picklable copy of the raw counters and histograms, e.g. to send from a worker process"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {key: {"counts": list(histogram["counts"]), "count": histogram["count"],
+                                     "sum": histogram["sum"]}
+                               for key, histogram in self.histograms.items()},
+            }
+
+    def merge(self, snapshot):
+        """Add a snapshot taken in another process into this registry"""
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, other in snapshot["histograms"].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = {"counts": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+                histogram["counts"] = [mine + theirs for mine, theirs in zip(histogram["counts"], other["counts"])]
+                histogram["count"] += other["count"]
+                histogram["sum"] += other["sum"]
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+In-memory mock of the GitHub contents and Git Data APIs for local runs and benchmarks.
+Point the client at it with GITHUB_API_URL=http://127.0.0.1:<port>.
+Only the default branch ("main") is modelled.
+Rate limiting can be simulated: a primary limit per window (--rate-limit), and
+queued 403/429 responses injected ahead of the normal ones (server.inject).
+
+    python3 mock_github.py --port 8000
+"""
+
+import re
+import sys
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENTS_PATH = re.compile(r'^/repos/([^/]+)/([^/]+)/contents/(.+)$')
+GIT_PATH = re.compile(r'^/repos/([^/]+)/([^/]+)/(branches|git/blobs|git/trees|git/commits|git/refs/heads)(?:/(.+))?$')
+BRANCH = "main"
+CONTENTS_INLINE_LIMIT = 1024 * 1024  # Above this the contents API returns encoding "none"
+
+
+def git_blob_sha(data):
+    """SHA-1 git assigns to a blob with this content"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _object_sha(kind, payload):
+    return hashlib.sha1(kind.encode() + json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def head_commit(server, owner, repo):
+    """
+    Commit sha of main for a repo, first recording a new commit if files were changed
+    directly (contents API writes or test setup) since the ref last moved. Call with lock held.
+    """
+    entries = {}
+    for (file_owner, file_repo, path), data in server.files.items():
+        if (file_owner, file_repo) == (owner, repo):
+            blob_sha = git_blob_sha(data)
+            server.blobs[blob_sha] = data
+            entries[path] = blob_sha
+    tree_sha = _object_sha("tree", entries)
+    server.trees[tree_sha] = entries
+
+    current = server.refs.get((owner, repo))
+    if current is not None and server.git_commits[current]["tree"] == tree_sha:
+        return current
+    commit = {"tree": tree_sha, "parents": [current] if current else [], "message": "direct write",
+              "seq": len(server.git_commits)}
+    commit_sha = _object_sha("commit", commit)
+    server.git_commits[commit_sha] = commit
+    server.refs[(owner, repo)] = commit_sha
+    return commit_sha
+
+
+def _listing(files, key):
+    """Contents API directory listing of key's path: its files and subdirectories, or [] if none"""
+    owner, repo, directory = key
+    prefix = directory.strip("/") + "/"
+    entries = {}
+    for (file_owner, file_repo, path), data in files.items():
+        if (file_owner, file_repo) != (owner, repo) or not path.startswith(prefix):
+            continue
+        name, _, rest = path[len(prefix):].partition("/")
+        if rest:
+            entries[name] = {"name": name, "path": prefix + name, "type": "dir"}
+        else:
+            entries[name] = {"name": name, "path": path, "type": "file", "sha": git_blob_sha(data), "size": len(data)}
+    return [entries[name] for name in sorted(entries)]
+
+
+class MockGithubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+    injected = False  # Current response came from server.inject
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _count(self):
+        with self.server.lock:
+            self.server.requests += 1
+            key = f"{self.command} {self.path.split('?')[0]}"
+            self.server.calls[key] = self.server.calls.get(key, 0) + 1
+
+    def end_headers(self):
+        # An injected response brings its own rate limit headers, if any
+        if self.server.rate_limit is not None and not self.injected:
+            self.send_header('X-RateLimit-Limit', str(self.server.rate_limit))
+            self.send_header('X-RateLimit-Remaining', str(max(self.server.rate_remaining, 0)))
+            self.send_header('X-RateLimit-Reset', str(int(self.server.rate_reset)))
+        super().end_headers()
+
+    def _throttled(self):
+        """
+        Answer with the next injected response, or a 403 once the primary limit is used up
+        Returns: True if the request was answered here
+        """
+        self.injected = False
+        with self.server.lock:
+            if self.server.inject:
+                response = self.server.inject.pop(0)
+                self.injected = True
+            elif self.server.rate_limit is not None:
+                now = time.time()
+                if now >= self.server.rate_reset:
+                    self.server.rate_remaining = self.server.rate_limit
+                    self.server.rate_reset = now + self.server.rate_window
+                self.server.rate_remaining -= 1
+                if self.server.rate_remaining >= 0:
+                    return False
+                response = {"status": 403, "message": "API rate limit exceeded"}
+            else:
+                return False
+            self.server.throttled += 1
+        # Drain the request body so the keep-alive connection stays usable
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        message = response.get("message", "You have exceeded a secondary rate limit")
+        self._send(response.get("status", 429), {"message": message}, response.get("headers"))
+        return True
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send(self, status, payload, headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream' if isinstance(payload, bytes) else 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        match = CONTENTS_PATH.match(self.path.split('?')[0])
+        if not match:
+            self._send(404, {"message": "Not Found"})
+            return None
+        return match.groups()
+
+    def _git(self):
+        """Dispatch Git Data API calls; returns False if the path is not one of them"""
+        match = GIT_PATH.match(self.path.split('?')[0])
+        if not match:
+            return False
+        owner, repo, kind, rest = match.groups()
+        with self.server.lock:
+            head = head_commit(self.server, owner, repo)
+
+            if kind == "git/blobs" and self.command == "GET":
+                data = self.server.blobs.get(rest)
+                if data is None:
+                    self._send(404, {"message": "Not Found"})
+                elif self.headers.get('Accept') == "application/vnd.github.raw":
+                    self._send(200, data)
+                else:
+                    self._send(200, {"sha": rest, "size": len(data), "encoding": "base64",
+                                     "content": base64.b64encode(data).decode('ascii')})
+
+            elif kind == "branches" and self.command == "GET":
+                if rest != BRANCH:
+                    self._send(404, {"message": "Branch not found"})
+                    return True
+                tree_sha = self.server.git_commits[head]["tree"]
+                self._send(200, {"name": BRANCH, "commit": {"sha": head, "commit": {"tree": {"sha": tree_sha}}}})
+
+            elif kind == "git/blobs" and self.command == "POST":
+                payload = self._body()
+                if payload.get("encoding") == "base64":
+                    data = base64.b64decode(payload["content"])
+                else:
+                    data = payload["content"].encode("utf-8")
+                blob_sha = git_blob_sha(data)
+                self.server.blobs[blob_sha] = data
+                self._send(201, {"sha": blob_sha})
+
+            elif kind == "git/trees" and self.command == "GET":
+                entries = self.server.trees.get(rest)
+                if entries is None:
+                    self._send(404, {"message": "Not Found"})
+                    return True
+                self._send(200, {"sha": rest, "truncated": False, "tree": [
+                    {"path": path, "mode": "100644", "type": "blob", "sha": blob_sha,
+                     "size": len(self.server.blobs[blob_sha])}
+                    for path, blob_sha in sorted(entries.items())
+                ]})
+
+            elif kind == "git/trees" and self.command == "POST":
+                payload = self._body()
+                entries = dict(self.server.trees.get(payload.get("base_tree"), {}))
+                for item in payload["tree"]:
+                    if "content" in item:
+                        data = item["content"].encode("utf-8")
+                        blob_sha = git_blob_sha(data)
+                        self.server.blobs[blob_sha] = data
+                    else:
+                        blob_sha = item["sha"]
+                    if blob_sha is None:
+                        entries.pop(item["path"], None)
+                    elif blob_sha not in self.server.blobs:
+                        self._send(422, {"message": f"Invalid sha for {item['path']}"})
+                        return True
+                    else:
+                        entries[item["path"]] = blob_sha
+                tree_sha = _object_sha("tree", entries)
+                self.server.trees[tree_sha] = entries
+                self._send(201, {"sha": tree_sha})
+
+            elif kind == "git/commits" and self.command == "POST":
+                payload = self._body()
+                commit = {"tree": payload["tree"], "parents": payload.get("parents", []),
+                          "message": payload.get("message", ""), "seq": len(self.server.git_commits)}
+                commit_sha = _object_sha("commit", commit)
+                self.server.git_commits[commit_sha] = commit
+                self._send(201, {"sha": commit_sha})
+
+            elif kind == "git/refs/heads" and self.command == "PATCH":
+                payload = self._body()
+                commit = self.server.git_commits.get(payload.get("sha"))
+                if rest != BRANCH or commit is None:
+                    self._send(422, {"message": "Reference update failed"})
+                    return True
+                if head not in commit["parents"] and not payload.get("force"):
+                    self._send(422, {"message": "Update is not a fast forward"})
+                    return True
+                # Move the ref and project the new tree back onto the contents view
+                for key in [key for key in self.server.files if key[:2] == (owner, repo)]:
+                    del self.server.files[key]
+                for path, blob_sha in self.server.trees[commit["tree"]].items():
+                    self.server.files[(owner, repo, path)] = self.server.blobs[blob_sha]
+                self.server.refs[(owner, repo)] = payload["sha"]
+                self.server.commits += 1
+                self._send(200, {"ref": f"refs/heads/{BRANCH}", "object": {"sha": payload["sha"], "type": "commit"}})
+
+            else:
+                self._send(404, {"message": "Not Found"})
+        return True
+
+    def do_POST(self):
+        self._count()
+        if self._throttled():
+            return
+        if not self._git():
+            self._send(404, {"message": "Not Found"})
+
+    def do_PATCH(self):
+        self._count()
+        if self._throttled():
+            return
+        if not self._git():
+            self._send(404, {"message": "Not Found"})
+
+    def do_GET(self):
+        self._count()
+        if self._throttled():
+            return
+        if self._git():
+            return
+        key = self._route()
+        if key is None:
+            return
+        with self.server.lock:
+            data = self.server.files.get(key)
+            listing = None if data is not None else _listing(self.server.files, key)
+        if listing:
+            self._send(200, listing)
+            return
+        if data is None:
+            self._send(404, {"message": "Not Found"})
+            return
+
+        sha = git_blob_sha(data)
+        etag = f'"{sha}"'
+        if self.headers.get('If-None-Match') == etag:
+            with self.server.lock:
+                self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if len(data) > self.server.contents_inline_limit:
+            with self.server.lock:
+                self.server.blobs[sha] = data
+            payload = {"path": key[2], "sha": sha, "size": len(data), "encoding": "none", "content": ""}
+        else:
+            payload = {"path": key[2], "sha": sha, "size": len(data),
+                       "encoding": "base64", "content": base64.b64encode(data).decode('ascii')}
+        self._send(200, payload, {"ETag": etag})
+
+    def do_PUT(self):
+        self._count()
+        if self._throttled():
+            return
+        key = self._route()
+        if key is None:
+            return
+        payload = self._body()
+        with self.server.lock:
+            current = self.server.files.get(key)
+            if current is not None and payload.get('sha') != git_blob_sha(current):
+                self._send(409 if payload.get('sha') else 422, {"message": "sha does not match" if payload.get('sha') else "\"sha\" wasn't supplied."})
+                return
+            data = base64.b64decode(payload.get('content', ''))
+            self.server.files[key] = data
+            self.server.commits += 1
+        self._send(200 if current is not None else 201, {"content": {"path": key[2], "sha": git_blob_sha(data)}})
+
+    def do_DELETE(self):
+        self._count()
+        if self._throttled():
+            return
+        key = self._route()
+        if key is None:
+            return
+        payload = self._body()
+        with self.server.lock:
+            current = self.server.files.get(key)
+            if current is None:
+                self._send(404, {"message": "Not Found"})
+                return
+            if payload.get('sha') != git_blob_sha(current):
+                self._send(409, {"message": "sha does not match"})
+                return
+            del self.server.files[key]
+            self.server.commits += 1
+        self._send(200, {"content": None})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host="127.0.0.1", port=0, rate_limit=None, rate_window=3600.0):
+    """
+    Start a mock API server in a background thread.
+    State lives on the server: files[(owner, repo, path)] = bytes is the contents view of
+    main; blobs / trees / git_commits / refs back the Git Data API. Counters: connections,
+    requests, commits (ref moves and contents writes), not_modified (304s), throttled
+    (403/429 answers) and per-endpoint calls.
+    With rate_limit, every response carries X-RateLimit-* headers and requests past the
+    limit get a 403 until the window resets. Responses appended to inject, e.g.
+    {"status": 429, "headers": {"Retry-After": "1"}}, are returned first, one per request.
+    """
+    server = ThreadingHTTPServer((host, port), MockGithubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.files = {}
+    server.blobs = {}
+    server.trees = {}
+    server.git_commits = {}
+    server.refs = {}
+    server.connections = 0
+    server.requests = 0
+    server.commits = 0
+    server.calls = {}
+    server.not_modified = 0
+    server.contents_inline_limit = CONTENTS_INLINE_LIMIT
+    server.inject = []
+    server.throttled = 0
+    server.rate_limit = rate_limit
+    server.rate_window = rate_window
+    server.rate_remaining = rate_limit or 0
+    server.rate_reset = time.time() + rate_window
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock GitHub contents API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rate-limit", type=int, help="requests allowed per window, then 403")
+    parser.add_argument("--rate-window", type=float, default=3600.0, help="rate limit window, seconds")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.rate_limit, args.rate_window)
+    print(f"[*] Mock GitHub API listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Per-host and per-network probe throttling.
+
+Free lists carry many ports on one host and many hosts in one /24, often all leaving
+through the same exit IP. Probing them all at once gets us rate-limited by that network
+and shows up as false negatives, so probes are capped per host and per network, where a
+network is the host's /24 (/64 for IPv6) or, once a probe has revealed it, the exit IP
+the judge saw. Hosts answering through the same foreign exit IP are duplicates of one
+upstream proxy: once an exit has been seen EXIT_IP_QUORUM times, the remaining candidates
+on any host known to leave through it are skipped, unless that host has passed.
+"""
+
+import os
+import time
+import asyncio
+import ipaddress
+import threading
+from itertools import zip_longest
+
+from metrics import metrics
+
+NETWORK_THROTTLE = os.getenv('NETWORK_THROTTLE', '1') == '1'
+HOST_CONCURRENCY = int(os.getenv('HOST_CONCURRENCY', '2'))  # Probes in flight per host
+NETWORK_CONCURRENCY = int(os.getenv('NETWORK_CONCURRENCY', '8'))  # Probes in flight per network / exit IP
+EXIT_IP_QUORUM = int(os.getenv('EXIT_IP_QUORUM', '3'))  # Foreign-exit answers before hosts behind that exit are skipped
+COUNTERS = ("network_probes_skipped_total", "network_hosts_skipped_total", "network_shared_exits_total",
+            "network_exit_ips_learned_total", "network_slot_waits_total")
+
+
+def network_of(host):
+    """/24 of an IPv4 host, /64 of an IPv6 host; a hostname is its own network"""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return str(host)
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def exit_ip(origin):
+    """The address a judge saw the request come from; httpbin lists forwarded hops first"""
+    return origin.split(',')[-1].strip()
+
+
+def interleave(proxies):
+    """
+    Reorder candidates round-robin across networks, keeping each network's own order,
+    so a batch starts on many networks at once instead of queueing behind one
+    Returns: list of proxies
+    """
+    groups = {}
+    for proxy in proxies:
+        groups.setdefault(network_of(proxy.get('host')), []).append(proxy)
+    return [proxy for row in zip_longest(*groups.values()) for proxy in row if proxy is not None]
+
+
+class NetworkThrottle:
+    """
+    Admission control shared by all probes of a run. acquire() blocks a worker thread
+    and acquire_async() suspends a task until the host and its network both have a free
+    slot; both return the slot keys to pass to release(), or None when the probe should
+    not run (its host is skipped, or the deadline passed while waiting).
+    """
+
+    def __init__(self, host_limit=HOST_CONCURRENCY, network_limit=NETWORK_CONCURRENCY, quorum=EXIT_IP_QUORUM):
+        self.host_limit = host_limit
+        self.network_limit = network_limit
+        self.quorum = quorum
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._waiters = {}  # slot key -> futures of suspended async probes
+        self.in_flight = {}  # slot key -> probes running
+        self.exits = {}  # network -> exit IP seen by the judge
+        self.foreign_exits = {}  # exit IP -> probes of other hosts answered from it
+        self.exit_hosts = {}  # foreign exit IP -> hosts that answered from it
+        self.valid_hosts = set()
+        self.skipped_hosts = set()
+
+    def _keys(self, host):
+        network = network_of(host)
+        # Networks known to share an exit IP share one budget
+        return network, ("host", host), ("network", self.exits.get(network, network))
+
+    def _admit(self, host):
+        """Take the slots for host if free. Call with the lock held. Returns: keys, None (skip) or False (full)"""
+        network, host_key, network_key = self._keys(host)
+        if host in self.skipped_hosts:
+            metrics.inc("network_probes_skipped_total")
+            return None
+        if self.in_flight.get(host_key, 0) >= self.host_limit:
+            return False
+        if self.in_flight.get(network_key, 0) >= self.network_limit:
+            return False
+        for key in (host_key, network_key):
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        return host_key, network_key
+
+    def acquire(self, host, deadline=None):
+        with self._lock:
+            keys = self._admit(host)
+            if keys is False:
+                metrics.inc("network_slot_waits_total")
+            while keys is False:
+                timeout = None if deadline is None else deadline - time.time()
+                if timeout is not None and timeout <= 0:
+                    return None
+                self._released.wait(timeout)
+                keys = self._admit(host)
+            return keys
+
+    async def acquire_async(self, host):
+        loop = asyncio.get_running_loop()
+        counted = False
+        while True:
+            with self._lock:
+                keys = self._admit(host)
+                if keys is not False:
+                    return keys
+                if not counted:
+                    metrics.inc("network_slot_waits_total")
+                    counted = True
+                # Wake on whichever of the two slots frees up first
+                waiter = loop.create_future()
+                for key in self._keys(host)[1:]:
+                    self._waiters.setdefault(key, []).append(waiter)
+            await waiter
+
+    def release(self, keys):
+        if keys is None:
+            return
+        with self._lock:
+            for key in keys:
+                self.in_flight[key] -= 1
+                if not self.in_flight[key]:
+                    del self.in_flight[key]
+                for waiter in self._waiters.pop(key, ()):
+                    if not waiter.done():
+                        waiter.set_result(None)
+            self._released.notify_all()
+
+    def observe(self, host, origin, valid):
+        """Learn from a judge answer: the host's exit IP, and whether the host ever passes"""
+        network = network_of(host)
+        with self._lock:
+            if valid:
+                self.valid_hosts.add(host)
+                self.skipped_hosts.discard(host)
+                return
+            if not origin:
+                return
+            if host in origin:
+                return  # Answered from its own address: slow or failed for another reason
+            seen = exit_ip(origin)
+            if network not in self.exits:
+                self.exits[network] = seen
+                metrics.inc("network_exit_ips_learned_total")
+            hosts = self.exit_hosts.setdefault(seen, set())
+            hosts.add(host)
+            self.foreign_exits[seen] = self.foreign_exits.get(seen, 0) + 1
+            if self.foreign_exits[seen] < self.quorum:
+                return
+            if self.foreign_exits[seen] == self.quorum:
+                # Collapse every host known to leave through this exit, not just the one that answered
+                metrics.inc("network_shared_exits_total")
+            else:
+                hosts = (host,)
+            for other in hosts:
+                if other not in self.valid_hosts and other not in self.skipped_hosts:
+                    self.skipped_hosts.add(other)
+                    metrics.inc("network_hosts_skipped_total")
+
+
+def counters():
+    """Returns: {counter: value} of the throttle counters in the metrics registry"""
+    return {name: metrics.value(name) for name in COUNTERS}
+
+
+def summary(since=None):
+    """
+    One line for the end-of-run log. Read from the metrics registry, so worker processes'
+    throttles are included once their snapshots are merged; since is a counters() baseline.
+    """
+    since = since or {}
+    skipped, hosts, exits, learned, waits = (value - since.get(name, 0) for name, value in counters().items())
+    return (f"{skipped} probes saved by skipping {hosts} hosts behind {exits} shared foreign exit IPs; "
+            f"{learned} exit IPs learned, {waits} probes waited for a host/network slot")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local farm of fake HTTP proxies for benchmarking validation. Each proxy listens on its own
+port and answers the judge request itself, with one of these behaviours:
+
+    fast       answers at once with the caller's origin
+    slow       answers correctly after --slow-delay seconds
+    blackhole  accepts the connection and never answers
+    refused    nothing listens on the port (connection refused)
+    liar       answers at once with an origin that is not the proxy's address
+    flaky      answers the first request on a connection correctly, then drops it
+
+Proxies honour keep-alive and serve GET .../bytes/<n> like httpbin, for throughput scoring.
+
+    python3 proxy_farm.py --fast 200 --slow 50 --blackhole 50 --refused 50 --liar 50 --output farm.jsonl
+
+With --per-network N the proxies are spread over loopback /24s (127.0.X.1-N, Linux only)
+instead of all sharing --host, so per-network probe caps see realistic groups.
+
+The candidates are written to --output as getproxy JSON lines ("from" names the behaviour),
+then "[*] Proxy farm ready" is printed and the farm serves until interrupted.
+"""
+
+import re
+import sys
+import json
+import socket
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+BEHAVIOURS = ("fast", "slow", "blackhole", "refused", "liar", "flaky")
+LIAR_ORIGIN = "203.0.113.7"  # TEST-NET-3, never a farm address
+MAX_REQUEST_BYTES = 64 * 1024
+MAX_BYTES = 10 * 1024 * 1024
+_BYTES_PATH = re.compile(r'/bytes/(\d+)')
+
+
+def _response(body, content_type, keep_alive):
+    return (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: " + content_type.encode("ascii") + b"\r\n"
+        b"Content-Length: " + str(len(body)).encode("ascii") + b"\r\n"
+        b"Connection: " + (b"keep-alive" if keep_alive else b"close") + b"\r\n\r\n" + body
+    )
+
+
+def _judge_response(origin, keep_alive=False):
+    return _response(json.dumps({"origin": origin}).encode("utf-8"), "application/json", keep_alive)
+
+
+def _make_handler(behaviour, slow_delay):
+    async def handle(reader, writer):
+        try:
+            served = 0
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if behaviour == "blackhole":
+                    # Hold the connection open until the client gives up
+                    await reader.read()
+                    return
+                if behaviour == "flaky" and served:
+                    return
+                if behaviour == "slow":
+                    await asyncio.sleep(slow_delay)
+                keep_alive = b"connection: keep-alive" in head.lower()
+                target = head.split(b"\r\n", 1)[0].decode("iso-8859-1").split(" ")[1]
+                size = _BYTES_PATH.fullmatch(urlsplit(target).path)
+                if size:
+                    writer.write(_response(bytes(min(int(size.group(1)), MAX_BYTES)), "application/octet-stream",
+                                           keep_alive))
+                else:
+                    origin = LIAR_ORIGIN if behaviour == "liar" else writer.get_extra_info("sockname")[0]
+                    writer.write(_judge_response(origin, keep_alive))
+                await writer.drain()
+                served += 1
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+def _free_port(host):
+    """A port nothing listens on, for the refused behaviour"""
+    sock = socket.socket()
+    sock.bind((host, 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def farm_host(index, per_network, host="127.0.0.1"):
+    """Address of the index-th proxy: host, or per_network proxies per loopback /24"""
+    if not per_network:
+        return host
+    return f"127.0.{index // per_network}.{index % per_network + 1}"
+
+
+async def start_farm(counts, slow_delay=4.0, host="127.0.0.1", per_network=0):
+    """
+    Start the farm on the running event loop
+    counts maps behaviour -> number of proxies
+    Returns: (servers, candidates) where candidates are getproxy-style proxy dicts
+    """
+    if not 0 <= per_network <= 254:
+        raise ValueError("per_network must be between 0 and 254")
+    servers = []
+    candidates = []
+    for behaviour in BEHAVIOURS:
+        for _ in range(counts.get(behaviour, 0)):
+            address = farm_host(len(candidates), per_network, host)
+            if behaviour == "refused":
+                port = _free_port(address)
+            else:
+                server = await asyncio.start_server(_make_handler(behaviour, slow_delay), address, 0,
+                                                    limit=MAX_REQUEST_BYTES, backlog=128)
+                servers.append(server)
+                port = server.sockets[0].getsockname()[1]
+            candidates.append({"type": "http", "host": address, "port": port,
+                               "anonymity": "transparent", "country": "--", "from": f"farm-{behaviour}"})
+    return servers, candidates
+
+
+async def _main(args):
+    counts = {behaviour: getattr(args, behaviour) for behaviour in BEHAVIOURS}
+    servers, candidates = await start_farm(counts, args.slow_delay, args.host, args.per_network)
+    with open(args.output, "w") as f:
+        for proxy in candidates:
+            f.write(json.dumps(proxy) + "\n")
+    print(f"[*] Proxy farm ready: {len(candidates)} proxies ({', '.join(f'{k}={v}' for k, v in counts.items())})",
+          flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for server in servers:
+            server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local farm of fake proxies")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--fast", type=int, default=200)
+    parser.add_argument("--slow", type=int, default=50)
+    parser.add_argument("--blackhole", type=int, default=50)
+    parser.add_argument("--refused", type=int, default=50)
+    parser.add_argument("--liar", type=int, default=50)
+    parser.add_argument("--flaky", type=int, default=0)
+    parser.add_argument("--slow-delay", type=float, default=4.0, help="seconds before a slow proxy answers")
+    parser.add_argument("--per-network", type=int, default=0,
+                        help="proxies per loopback /24 (0: all on --host)")
+    parser.add_argument("--output", default="farm.jsonl", help="where to write the candidate list")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Read-only HTTP query service over the validated proxy set.
+
+Loads proxyinfo.json (by default the OUTPUT_DIR copy written by validate_and_upload.py)
+into in-memory indexes and answers:
+
+    GET /top?type=https&anonymity=high_anonymous&country=US&max_latency=1.5&limit=10
+        fastest proxies matching all given filters, by response_time
+    GET /random?type=http&max_latency=1
+        one random proxy matching the filters
+    GET /stats
+        size and version of the loaded set
+
+The file is polled and, when it changes, a new snapshot is built on the side and swapped
+in with a single reference assignment: requests in flight finish on the old snapshot and
+readers never take a lock.
+
+    python3 query_service.py --port 8090 --source output/proxyinfo.json
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import argparse
+import threading
+from itertools import combinations
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import jsonl
+
+QUERY_SOURCE = os.getenv('QUERY_SOURCE', os.path.join(os.getenv('OUTPUT_DIR', 'output'), 'proxyinfo.json'))
+RELOAD_INTERVAL = float(os.getenv('QUERY_RELOAD_INTERVAL', '5'))  # seconds between source file checks
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 1000
+FILTERS = ("type", "anonymity", "country")
+UNKNOWN_LATENCY = float('inf')
+
+
+def _field(proxy, name):
+    """Normalised filter value of a record, with the output files' defaults"""
+    default = {"type": "http", "anonymity": "transparent"}.get(name, "")
+    return str(proxy.get(name) or default).lower()
+
+
+class ProxySnapshot:
+    """
+    Immutable indexed view of one validated set. Records are sorted by response_time,
+    so a record's position is its latency rank. There is one index entry per combination
+    of filter values a record matches (8 per record for 3 filters), listing positions in
+    ascending order, so any query is one lookup, a bisect at max_latency and a slice.
+    """
+
+    def __init__(self, proxies, version=0, source=None):
+        def rank(proxy):
+            latency = proxy.get('response_time')
+            latency = latency if isinstance(latency, (int, float)) else UNKNOWN_LATENCY
+            return latency, str(proxy.get('host')), str(proxy.get('port')), _field(proxy, 'type')
+
+        ranked = sorted(((rank(proxy), proxy) for proxy in proxies if proxy.get('host') and proxy.get('port')),
+                        key=lambda item: item[0])
+        self.records = [proxy for _, proxy in ranked]
+        self.encoded = [json.dumps(proxy).encode('utf-8') for proxy in self.records]
+        self.latencies = [key[0] for key, _ in ranked]
+
+        groups = {}  # full filter key -> positions; only a few dozen distinct keys
+        for position, proxy in enumerate(self.records):
+            groups.setdefault(tuple(_field(proxy, name) for name in FILTERS), []).append(position)
+        self.index = {}  # ((filter, value), ...) in FILTERS order -> positions
+        for key, positions in groups.items():
+            pairs = tuple(zip(FILTERS, key))
+            for size in range(len(FILTERS) + 1):
+                for combination in combinations(pairs, size):
+                    self.index.setdefault(combination, []).extend(positions)
+        for positions in self.index.values():
+            positions.sort()  # Concatenated ascending runs: a cheap merge for timsort
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.records)
+
+    def _positions(self, filters, max_latency):
+        """
+        Latency-ordered positions of the records matching filters, and how many of them
+        are within max_latency
+        Returns: (positions, count)
+        """
+        positions = self.index.get(tuple((name, filters[name]) for name in FILTERS if name in filters), [])
+        if max_latency is None:
+            return positions, len(positions)
+        return positions, bisect.bisect_left(positions, bisect.bisect_right(self.latencies, max_latency))
+
+    def top(self, filters, max_latency=None, limit=DEFAULT_LIMIT):
+        """Returns: positions of the limit fastest records matching filters"""
+        positions, count = self._positions(filters, max_latency)
+        return positions[:min(count, limit)]
+
+    def random(self, filters, max_latency=None, rng=random):
+        """Returns: position of a random record matching filters, or None"""
+        positions, count = self._positions(filters, max_latency)
+        return positions[rng.randrange(count)] if count else None
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "count": len(self.records),
+            "source": self.source,
+            "loaded_at": round(self.loaded_at, 3),
+            "by_type": self._counts("type"),
+            "by_anonymity": self._counts("anonymity"),
+        }
+
+    def _counts(self, name):
+        return {key[0][1]: len(positions) for key, positions in sorted(self.index.items())
+                if len(key) == 1 and key[0][0] == name}
+
+
+def load_snapshot(path, version=0):
+    """Build a snapshot from a JSON-lines file; malformed lines are counted and reported"""
+    return ProxySnapshot(list(jsonl.iter_file(path)), version, path)
+
+
+class ProxyService:
+    """Holds the current snapshot and swaps in new ones; readers just read .snapshot"""
+
+    def __init__(self, source=QUERY_SOURCE):
+        self.source = source
+        self.snapshot = ProxySnapshot([], 0, source)
+        self._signature = None
+        self._stop = threading.Event()
+
+    def publish(self, proxies):
+        """Swap in a new set built from proxies, e.g. straight from a validation run"""
+        self.snapshot = ProxySnapshot(proxies, self.snapshot.version + 1, self.source)
+        return self.snapshot
+
+    def reload(self):
+        """
+        Rebuild the snapshot if the source file changed since the last load
+        Returns: True if a new snapshot was swapped in
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        # Built completely before the swap; readers keep using the old one meanwhile
+        snapshot = load_snapshot(self.source, self.snapshot.version + 1)
+        if self._stat() != signature:
+            return False  # write_outputs rewrites the file in place: wait until it is complete
+        self.snapshot = snapshot
+        self._signature = signature
+        print(f"[*] Loaded {len(snapshot)} proxies from {self.source} (version {snapshot.version})", flush=True)
+        return True
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.source)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """Poll the source file in a daemon thread"""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.reload()
+                except (OSError, ValueError) as e:
+                    print(f"[-] Warning: Could not reload {self.source}: {e}", flush=True)
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def parse_query(query):
+    """
+    Filters, max_latency and limit from a query string
+    Raises: ValueError on a malformed number
+    """
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+    filters = {name: params[name].lower() for name in FILTERS if params.get(name)}
+    max_latency = float(params['max_latency']) if params.get('max_latency') else None
+    limit = min(max(int(params.get('limit') or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    return filters, max_latency, limit
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for clients issuing many queries
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't hold the body for an ACK
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        snapshot = self.server.service.snapshot  # One snapshot per request, however long it takes
+        url = urlsplit(self.path)
+        try:
+            filters, max_latency, limit = parse_query(url.query)
+        except ValueError as e:
+            self._send(400, json.dumps({"error": str(e)}).encode('utf-8'))
+            return
+
+        if url.path == "/top":
+            positions = snapshot.top(filters, max_latency, limit)
+            body = b'{"version":%d,"count":%d,"proxies":[%s]}' % (
+                snapshot.version, len(positions), b",".join(snapshot.encoded[position] for position in positions))
+            self._send(200, body)
+        elif url.path == "/random":
+            position = snapshot.random(filters, max_latency)
+            if position is None:
+                self._send(404, b'{"error":"no proxy matches"}')
+            else:
+                self._send(200, b'{"version":%d,"proxy":%s}' % (snapshot.version, snapshot.encoded[position]))
+        elif url.path == "/stats":
+            self._send(200, json.dumps(snapshot.stats()).encode('utf-8'))
+        else:
+            self._send(404, b'{"error":"not found"}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(service, host="127.0.0.1", port=8090):
+    """Create a threaded query server over service; the caller runs serve_forever()"""
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only query service over validated proxies")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--source", default=QUERY_SOURCE, help="proxyinfo.json to serve and watch")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL)
+    args = parser.parse_args()
+
+    service = ProxyService(args.source)
+    service.reload()
+    service.watch(args.reload_interval)
+    server = serve(service, args.host, args.port)
+    print(f"[*] Query service listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        service.stop()
+        server.server_close()
+        sys.exit(0)
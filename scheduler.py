@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+# Whole-run time budget so a run finishes inside the 15 minute cron window; 0 disables
+RUN_BUDGET = float(os.getenv('RUN_BUDGET', '600'))  # seconds, counted from the start of the run
+UPLOAD_RESERVE = float(os.getenv('UPLOAD_RESERVE', '90'))  # seconds kept back for writing and uploading
+MAX_CONCURRENCY_SCALE = float(os.getenv('MAX_CONCURRENCY_SCALE', '4'))  # Cap on the concurrency boost
+
+
+class RunScheduler:
+    """
+    Tracks the validation deadline and scales probe concurrency so the queued
+    candidates fit in the time left. The scale multiplies MAX_WORKERS (thread mode)
+    or ASYNC_CONCURRENCY (async mode) and never drops below 1.
+    """
+
+    def __init__(self, budget=RUN_BUDGET, reserve=UPLOAD_RESERVE, start=None):
+        self.start = start or time.time()
+        self.deadline = self.start + max(budget - reserve, 0)
+        self.total = 0  # Candidates queued for validation
+        self.processed = 0  # Candidates handled so far (probed, carried over or skipped)
+        self.scale = 1.0
+        self._rate_per_scale = None  # Probes per second at scale 1, from the batches so far
+        self.unprobed = 0
+        self.carried_over = 0
+
+    def remaining(self):
+        return self.deadline - time.time()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def plan(self):
+        """
+        Concurrency scale for the next batch: the probe rate needed to clear the queue
+        by the deadline, over the rate observed per unit of scale
+        Returns: scale factor
+        """
+        pending = self.total - self.processed
+        if self._rate_per_scale and pending > 0:
+            needed = pending / max(self.remaining(), 1.0)
+            self.scale = min(max(needed / self._rate_per_scale, 1.0), MAX_CONCURRENCY_SCALE)
+        return self.scale
+
+    def record_batch(self, probed, seconds, scale):
+        """Fold one batch's probe throughput into the rate estimate"""
+        if probed and seconds > 0:
+            rate = probed / seconds / scale
+            self._rate_per_scale = rate if self._rate_per_scale is None else 0.5 * rate + 0.5 * self._rate_per_scale
+
+    def summary(self):
+        """One line for the end-of-run log"""
+        left = self.remaining()
+        state = f"{left:.0f}s to spare" if left > 0 else f"deadline reached, {self.unprobed} candidates left unprobed " \
+                                                        f"({self.carried_over} carried over from earlier runs)"
+        return f"Run budget: {self.processed}/{self.total} candidates handled, final concurrency x{self.scale:.1f}, {state}"
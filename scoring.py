@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sustained-use scoring for proxies that passed the judge check.
+
+A single judge GET says little about a proxy: its response_time includes the connect
+and varies a lot between samples. Scoring opens one keep-alive connection through the
+proxy, sends SCORE_REQUESTS judge requests over it and then downloads
+SCORE_DOWNLOAD_BYTES, and adds to the record:
+
+    connect_time     seconds to open the connection to the proxy (TCP, plus TLS for https proxies)
+    ttfb             seconds from sending the first request to its response headers
+    steady_latency   median seconds per request over the reused connection (requests 2..N)
+    throughput       download bytes per second
+
+A proxy that drops the connection, answers from a foreign origin or cuts the download
+short fails scoring and is not published.
+"""
+
+import os
+import time
+import asyncio
+from urllib.parse import urlsplit
+
+from judges import extract_origin, parse_http_response
+from metrics import metrics
+
+THROUGHPUT_SCORING = os.getenv('THROUGHPUT_SCORING', '0') == '1'
+SCORE_REQUESTS = int(os.getenv('SCORE_REQUESTS', '4'))  # Judge requests over the one keep-alive connection
+SCORE_DOWNLOAD_BYTES = int(os.getenv('SCORE_DOWNLOAD_BYTES', str(100 * 1024)))  # httpbin caps /bytes at 100 KB
+SCORE_URL = os.getenv('SCORE_URL', '')  # Download endpoint; default /bytes/<n> on the judge's host
+SCORE_TIMEOUT = float(os.getenv('SCORE_TIMEOUT', '10'))  # seconds for one proxy's whole session
+SCORE_CONCURRENCY = int(os.getenv('SCORE_CONCURRENCY', '200'))  # Proxies scored at once
+MAX_HEADER_BYTES = 64 * 1024
+SCORE_FIELDS = ("connect_time", "ttfb", "steady_latency", "throughput")
+
+
+class ScoreFailure(Exception):
+    """The proxy did not hold up under sustained use; args[0] is the outcome"""
+
+
+def download_url(judge_url, size=SCORE_DOWNLOAD_BYTES):
+    """SCORE_URL, or httpbin's /bytes/<size> on the judge's host (echo_server.py serves it too)"""
+    if SCORE_URL:
+        return SCORE_URL
+    judge = urlsplit(judge_url)
+    return f"{judge.scheme}://{judge.netloc}/bytes/{size}"
+
+
+async def _request(reader, writer, url, keep_alive=True):
+    """
+    Send one absolute-form GET and read the whole response
+    Returns: (status_code, body, seconds to the response headers, seconds to the last byte)
+    Raises: ScoreFailure("closed") if the proxy closed the connection instead of answering
+    """
+    target = urlsplit(url)
+    start = time.perf_counter()
+    writer.write((
+        f"GET {url} HTTP/1.1\r\n"
+        f"Host: {target.netloc}\r\n"
+        "Accept: */*\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    ).encode('ascii'))
+    await writer.drain()
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        raise ScoreFailure("closed")
+    first_byte = time.perf_counter() - start
+    status_code, headers, _ = parse_http_response(head)
+
+    try:
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0].strip() or b'0', 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()  # Delimited by close: the connection ends here
+    except asyncio.IncompleteReadError:
+        raise ScoreFailure("short_body")
+    return status_code, body, first_byte, time.perf_counter() - start
+
+
+async def score_proxy(proxy, judge_url, ssl_context=None):
+    """
+    Run one scoring session through proxy
+    Returns: proxy copy with SCORE_FIELDS set
+    Raises: ScoreFailure, or OSError / asyncio.TimeoutError from the connection
+    """
+    host = proxy.get('host')
+    use_tls = proxy.get('type', 'http').lower() == 'https'
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, int(proxy.get('port')), ssl=ssl_context if use_tls else None,
+                                                   limit=MAX_HEADER_BYTES)
+    connect_time = time.perf_counter() - start
+    try:
+        latencies = []
+        ttfb = None
+        for _ in range(SCORE_REQUESTS):
+            status_code, body, first_byte, total = await _request(reader, writer, judge_url)
+            if status_code != 200:
+                raise ScoreFailure("http_error")
+            origin = extract_origin(body)
+            if not origin or host not in origin:
+                raise ScoreFailure("bad_origin")
+            if ttfb is None:
+                ttfb = first_byte
+            latencies.append(total)
+
+        url = download_url(judge_url)
+        status_code, body, _, total = await _request(reader, writer, url, keep_alive=False)
+        if status_code != 200:
+            raise ScoreFailure("http_error")
+        if not SCORE_URL and len(body) < SCORE_DOWNLOAD_BYTES:
+            raise ScoreFailure("short_body")
+    finally:
+        writer.close()
+
+    steady = sorted(latencies[1:] or latencies)
+    proxy_copy = proxy.copy()
+    proxy_copy.update({
+        "connect_time": round(connect_time, 3),
+        "ttfb": round(ttfb, 3),
+        "steady_latency": round(steady[len(steady) // 2], 3),
+        "throughput": int(len(body) / max(total, 1e-6)),
+    })
+    return proxy_copy
+
+
+async def _score(proxy, judge_url, semaphore, ssl_context):
+    """Returns: scored proxy, or None if it failed"""
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            scored = await asyncio.wait_for(score_proxy(proxy, judge_url, ssl_context), timeout=SCORE_TIMEOUT)
+        except ScoreFailure as e:
+            outcome = e.args[0]
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except (OSError, ValueError, asyncio.LimitOverrunError, asyncio.IncompleteReadError):
+            # Refused or reset, a malformed response, or a header line past MAX_HEADER_BYTES
+            outcome = "error"
+        else:
+            metrics.inc("score_outcomes_total", outcome="ok")
+            metrics.observe("score_steady_latency_seconds", scored["steady_latency"])
+            return scored
+        metrics.inc("score_outcomes_total", outcome=outcome)
+        metrics.observe("score_seconds", time.perf_counter() - start, outcome=outcome)
+        return None
+
+
+async def _score_proxies(proxies, judge_url, ssl_context, max_concurrency, deadline):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [asyncio.ensure_future(_score(proxy, judge_url, semaphore, ssl_context)) for proxy in proxies]
+    timeout = None if deadline is None else max(deadline - time.time(), 0)
+    done, pending = await asyncio.wait(tasks, timeout=timeout) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    results = []
+    for proxy, task in zip(proxies, tasks):
+        if task in pending:
+            results.append(proxy)  # Cut off by the deadline: keep it as the judge check left it
+        elif task.result() is not None:
+            results.append(task.result())
+    return results, len(pending)
+
+
+def score_proxies(proxies, judge_url, ssl_context=None, max_concurrency=SCORE_CONCURRENCY, deadline=None):
+    """
+    Score proxies that passed the judge check. judge_url must be http:// (requests are
+    sent in absolute form, without CONNECT).
+    Returns: list of scored proxies; those the deadline cut off are kept unscored
+    """
+    if not proxies:
+        return []
+    print(f"[*] Throughput scoring: {len(proxies)} proxies, {SCORE_REQUESTS} keep-alive requests "
+          f"+ {download_url(judge_url)} each...")
+    scored, cut_off = asyncio.run(_score_proxies(proxies, judge_url, ssl_context, max_concurrency, deadline))
+    if cut_off:
+        print(f"[-] Deadline reached: {cut_off} proxies kept without a throughput score")
+    print(f"[✓] Throughput scoring complete: {len(scored)}/{len(proxies)} proxies held up")
+    return scored
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Splitting validation across worker processes or CI runners.
+
+Each proxy is assigned to one of N shards, and each shard is validated independently.
+A runner validating shard i of N writes partials/partial-i.jsonl; the reduce step
+(VALIDATION_REDUCE=1) unions the partials, then writes and uploads as usual.
+
+    VALIDATION_SHARD=0/4 python3 validate_and_upload.py   # on each of 4 runners
+    VALIDATION_REDUCE=1 python3 validate_and_upload.py    # once, with all partials present
+"""
+
+import os
+import glob
+import json
+import bisect
+import hashlib
+
+# "i/N": validate only shard i of N and write a partial instead of uploading
+VALIDATION_SHARD = os.getenv('VALIDATION_SHARD', '')
+VALIDATION_REDUCE = os.getenv('VALIDATION_REDUCE', '0') == '1'
+VALIDATE_PROCESSES = int(os.getenv('VALIDATE_PROCESSES', '1'))  # Local worker processes per batch
+# Sticky: a proxy stays on the same shard run after run (and mostly when N changes), so a
+# runner's cached health store keeps seeing the same proxies. Off: shards are dealt
+# round-robin, which balances sizes exactly but moves proxies between runs.
+STICKY_SHARDS = os.getenv('STICKY_SHARDS', '1') == '1'
+VIRTUAL_NODES = 64  # Ring points per shard; more points, more even shard sizes
+PARTIAL_DIR = os.getenv('PARTIAL_DIR', 'partials')
+
+
+def parse_shard(spec):
+    """
+    Parse a VALIDATION_SHARD value such as "2/4"
+    Returns: (index, count), or None when spec is empty
+    """
+    if not spec:
+        return None
+    index, _, count = spec.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid VALIDATION_SHARD {spec!r}: expected i/N with 0 <= i < N")
+    return index, count
+
+
+def _hash(text):
+    # Stable across processes and runs, unlike hash()
+    return int.from_bytes(hashlib.md5(text.encode('utf-8')).digest()[:8], 'big')
+
+
+def shard_key(proxy):
+    """host:port; both types of one endpoint land on the same shard"""
+    return f"{proxy.get('host')}:{proxy.get('port')}"
+
+
+class HashRing:
+    """
+    Consistent hash ring over shard_count shards. Going from N to N+1 shards moves only
+    about 1/(N+1) of the keys, all of them onto the new shard.
+    """
+
+    def __init__(self, shard_count, vnodes=VIRTUAL_NODES):
+        points = sorted((_hash(f"shard-{shard}-{vnode}"), shard)
+                        for shard in range(shard_count) for vnode in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_of(self, key):
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[position]
+
+
+def iter_shard(proxies, index, count, sticky=STICKY_SHARDS):
+    """Yield the proxies of a stream that belong to shard index of count"""
+    if count == 1:
+        yield from proxies
+        return
+    ring = HashRing(count) if sticky else None
+    for position, proxy in enumerate(proxies):
+        shard = ring.shard_of(shard_key(proxy)) if sticky else position % count
+        if shard == index:
+            yield proxy
+
+
+def split_shards(proxies, count, sticky=STICKY_SHARDS, key=shard_key):
+    """
+    Split a list of proxies into count shards; key maps a proxy to the string hashed onto the ring
+    Returns: list of count lists
+    """
+    shards = [[] for _ in range(count)]
+    ring = HashRing(count) if sticky else None
+    for position, proxy in enumerate(proxies):
+        shards[ring.shard_of(key(proxy)) if sticky else position % count].append(proxy)
+    return shards
+
+
+def shard_store_path(path, index):
+    """Per-shard health store file, e.g. proxy_health.json -> proxy_health.shard-2.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{index}{ext}"
+
+
+def partial_path(index, directory=PARTIAL_DIR):
+    return os.path.join(directory, f"partial-{index}.jsonl")
+
+
+def write_partial(proxies, index, directory=PARTIAL_DIR):
+    """
+    Write one shard's validated proxies as JSON lines, atomically
+    Returns: number of proxies written
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = partial_path(index, directory)
+    count = 0
+    with open(path + '.tmp', 'w') as f:
+        for proxy in proxies:
+            f.write(json.dumps(proxy) + '\n')
+            count += 1
+    os.replace(path + '.tmp', path)
+    return count
+
+
+def partial_paths(directory=PARTIAL_DIR):
+    """Partials present in directory, in shard order"""
+    return sorted(glob.glob(os.path.join(directory, "partial-*.jsonl")),
+                  key=lambda path: int(os.path.basename(path)[len("partial-"):-len(".jsonl")]))
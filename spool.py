@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Throwaway on-disk SQLite databases for the streaming stages (prioritize, merge, sort,
+delta diff), which spool their input to a table instead of holding it in memory.
+"""
+
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def spool_db(spool_dir=None):
+    """
+    Temporary SQLite database in spool_dir (the system temp dir by default). Journaling
+    and fsync are off: the file never outlives the block, so it need not survive a crash.
+    Yields: the connection; the file is closed and removed on exit
+    """
+    fd, db_path = tempfile.mkstemp(suffix='.sqlite', dir=spool_dir)
+    os.close(fd)
+    db = sqlite3.connect(db_path)
+    try:
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        yield db
+    finally:
+        db.close()
+        os.remove(db_path)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import asyncio
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Farm proxies answer the judge request themselves, so the judge host never resolves
+os.environ.setdefault('JUDGE_URLS', 'http://judge.invalid/get')
+os.environ.setdefault('GITHUB_CACHE_DIR', '')
+os.environ.setdefault('HEALTH_STORE', '0')
+
+import proxy_farm  # noqa: E402
+
+
+@pytest.fixture
+def farm():
+    """start(counts, slow_delay) runs proxy_farm on a background loop; returns the candidates"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    servers = []
+
+    def start(counts, slow_delay=0.3):
+        started, candidates = asyncio.run_coroutine_threadsafe(
+            proxy_farm.start_farm(counts, slow_delay), loop).result()
+        servers.extend(started)
+        return candidates
+
+    yield start
+
+    async def stop():
+        for server in servers:
+            server.close()
+        # Handlers still parked on a blackhole or slow connection end before the loop does
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+import pytest
+
+import daemon
+import validate_and_upload as vu
+from daemon import ProxyDaemon
+from health_store import health_key
+from validate_and_upload import proxy_key
+
+
+@pytest.fixture
+def proxy_daemon(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    instance = ProxyDaemon("t", state_path=str(tmp_path / "daemon_state.jsonl"), source=str(tmp_path / "missing"))
+    instance.mode = "thread"
+    vu.begin_validation(instance.mode)
+    return instance
+
+
+def test_rotation_while_probes_are_in_flight(farm, proxy_daemon, monkeypatch):
+    monkeypatch.setattr(vu, "NETWORK_THROTTLE", True)
+    candidates = farm({"slow": 3}, slow_delay=0.5)
+    old = vu.network_throttle
+    results = []
+    # Daemon threads: a probe stuck waiting for a slot the old throttle never got back must not hang the run
+    threads = [threading.Thread(target=lambda proxy=proxy: results.append(vu.throttled_test_proxy(proxy)), daemon=True)
+               for proxy in candidates]
+    for thread in threads:
+        thread.start()
+    while not old.in_flight:
+        time.sleep(0.01)
+
+    proxy_daemon.rotate_trackers()
+    assert vu.network_throttle is not old
+    for thread in threads:
+        thread.join(10)
+
+    # Every slot went back to the throttle it was taken from
+    assert len(results) == 3 and all(valid for _, valid in results)
+    assert old.in_flight == {}
+    assert vu.network_throttle.in_flight == {}
+
+
+def test_round_leaves_unfinished_probes_for_the_next(farm, proxy_daemon, monkeypatch):
+    # All farm proxies share 127.0.0.1; only the round budget should leave probes open here
+    monkeypatch.setattr(vu, "NETWORK_THROTTLE", False)
+    monkeypatch.setattr(daemon, "DAEMON_ROUND_BUDGET", 1)
+    candidates = farm({"fast": 2, "blackhole": 2})
+    fast = [proxy for proxy in candidates if proxy["from"] == "farm-fast"]
+    blackhole = [proxy for proxy in candidates if proxy["from"] == "farm-blackhole"]
+    proxy_daemon.candidates.update(candidates)
+    # Published by an earlier round; an unfinished re-probe must not unpublish it
+    proxy_daemon.live[proxy_key(blackhole[0])] = dict(blackhole[0], response_time=0.8)
+
+    start = time.time()
+    assert proxy_daemon.probe_round() == len(fast)
+    assert time.time() - start < vu.TEST_TIMEOUT
+
+    assert set(proxy_daemon.live) == {proxy_key(proxy) for proxy in fast + blackhole[:1]}
+    assert proxy_daemon.dirty
+    for proxy in blackhole:
+        assert health_key(proxy) not in proxy_daemon.store.records
+        assert proxy_key(proxy) in proxy_daemon.candidates
+    # Still due: the next round picks them up again
+    to_probe, _ = proxy_daemon.store.select(proxy_daemon.candidates.values())
+    assert {proxy_key(proxy) for proxy in to_probe} == {proxy_key(proxy) for proxy in blackhole}
+
+
+def test_state_round_trips_through_save_and_load(proxy_daemon, tmp_path):
+    candidates = [{"host": f"10.0.0.{i}", "port": 80, "type": "http"} for i in range(5)]
+    proxy_daemon.candidates.update(candidates)
+    live = {proxy_key(proxy): dict(proxy, response_time=0.1 * i) for i, proxy in enumerate(candidates[:3])}
+    proxy_daemon.live.update(live)
+    proxy_daemon.store.record(candidates[0], True, 0.5)
+
+    proxy_daemon.save_state()
+    assert not os.path.exists(proxy_daemon.state_path + ".tmp")
+
+    resumed = ProxyDaemon("t", state_path=proxy_daemon.state_path)
+    assert resumed.load_state()
+    assert resumed.candidates.values() == candidates
+    assert resumed.live == live
+    assert health_key(candidates[0]) in resumed.store.records
+
+
+def test_load_state_without_a_file(proxy_daemon):
+    assert not proxy_daemon.load_state()
+    assert len(proxy_daemon.candidates) == 0
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import pytest
+
+import delta_feed
+from delta_feed import MANIFEST, apply_delta, catch_up_paths, compose, record_changed, update_feed
+from keys import proxy_key
+
+
+class Feed:
+    """Publishes snapshots through update_feed into a dict standing in for the repo"""
+
+    def __init__(self, out_dir):
+        self.out_dir = str(out_dir)
+        self.remote = {}
+
+    def fetch(self, paths):
+        return {path: self.remote.get(path, "") for path in paths}
+
+    def publish(self, records):
+        snapshot = "".join(json.dumps(record) + "\n" for record in records)
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, "proxyinfo.json"), "w") as f:
+            f.write(snapshot)
+        written, kept = update_feed(self.out_dir, self.remote.get("proxyinfo.json", ""),
+                                    self.remote.get(MANIFEST, ""), self.fetch)
+        # Like commit_files(_prune_prefix="deltas/", _keep=kept)
+        self.remote = {path: text for path, text in self.remote.items()
+                       if not path.startswith(delta_feed.DELTA_DIR + "/") or path in kept}
+        for path in written:
+            with open(os.path.join(self.out_dir, path)) as f:
+                self.remote[path] = f.read()
+        self.remote["proxyinfo.json"] = snapshot
+        return self.manifest()
+
+    def manifest(self):
+        return json.loads(self.remote[MANIFEST])
+
+    def catch_up(self, seq, records):
+        paths = catch_up_paths(self.manifest(), seq)
+        if paths is None:
+            return None
+        records = dict(records)
+        for path in paths:
+            apply_delta(records, json.loads(self.remote[path]))
+        return records
+
+
+def _proxy(i, response_time=0.5, **fields):
+    return {"host": f"10.0.0.{i}", "port": 80, "type": "http", "response_time": response_time, **fields}
+
+
+def _by_key(records):
+    return {proxy_key(record): record for record in records}
+
+
+def _runs(count):
+    """Snapshots where every run adds, removes and re-times a few proxies"""
+    state = {i: _proxy(i) for i in range(20)}
+    for run in range(count):
+        if run:
+            state.pop(run - 1)
+            state[100 + run] = _proxy(100 + run)
+            state[10] = _proxy(10, 0.5 + run)  # Always past the latency threshold
+        yield list(state.values())
+
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch):
+    monkeypatch.setattr(delta_feed, "DELTA_COMPACT_SPAN", 4)
+    monkeypatch.setattr(delta_feed, "DELTA_RETENTION", 8)
+    return Feed(tmp_path)
+
+
+def test_consumers_catch_up_across_a_compaction_boundary(feed):
+    consumers = {}
+    for run, records in enumerate(_runs(10)):
+        manifest = feed.publish(records)
+        consumers[manifest["seq"]] = _by_key(records)
+
+    manifest = feed.manifest()
+    assert manifest["seq"] == 10
+    # Seqs 2-4 and 5-8 are compacted blocks, 9 and 10 single deltas; the first run only started the feed
+    assert [(entry["from_seq"], entry["seq"]) for entry in manifest["deltas"]] == [(2, 4), (5, 8), (9, 9), (10, 10)]
+    assert sorted(path for path in feed.remote if path.startswith("deltas/delta")) == \
+        sorted(entry["path"] for entry in manifest["deltas"])
+
+    latest = _by_key(records)
+    # Consumers inside a compacted block re-apply its earlier part, which is idempotent
+    for seq in (1, 3, 4, 6, 8, 9, 10):
+        assert feed.catch_up(seq, consumers[seq]) == latest, seq
+
+
+def test_consumer_older_than_retention_gets_a_full_snapshot(feed):
+    for records in _runs(13):
+        manifest = feed.publish(records)
+
+    # Retention 8 at seq 13 drops the 2-4 block: the feed reaches back to seq 4 only
+    assert manifest["oldest_seq"] == 4
+    assert catch_up_paths(manifest, 3) is None
+    assert catch_up_paths(manifest, 4) is not None
+    assert catch_up_paths(manifest, manifest["seq"]) == []
+
+
+def test_feed_restarts_when_the_published_snapshot_is_not_the_manifest_one(feed):
+    runs = list(_runs(3))
+    feed.publish(runs[0])
+    feed.publish(runs[1])
+    feed.remote["proxyinfo.json"] += json.dumps(_proxy(99)) + "\n"
+
+    manifest = feed.publish(runs[2])
+    assert manifest["seq"] == 3 and manifest["deltas"] == []
+    assert catch_up_paths(manifest, 2) is None
+
+
+def test_record_changed_ignores_small_latency_moves_and_scores():
+    old = _proxy(1, 1.0, throughput=100, ttfb=0.4)
+    assert not record_changed(old, dict(old, response_time=1.2), threshold=0.25)
+    assert record_changed(old, dict(old, response_time=1.25), threshold=0.25)
+    assert record_changed(old, dict(old, response_time=0.7), threshold=0.25)
+    # Throughput scores are re-measured every run and never a change on their own
+    assert not record_changed(old, dict(old, throughput=900, ttfb=0.1), threshold=0.25)
+    assert not record_changed(old, _proxy(1, 1.0), threshold=0.25)
+    # Any other field is
+    assert record_changed(old, dict(old, anonymity="elite"), threshold=0.25)
+    assert record_changed(old, dict(old, country="US"), threshold=0.25)
+    # A latency appearing or disappearing always counts
+    assert record_changed(old, dict(old, response_time=None))
+    assert record_changed(dict(old, response_time=None), old)
+    assert not record_changed(dict(old, response_time=None), dict(old, response_time=None))
+
+
+def test_compose_keeps_added_and_lets_the_last_operation_win():
+    first = {"from_seq": 1, "seq": 1, "added": [_proxy(1)], "changed": [_proxy(2, 2.0)], "removed": []}
+    second = {"from_seq": 2, "seq": 2, "added": [], "changed": [_proxy(1, 3.0)],
+              "removed": [{"host": "10.0.0.2", "port": 80, "type": "http"}]}
+
+    composed = compose([first, second])
+    assert (composed["from_seq"], composed["seq"]) == (1, 2)
+    assert composed["added"] == [_proxy(1, 3.0)]
+    assert composed["changed"] == []
+    assert composed["removed"] == [{"host": "10.0.0.2", "port": 80, "type": "http"}]
+
+    start = _by_key([_proxy(2)])
+    assert apply_delta(dict(start), composed) == apply_delta(apply_delta(dict(start), first), second)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import validate_and_upload as vu
+from validate_and_upload import proxy_key
+
+
+def _results(candidates, mode):
+    return {proxy_key(proxy): proxy for proxy in vu.validate_proxies(candidates, mode=mode, processes=1)}
+
+
+def test_async_engine_matches_thread_engine(farm):
+    candidates = farm({"fast": 6, "slow": 3, "blackhole": 2, "refused": 3, "liar": 3})
+
+    threaded = _results(candidates, "thread")
+    async_ = _results(candidates, "async")
+
+    expected = {proxy_key(proxy) for proxy in candidates if proxy["from"] in ("farm-fast", "farm-slow")}
+    assert set(threaded) == expected
+    assert set(async_) == expected
+    for key in expected:
+        for proxy in (threaded[key], async_[key]):
+            assert 0 <= proxy["response_time"] <= vu.MAX_RESPONSE_TIME
+            assert {k: v for k, v in proxy.items() if k != "response_time"} == \
+                next(candidate for candidate in candidates if proxy_key(candidate) == key)
+
+
+def test_process_mode_reports_worker_judge_stats(farm):
+    candidates = farm({"fast": 6, "refused": 2})
+
+    valid = vu.validate_proxies(candidates, mode="thread", processes=2)
+
+    assert len(valid) == 6
+    # Each worker keeps its own JudgePool; their answers are merged into the parent's
+    (stat,) = vu.judge_pool.stats.values()
+    assert stat["ok"] == 6
+    assert stat["ewma"] is not None
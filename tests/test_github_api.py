@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import base64
+
+import pytest
+
+import github_api
+import mock_github
+import validate_and_upload as vu
+from github_api import GithubClient, RateLimitError
+
+
+@pytest.fixture
+def server():
+    server = mock_github.serve()
+    server.files[("o", "r", "a.txt")] = b"hello"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Rate-limit waits the client asked for, recorded instead of slept"""
+    recorded = []
+    monkeypatch.setattr(github_api.time, "sleep", recorded.append)
+    return recorded
+
+
+def _client(server):
+    return GithubClient(_token="t", _api_root=server.url, _cache_dir="")
+
+
+def test_sequential_requests_reuse_one_connection(server):
+    client = _client(server)
+    for _ in range(10):
+        assert client.get_content("o", "r", "a.txt") == "hello"
+
+    stats = client.stats()
+    assert server.connections == 1
+    assert stats["requests"] == 10
+    assert stats["connections"] == 1
+    assert stats["handshakes_saved"] == 9
+    assert stats["handshake_seconds"] >= 0
+    assert stats["latency_saved_seconds"] == round(9 * stats["handshake_seconds"], 2)
+
+
+def test_parallel_requests_stay_within_pool(server):
+    for i in range(8):
+        server.files[("o", "r", f"f{i}.txt")] = str(i).encode()
+    client = GithubClient(_token="t", _api_root=server.url, _pool_size=2, _cache_dir="")
+    paths = [f"f{i}.txt" for i in range(8)] + ["missing.txt"]
+    for _ in range(3):
+        contents = client.get_contents("o", "r", paths)
+        assert contents == {**{f"f{i}.txt": str(i) for i in range(8)}, "missing.txt": ""}
+
+    # Threads beyond the pool size open overflow connections that are not kept;
+    # the client counts those too, so its figure matches the server's
+    stats = client.stats()
+    assert stats["requests"] == 27
+    assert server.connections == stats["connections"]
+    assert stats["handshakes_saved"] == 27 - stats["connections"]
+    assert stats["handshakes_saved"] > 0
+
+
+def test_retry_after_is_honoured(server, sleeps):
+    server.inject.append({"status": 429, "headers": {"Retry-After": "3"}})
+    client = _client(server)
+
+    assert client.get_content("o", "r", "a.txt") == "hello"
+    assert sleeps == [3.0]
+    assert server.throttled == 1
+    assert client.stats()["rate_limited"] == 1
+    assert client.stats()["rate_wait_seconds"] == 3.0
+
+
+def test_secondary_limit_backs_off_exponentially(server, sleeps):
+    # A 403 with only a "secondary rate limit" message and no hint headers
+    server.inject.extend([{"status": 403}, {"status": 403}])
+    client = _client(server)
+
+    assert client.get_content("o", "r", "a.txt") == "hello"
+    assert len(sleeps) == 2
+    for attempt, delay in enumerate(sleeps):
+        backoff = github_api.RATE_LIMIT_BACKOFF * 2 ** attempt
+        assert 0.5 * backoff <= delay <= backoff
+
+
+def test_retries_run_out(server, sleeps):
+    server.inject.extend([{"status": 429, "headers": {"Retry-After": "0"}}] * (github_api.RATE_LIMIT_RETRIES + 1))
+    client = _client(server)
+
+    with pytest.raises(RateLimitError):
+        client.get_content("o", "r", "a.txt")
+    assert server.throttled == github_api.RATE_LIMIT_RETRIES + 1
+    assert len(sleeps) == github_api.RATE_LIMIT_RETRIES
+
+
+def test_wait_above_cap_raises(server, sleeps, monkeypatch):
+    monkeypatch.setattr(github_api, "MAX_RATE_WAIT", 10)
+    server.inject.append({"status": 429, "headers": {"Retry-After": "30"}})
+    client = _client(server)
+
+    with pytest.raises(RateLimitError) as excinfo:
+        client.get_content("o", "r", "a.txt")
+    assert sleeps == []
+    assert excinfo.value.retry_at is not None
+    assert server.throttled == 1
+
+
+def test_low_budget_is_paced_until_the_reset(sleeps, monkeypatch):
+    monkeypatch.setattr(github_api, "RATE_LIMIT_RESERVE", 1)
+    monkeypatch.setattr(github_api, "RATE_LIMIT_PACE", 10)
+    monkeypatch.setattr(github_api, "MAX_RATE_WAIT", 100)
+    server = mock_github.serve(rate_limit=6, rate_window=120)
+    server.files[("o", "r", "a.txt")] = b"hello"
+    try:
+        client = _client(server)
+        for _ in range(5):
+            assert client.get_content("o", "r", "a.txt") == "hello"
+
+        # Spare requests are spread over the ~121s to the reset: 4, 3 and then 2 of them left.
+        # The clock is frozen, so each wait is the sum of the intervals before it, capped at MAX_RATE_WAIT
+        assert sleeps == pytest.approx([121 / 4, 121 / 4 + 121 / 3, 100], abs=1.5)
+        assert server.requests == 5 and server.throttled == 0
+
+        # Down to the reserve with the reset two minutes away: no request is sent
+        with pytest.raises(RateLimitError) as excinfo:
+            client.get_content("o", "r", "a.txt")
+        assert excinfo.value.retry_at >= server.rate_reset
+        assert server.requests == 5
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_spent_primary_limit_defers_the_publish(sleeps, tmp_path, monkeypatch):
+    server = mock_github.serve(rate_limit=1, rate_window=3600)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vu, "DELTA_FEED", False)
+    monkeypatch.setattr(vu, "SHARD_LAYOUT", "")
+    monkeypatch.setattr(github_api, "_default_client", _client(server))
+    try:
+        vu.write_outputs([{"host": "10.0.0.1", "port": 80, "type": "http", "response_time": 0.2}])
+
+        # The branch read spends the budget; the rest waits for the next run instead of an hour here
+        assert not vu.publish_outputs("t")
+        assert server.requests == 1
+        assert server.commits == 0
+        assert sleeps == []
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_outputs_publish_in_one_commit_and_read_back(server, tmp_path):
+    out_dir = str(tmp_path)
+    proxies = [{"host": f"10.0.0.{i}", "port": 80, "type": "http", "anonymity": "anonymous", "response_time": i / 10}
+               for i in range(1, 30)]
+    vu.write_outputs(proxies, out_dir)
+    names = vu.output_names() + vu.write_shards(out_dir, layout="group", use_gzip=True)
+    files = {name: vu.read_output(name, out_dir) for name in names}
+    assert any(isinstance(content, bytes) for content in files.values())
+
+    client = _client(server)
+    head = client.commit_files("o", "r", files)
+
+    assert server.commits == 1
+    assert server.refs[("o", "r")] == head
+    for name in names:
+        with open(tmp_path / name, 'rb') as f:
+            assert server.files[("o", "r", name)] == f.read()
+    # The untouched file survives: the new tree is built on the old one
+    assert server.files[("o", "r", "a.txt")] == b"hello"
+    assert client.get_content("o", "r", "proxyinfo.json") == files["proxyinfo.json"]
+
+
+def test_unchanged_files_are_not_committed_again(server):
+    client = _client(server)
+    files = {"proxyinfo.json": "{}\n", "shards/a.jsonl.gz": gzip.compress(b"{}\n", mtime=0)}
+    head = client.commit_files("o", "r", files)
+    requests = server.requests
+
+    assert client.commit_files("o", "r", files) == head
+    assert server.commits == 1
+    # Branch and tree listing only: no blob, tree, commit or ref calls
+    assert server.requests - requests == 2
+    stats = client.stats()
+    # The gzip shard's blob upload, then the tree, commit and ref update
+    assert stats["files_skipped"] == 2 and stats["calls_skipped"] == 1 + 3
+
+
+def test_commit_prunes_stale_files_under_the_prefixes(server):
+    client = _client(server)
+    server.files.update({("o", "r", "shards/old.jsonl"): b"1", ("o", "r", "tiers/max-9s.json"): b"2",
+                         ("o", "r", "deltas/1.json"): b"3", ("o", "r", "deltas/2.json"): b"4"})
+
+    client.commit_files("o", "r", {"shards/new.jsonl": "x"}, _prune_prefix=("shards/", "tiers/", "deltas/"),
+                        _keep=["deltas/2.json"])
+
+    assert sorted(path for _, _, path in server.files) == ["a.txt", "deltas/2.json", "shards/new.jsonl"]
+    assert server.commits == 1
+
+
+@pytest.mark.parametrize("form", ["text", "base64", "bytes"])
+def test_update_skips_unchanged_content_in_every_form(server, form, monkeypatch):
+    data = b"hello" if form == "text" else gzip.compress(b"hello", mtime=0)
+    server.files[("o", "r", "a.txt")] = data
+    client = _client(server)
+    monkeypatch.setattr(github_api, "_default_client", client)
+
+    def update(content):
+        if form == "text":
+            return client.update_content("o", "r", "a.txt", _content_not_base64=content.decode("utf-8"))
+        if form == "base64":
+            return client.update_content("o", "r", "a.txt", _content_base64ed=base64.b64encode(content).decode())
+        success, status = vu.upload_or_create("o", "r", "a.txt", None, content, "msg")
+        assert success
+        return status
+
+    update(data)
+    assert server.commits == 0
+    assert client.stats()["files_skipped"] == 1
+    update(data + b"!")
+    assert server.commits == 1
+    assert server.files[("o", "r", "a.txt")] == data + b"!"
+
+
+def test_per_file_fallback_skips_unchanged_files_and_prunes(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vu, "BATCH_COMMIT", False)
+    monkeypatch.setattr(vu, "DELTA_FEED", False)
+    monkeypatch.setattr(vu, "SHARD_LAYOUT", "")
+    monkeypatch.setattr(github_api, "_default_client", _client(server))
+    server.files.update({("parserpp", "ip_ports", "shards/part-0000.jsonl.gz"): b"old",
+                         ("parserpp", "ip_ports", "tiers/max-9s.json"): b"old",
+                         ("parserpp", "ip_ports", "deltas/index.json"): b"{}"})
+    vu.write_outputs([{"host": "10.0.0.1", "port": 80, "type": "http", "response_time": 0.2}])
+
+    assert vu.publish_outputs("t")
+    published = sorted(path for owner, _, path in server.files if owner == "parserpp")
+    assert published == sorted(vu.output_names())
+    commits = server.commits
+    assert commits == len(vu.output_names()) + 3
+
+    # Nothing changed: every PUT is skipped and nothing is left to prune
+    assert vu.publish_outputs("t")
+    assert server.commits == commits
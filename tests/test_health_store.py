@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import health_store
+import validate_and_upload as vu
+from health_store import HealthStore, health_key, LAST_CHECKED, STREAK, EWMA
+
+NOW = 1_000_000
+
+
+def _proxy(port, **fields):
+    return {"host": "10.0.0.1", "port": port, "type": "http", **fields}
+
+
+def _store(tmp_path, records=None):
+    return HealthStore(str(tmp_path / "health.json"), records)
+
+
+def test_select_splits_fresh_due_carried_and_backoff(tmp_path):
+    good, due_good, due_bad, backoff = _proxy(1), _proxy(2), _proxy(3), _proxy(4)
+    store = _store(tmp_path, {
+        health_key(good): [NOW - 60, 3, 0.42],
+        health_key(due_good): [NOW - health_store.GOOD_RECHECK_INTERVAL, 5, 0.3],
+        health_key(due_bad): [NOW - health_store.FAIL_BACKOFF_BASE, -1, None],
+        health_key(backoff): [NOW - health_store.FAIL_BACKOFF_BASE, -2, None],
+    })
+    fresh = _proxy(5)
+
+    to_probe, carried = store.select([good, due_bad, fresh, backoff, due_good], now=NOW)
+
+    # Unseen first, then due proxies by success streak
+    assert to_probe == [fresh, due_good, due_bad]
+    assert carried == [dict(good, response_time=0.42)]
+    assert store.last_selection == {"fresh": 1, "due": 2, "carried_over": 1, "backoff": 1}
+    store.select([fresh], now=NOW)
+    assert store.selected == {"fresh": 2, "due": 2, "carried_over": 1, "backoff": 1}
+
+
+def test_failure_backoff_doubles_up_to_the_cap(tmp_path):
+    store = _store(tmp_path)
+    proxy = _proxy(1)
+    delays = []
+    for _ in range(12):
+        store.record(proxy, False, now=NOW)
+        delays.append(store.next_due(store.records[health_key(proxy)]) - NOW)
+
+    base = health_store.FAIL_BACKOFF_BASE
+    assert delays[:3] == [base, 2 * base, 4 * base]
+    assert max(delays) == delays[-1] == health_store.FAIL_BACKOFF_MAX
+
+    store.record(proxy, True, 0.5, now=NOW)
+    record = store.records[health_key(proxy)]
+    assert record[STREAK] == 1 and record[EWMA] == 0.5
+    assert store.next_due(record) == NOW + store.recheck_interval
+
+
+def test_update_records_probed_outcomes_and_ewma(tmp_path):
+    store = _store(tmp_path)
+    ok, bad = _proxy(1), _proxy(2)
+    store.update([ok, bad], [dict(ok, response_time=1.0)], now=NOW)
+    store.update([ok, bad], [dict(ok, response_time=2.0)], now=NOW + 1)
+
+    assert store.records[health_key(ok)] == [NOW + 1, 2, round(0.3 * 2.0 + 0.7 * 1.0, 3)]
+    assert store.records[health_key(bad)][STREAK] == -2
+
+
+def test_carry_over_only_recently_good(tmp_path):
+    recent, stale, failing = _proxy(1), _proxy(2), _proxy(3)
+    store = _store(tmp_path, {
+        health_key(recent): [NOW - 60, 1, 0.333],
+        health_key(stale): [NOW - health_store.CARRY_OVER_TTL - 1, 4, 0.2],
+        health_key(failing): [NOW - 60, -1, None],
+    })
+
+    assert store.carry_over(recent, now=NOW) == dict(recent, response_time=0.33)
+    assert store.carry_over(stale, now=NOW) is None
+    assert store.carry_over(failing, now=NOW) is None
+    assert store.carry_over(_proxy(4), now=NOW) is None
+
+
+def test_save_prunes_and_load_round_trips(tmp_path):
+    kept, old = _proxy(1), _proxy(2)
+    store = _store(tmp_path, {
+        health_key(kept): [NOW - 60, 2, 0.1],
+        health_key(old): [NOW - health_store.PRUNE_AFTER - 1, 1, 0.1],
+    })
+    store.save(now=NOW)
+
+    loaded = HealthStore.load(store.path)
+    assert loaded.records == {health_key(kept): [NOW - 60, 2, 0.1]}
+    assert loaded.records[health_key(kept)][LAST_CHECKED] == NOW - 60
+
+
+def test_load_survives_a_corrupt_file(tmp_path):
+    path = tmp_path / "health.json"
+    path.write_text("{not json")
+    assert HealthStore.load(str(path)).records == {}
+
+
+def test_carried_over_proxies_count_as_kept(tmp_path):
+    carried, backoff = [_proxy(port) for port in range(1, 4)], [_proxy(port) for port in range(4, 6)]
+    now = round(time.time())
+    store = _store(tmp_path, {
+        **{health_key(proxy): [now, 2, 0.5] for proxy in carried},
+        **{health_key(proxy): [now, -3, None] for proxy in backoff},
+    })
+
+    output = list(vu.iter_validated(carried + backoff, store, processes=1))
+
+    assert output == [dict(proxy, response_time=0.5) for proxy in carried]
+    assert vu.stage_counters["health_store"] == {"in": 5, "out": 3, "unfinished": 0}
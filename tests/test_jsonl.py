@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import jsonl
+import query_service
+import validate_and_upload as vu
+
+LINES = '{"host": "1.1.1.1", "port": 80}\nnot json\n\n[1, 2]\n{"host": "2.2.2.2", "port": 81}\n'
+EXPECTED = [{"host": "1.1.1.1", "port": 80}, {"host": "2.2.2.2", "port": 81}]
+
+
+def test_iter_lines_counts_malformed(capsys):
+    assert list(jsonl.iter_lines(io.StringIO(LINES), source="stream", batch_lines=2)) == EXPECTED
+    assert "Skipped 2 malformed lines in stream" in capsys.readouterr().out
+
+
+def test_iter_json_lines_reports_malformed(capsys):
+    assert list(vu.iter_json_lines(LINES.encode().splitlines())) == EXPECTED
+    assert "Skipped 2 malformed lines" in capsys.readouterr().out
+
+
+def test_load_snapshot_reports_malformed(tmp_path, capsys):
+    path = tmp_path / "proxyinfo.json"
+    path.write_text(LINES)
+    snapshot = query_service.load_snapshot(str(path), version=3)
+    assert len(snapshot) == 2
+    assert "Skipped 2 malformed lines in proxyinfo.json" in capsys.readouterr().out
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from judges import parse_http_response
+
+
+def test_parse_content_length_response():
+    raw = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}trailing"
+    assert parse_http_response(raw) == (200, {"content-type": "application/json", "content-length": "2"}, b"{}")
+
+
+def test_parse_chunked_response():
+    raw = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n4\r\nabcd\r\n3;ext=1\r\nefg\r\n0\r\n\r\n"
+    assert parse_http_response(raw)[2] == b"abcdefg"
+
+
+def test_parse_head_only():
+    status_code, headers, body = parse_http_response(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 10\r\n\r\n")
+    assert (status_code, headers["content-length"], body) == (503, "10", b"")
+
+
+@pytest.mark.parametrize("raw", [b"garbage\r\n\r\n", b"", b"HTTP/1.1\r\n\r\n", b"HTTP/1.1 OK 200\r\n\r\n",
+                                 b"SSH-2.0-OpenSSH_9.6\r\n"])
+def test_malformed_status_line_raises_value_error(raw):
+    with pytest.raises(ValueError):
+        parse_http_response(raw)
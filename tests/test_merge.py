@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import validate_and_upload as vu
+
+
+def _merge(impl, existing, new):
+    if impl == "index":
+        return vu.merge_proxies(existing, new)
+    if impl == "spool":
+        return list(vu.iter_merged(iter(existing), iter(new), memory_records=0))
+    if impl == "spill":
+        # Past the memory budget halfway through the input
+        return list(vu.iter_merged(iter(existing), iter(new), memory_records=len(existing)))
+    return list(vu.iter_merged(iter(existing), iter(new)))
+
+
+@pytest.fixture(params=["index", "stream", "spool", "spill"])
+def merge(request):
+    return lambda existing, new: _merge(request.param, existing, new)
+
+
+def test_published_record_beats_fresh_scrape(merge):
+    published = {"host": "1.2.3.4", "port": 80, "type": "http", "country": "US", "response_time": 0.4}
+    scraped = {"host": "1.2.3.4", "port": "80", "type": "http", "country": "DE"}
+    assert merge([published], [scraped]) == [published]
+
+
+def test_more_complete_scrape_wins(merge):
+    published = {"host": "1.2.3.4", "port": 80, "type": "http", "country": ""}
+    scraped = {"host": "1.2.3.4", "port": 80, "type": "http", "country": "DE"}
+    assert merge([published], [scraped]) == [scraped]
+
+
+def test_equal_completeness_later_record_wins(merge):
+    first = {"host": "1.2.3.4", "port": 80, "type": "http", "country": "US"}
+    second = {"host": "1.2.3.4", "port": 80, "type": "http", "country": "DE"}
+    third = {"host": "1.2.3.4", "port": 80, "type": "http", "country": "FR"}
+    assert merge([first], [second, third]) == [third]
+
+
+def test_order_follows_first_sighting_and_type_is_part_of_the_key(merge):
+    a = {"host": "1.1.1.1", "port": 80, "type": "http"}
+    b = {"host": "2.2.2.2", "port": 80, "type": "http"}
+    b_https = {"host": "2.2.2.2", "port": 80, "type": "https"}
+    a_newer = dict(a, country="US")
+    assert merge([a, b], [b_https, a_newer]) == [a_newer, b, b_https]
+
+
+def test_spill_mid_input_matches_the_index():
+    existing = [{"host": f"10.0.{i // 250}.{i % 250}", "port": 80, "type": "http", "response_time": 1}
+                for i in range(15000)]
+    new = [{"host": f"10.0.{i // 250}.{i % 250}", "port": str(80 + i % 2), "type": "http", "country": "US"}
+           for i in range(0, 30000, 2)]
+    expected = vu.merge_proxies(existing, new)
+    assert list(vu.iter_merged(iter(existing), iter(new), memory_records=12000)) == expected
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import validate_and_upload as vu
+from networks import NetworkThrottle
+
+
+def _admitted(throttle, host):
+    keys = throttle.acquire(host)
+    throttle.release(keys)
+    return keys is not None
+
+
+def test_hosts_behind_a_shared_exit_are_collapsed():
+    throttle = NetworkThrottle(quorum=3)
+    throttle.observe("10.0.0.1", "203.0.113.9", False)
+    throttle.observe("10.0.0.2", "203.0.113.9", False)
+    throttle.observe("10.0.0.3", "10.0.0.3", True)
+    assert _admitted(throttle, "10.0.0.1")
+
+    throttle.observe("10.0.0.1", "203.0.113.9", False)
+    assert not _admitted(throttle, "10.0.0.1")
+    assert not _admitted(throttle, "10.0.0.2")
+    # Same /24, but never seen leaving through that exit
+    assert _admitted(throttle, "10.0.0.3")
+    assert _admitted(throttle, "10.0.0.4")
+
+    # A host revealed behind the exit later is skipped at once
+    throttle.observe("10.0.5.1", "203.0.113.9", False)
+    assert not _admitted(throttle, "10.0.5.1")
+
+
+def test_host_that_passed_is_never_skipped():
+    throttle = NetworkThrottle(quorum=2)
+    throttle.observe("10.0.0.1", "10.0.0.1", True)
+    throttle.observe("10.0.0.1", "203.0.113.9", False)
+    throttle.observe("10.0.0.2", "203.0.113.9", False)
+    assert _admitted(throttle, "10.0.0.1")
+    assert not _admitted(throttle, "10.0.0.2")
+
+
+def test_skipped_proxies_are_unfinished_not_failed(farm):
+    candidates = farm({"liar": 10})
+    vu.begin_validation("thread")
+    unfinished = []
+
+    valid = vu.validate_batch(candidates, "thread", 10, unfinished=unfinished)
+
+    assert valid == []
+    assert len(unfinished) >= 5
+    counter = vu.stage_counters["http_check"]
+    assert counter == {"in": 10, "out": 0, "unfinished": len(unfinished)}
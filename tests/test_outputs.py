@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+
+import pytest
+
+import validate_and_upload as vu
+from github_api import git_blob_sha
+
+TYPES = ("http", "https", "socks5")
+ANONYMITIES = ("transparent", "anonymous", "high_anonymous")
+
+
+def _proxies(count):
+    return [{"host": f"10.0.{i // 250}.{i % 250}", "port": 8000 + i % 7, "type": TYPES[i % 3],
+             "anonymity": ANONYMITIES[i % 5 % 3], "country": "US", "response_time": round(0.1 + i % 40 / 10, 1)}
+            for i in range(count)]
+
+
+def _read_shard(path, use_gzip):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, (gzip.decompress(data) if use_gzip else data).decode('utf-8')
+
+
+def _write(out_dir, proxies, **options):
+    vu.write_outputs(proxies, str(out_dir), tiers=[])
+    paths = vu.write_shards(str(out_dir), **options)
+    with open(out_dir / vu.SHARD_DIR / "index.json") as f:
+        return paths, json.load(f)
+
+
+@pytest.mark.parametrize("layout", ["group", "size"])
+@pytest.mark.parametrize("use_gzip", [True, False])
+def test_shards_round_trip_to_the_flat_file(tmp_path, layout, use_gzip):
+    proxies = _proxies(600)
+    paths, manifest = _write(tmp_path, proxies, layout=layout, use_gzip=use_gzip, max_bytes=16 * 1024)
+
+    assert paths[-1] == f"{vu.SHARD_DIR}/index.json"
+    assert [entry["path"] for entry in manifest["shards"]] == paths[:-1]
+    assert manifest["layout"] == layout and manifest["gzip"] == use_gzip
+    assert manifest["count"] == len(proxies)
+
+    records = []
+    for entry in manifest["shards"]:
+        assert entry["path"].endswith(".jsonl.gz" if use_gzip else ".jsonl")
+        data, text = _read_shard(tmp_path / entry["path"], use_gzip)
+        assert entry["bytes"] == len(data) and entry["sha"] == git_blob_sha(data)
+        shard = [json.loads(line) for line in text.splitlines()]
+        assert len(shard) == entry["count"]
+        if layout == "group":
+            name = entry["path"].rsplit("/", 1)[1].split(".")[0]
+            assert {f"{p['type']}_{p['anonymity']}" for p in shard} == {name}
+        positions = [proxies.index(proxy) for proxy in shard]
+        assert positions == sorted(positions)
+        records += shard
+
+    # Every record lands in exactly one shard, in proxyinfo.json order within it
+    key = lambda proxy: (proxy["host"], proxy["port"], proxy["type"])
+    assert sorted(records, key=key) == sorted(proxies, key=key)
+
+
+def test_size_layout_splits_by_budget_and_keeps_bytes_stable(tmp_path):
+    proxies = _proxies(600)
+    _, first = _write(tmp_path / "a", proxies, layout="size", use_gzip=True, max_bytes=16 * 1024)
+    size = (tmp_path / "a" / "proxyinfo.json").stat().st_size
+    assert len(first["shards"]) == vu.shard_bucket_count(size, 16 * 1024) > 1
+
+    # Same data, same bytes (no gzip timestamp); one changed proxy touches one shard
+    _, again = _write(tmp_path / "b", proxies, layout="size", use_gzip=True, max_bytes=16 * 1024)
+    assert again == first
+    _, changed = _write(tmp_path / "c", [dict(proxies[0], response_time=9.9)] + proxies[1:],
+                        layout="size", use_gzip=True, max_bytes=16 * 1024)
+    assert sum(a["sha"] != b["sha"] for a, b in zip(first["shards"], changed["shards"])) == 1
+
+
+def test_unknown_layout_is_rejected(tmp_path):
+    vu.write_outputs([], str(tmp_path), tiers=[])
+    with pytest.raises(ValueError):
+        vu.write_shards(str(tmp_path), layout="zip")
+
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_tiers_hold_every_proxy_within_their_threshold_fastest_first(tmp_path):
+    # Exactly on a threshold, no latency and a non-numeric one, next to the regular records
+    edge = [dict(proxy, host=f"10.9.0.{i}", response_time=latency)
+            for i, (proxy, latency) in enumerate(zip(_proxies(3), (0.5, None, "n/a")))]
+    proxies = _proxies(200) + edge
+    ordered = list(vu.iter_sorted(iter(proxies), spool_dir=str(tmp_path)))
+    out_dir = tmp_path / "out"
+    assert vu.write_outputs(iter(ordered), str(out_dir), tiers=[3, 0.5, 1, 0.05]) == len(proxies)
+
+    assert _lines(out_dir / "proxyinfo.json") == ordered
+    for threshold in (0.05, 0.5, 1, 3):
+        tier = _lines(out_dir / vu.tier_name(threshold))
+        assert tier == [proxy for proxy in ordered if vu.response_time(proxy) is not None
+                        and vu.response_time(proxy) <= threshold]
+    # Nothing is that fast: the tier file is there, empty
+    assert (out_dir / vu.tier_name(0.05)).read_text() == "\n"
+    assert sorted(vu.output_names([3, 0.5])) == sorted(list(vu.OUTPUT_FILES) + [vu.tier_name(0.5), vu.tier_name(3),
+                                                                                vu.STATS_FILE])
+
+
+def test_stats_match_the_written_set(tmp_path):
+    proxies = _proxies(150) + [{"host": "10.9.0.1", "port": 80}, {"host": "10.9.0.2", "port": 80, "response_time": None}]
+    vu.write_outputs(iter(proxies), str(tmp_path), tiers=[0.5, 1])
+    with open(tmp_path / vu.STATS_FILE) as f:
+        stats = json.load(f)
+
+    def counts(value):
+        result = {}
+        for proxy in proxies:
+            result[value(proxy)] = result.get(value(proxy), 0) + 1
+        return result
+
+    assert stats["count"] == len(proxies)
+    assert stats["by_type"] == counts(lambda proxy: proxy.get("type", "http"))
+    assert stats["by_anonymity"] == counts(lambda proxy: proxy.get("anonymity", "transparent"))
+    assert stats["by_country"] == counts(lambda proxy: proxy.get("country") or "--")
+    by_group = counts(lambda proxy: f"{proxy.get('type', 'http')}_{proxy.get('anonymity', 'transparent')}")
+    assert stats["by_type_anonymity"] == by_group
+    # Same keys and sizes as the db.json groups
+    with open(tmp_path / "db.json") as f:
+        assert {key: len(group) for key, group in json.load(f).items()} == by_group
+
+    latencies = sorted(proxy["response_time"] for proxy in proxies if proxy.get("response_time") is not None)
+    assert stats["latency"]["samples"] == len(latencies) and stats["latency"]["unknown"] == 2
+    assert (stats["latency"]["min"], stats["latency"]["max"]) == (latencies[0], latencies[-1])
+    assert stats["latency"]["p50"] == latencies[len(latencies) // 2]
+    assert stats["latency"]["p99"] == latencies[int(len(latencies) * 0.99)]
+    assert stats["tiers"] == [{"path": vu.tier_name(threshold), "max_response_time": threshold,
+                               "count": sum(latency <= threshold for latency in latencies)}
+                              for threshold in (0.5, 1)]
+
+
+def test_stats_are_byte_stable(tmp_path):
+    proxies = _proxies(50)
+    for name in ("a", "b"):
+        vu.write_outputs(iter(proxies), str(tmp_path / name), tiers=[1])
+    assert (tmp_path / "a" / vu.STATS_FILE).read_bytes() == (tmp_path / "b" / vu.STATS_FILE).read_bytes()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+import validate_and_upload as vu
+
+
+@pytest.fixture
+def judge():
+    """serve(send) answers every connection by calling send(conn); returns the proxy URL"""
+    sockets = []
+
+    def serve(send):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        sockets.append(server)
+
+        def handle(conn):
+            with conn:
+                conn.recv(65536)
+                try:
+                    send(conn)
+                except OSError:
+                    pass
+
+        def accept():
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        return f"http://127.0.0.1:{server.getsockname()[1]}"
+
+    yield serve
+    for server in sockets:
+        server.close()
+
+
+def _get(proxy_url):
+    return requests.get("http://judge.invalid/get", proxies={"http": proxy_url}, timeout=(1, 1), stream=True)
+
+
+def test_body_is_capped(judge):
+    body = b"x" * (vu.MAX_RESPONSE_BYTES + 1000)
+    url = judge(lambda conn: conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body))
+    assert vu._read_body(_get(url), time.time() + 5) == body[:vu.MAX_RESPONSE_BYTES]
+
+
+def test_chunked_body(judge):
+    url = judge(lambda conn: conn.sendall(
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n"))
+    assert vu._read_body(_get(url), time.time() + 5) == b"hello world"
+
+
+def test_trickling_body_stops_at_the_deadline(judge):
+    def drip(conn):
+        conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n")
+        for _ in range(100):
+            conn.sendall(b" ")
+            time.sleep(0.05)
+
+    response = _get(judge(drip))
+    start = time.time()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        vu._read_body(response, start + 0.5)
+    # Every byte arrives well inside the 1 s read timeout; only the deadline ends the read
+    assert time.time() - start < 1.0
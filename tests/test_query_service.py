@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+from query_service import FILTERS, ProxySnapshot, parse_query
+
+TYPES = ["http", "HTTPS", "socks5", None]
+ANONYMITIES = ["transparent", "anonymous", "high_anonymous", None]
+COUNTRIES = ["US", "de", "CN", ""]
+
+
+def _proxies(rng, count):
+    proxies = []
+    for i in range(count):
+        proxy = {"host": f"10.0.{i // 250}.{i % 250}", "port": 80 + i % 3,
+                 "response_time": rng.choice([round(rng.uniform(0.05, 5), 2), 1.0, None, "n/a"])}
+        for name, values in (("type", TYPES), ("anonymity", ANONYMITIES), ("country", COUNTRIES)):
+            value = rng.choice(values)
+            if value is not None:
+                proxy[name] = value
+        proxies.append(proxy)
+    # Unpublishable records never enter the snapshot
+    return proxies + [{"host": "", "port": 80, "response_time": 0.01}, {"host": "10.9.9.9", "response_time": 0.01}]
+
+
+def _value(proxy, name):
+    return str(proxy.get(name) or {"type": "http", "anonymity": "transparent"}.get(name, "")).lower()
+
+
+def _latency(proxy):
+    latency = proxy.get("response_time")
+    return latency if isinstance(latency, (int, float)) else float("inf")
+
+
+def _brute_top(proxies, filters, max_latency, limit):
+    """Linear scan with the snapshot's documented semantics"""
+    matching = [proxy for proxy in proxies if proxy.get("host") and proxy.get("port")
+                and all(_value(proxy, name) == value for name, value in filters.items())
+                and (max_latency is None or _latency(proxy) <= max_latency)]
+    matching.sort(key=lambda proxy: (_latency(proxy), str(proxy["host"]), str(proxy["port"]), _value(proxy, "type")))
+    return matching[:limit]
+
+
+def _queries(rng, count):
+    for _ in range(count):
+        filters = {name: rng.choice(values) for name, values in
+                   (("type", ["http", "https", "socks5", "socks4"]), ("anonymity", ["transparent", "anonymous"]),
+                    ("country", ["us", "de", "cn", ""])) if rng.random() < 0.5}
+        yield filters, rng.choice([None, 0.5, 1.0, 2.5, 10]), rng.choice([1, 5, 50, 1000])
+
+
+def test_top_matches_a_brute_force_scan():
+    rng = random.Random(7)
+    proxies = _proxies(rng, 1500)
+    snapshot = ProxySnapshot(proxies)
+    assert len(snapshot) == 1500
+
+    for filters, max_latency, limit in _queries(rng, 300):
+        top = [snapshot.records[position] for position in snapshot.top(filters, max_latency, limit)]
+        assert top == _brute_top(proxies, filters, max_latency, limit), (filters, max_latency, limit)
+
+
+def test_random_picks_only_matching_records():
+    rng = random.Random(11)
+    proxies = _proxies(rng, 300)
+    snapshot = ProxySnapshot(proxies)
+
+    for filters, max_latency, _ in _queries(rng, 50):
+        expected = _brute_top(proxies, filters, max_latency, len(proxies))
+        picks = [snapshot.random(filters, max_latency, rng) for _ in range(20)]
+        if not expected:
+            assert picks == [None] * 20
+            continue
+        assert all(snapshot.records[position] in expected for position in picks)
+
+
+def test_stats_count_every_value_with_defaults():
+    proxies = [{"host": "10.0.0.1", "port": 80}, {"host": "10.0.0.2", "port": 80, "type": "HTTPS"},
+               {"host": "10.0.0.3", "port": 80, "type": "https", "anonymity": "anonymous"}]
+    stats = ProxySnapshot(proxies, version=3).stats()
+    assert stats["version"] == 3 and stats["count"] == 3
+    assert stats["by_type"] == {"http": 1, "https": 2}
+    assert stats["by_anonymity"] == {"anonymous": 1, "transparent": 2}
+
+
+def test_parse_query():
+    assert parse_query("type=HTTPS&country=us&max_latency=1.5&limit=5&color=red") == \
+        ({"type": "https", "country": "us"}, 1.5, 5)
+    assert parse_query("limit=0") == ({}, None, 1)
+    assert parse_query("limit=100000")[2] == 1000
+    assert set(parse_query("type=http&anonymity=elite&country=de")[0]) == set(FILTERS)
+    with pytest.raises(ValueError):
+        parse_query("max_latency=fast")
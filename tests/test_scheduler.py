@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+import health_store
+import validate_and_upload as vu
+from health_store import HealthStore, health_key, STREAK
+from scheduler import RunScheduler
+
+
+@pytest.mark.parametrize("mode", ["thread", "async"])
+def test_deadline_carries_unfinished_proxies_forward(farm, tmp_path, monkeypatch, mode):
+    # All farm proxies share 127.0.0.1: the per-host limit would queue the fast ones behind the blackholes
+    monkeypatch.setattr(vu, "NETWORK_THROTTLE", False)
+    candidates = farm({"fast": 3, "blackhole": 6})
+    fast = [proxy for proxy in candidates if proxy["from"] == "farm-fast"]
+    blackhole = [proxy for proxy in candidates if proxy["from"] == "farm-blackhole"]
+    known, unknown = blackhole[:4], blackhole[4:]
+
+    # The known blackholes passed 40 minutes ago: due for a re-probe, still inside the carry-over TTL
+    now = time.time()
+    checked = now - health_store.GOOD_RECHECK_INTERVAL - 600
+    store = HealthStore(str(tmp_path / "health.json"), {health_key(proxy): [checked, 3, 0.7] for proxy in known})
+    scheduler = RunScheduler(budget=1.5, reserve=0, start=now)
+
+    start = time.time()
+    output = list(vu.iter_validated(candidates, store, mode=mode, processes=1, scheduler=scheduler))
+    elapsed = time.time() - start
+
+    # Cut at the deadline instead of waiting out the blackholes' probe timeout
+    assert elapsed < vu.TEST_TIMEOUT
+    assert sorted(proxy["port"] for proxy in output if proxy["from"] == "farm-fast") == \
+        sorted(proxy["port"] for proxy in fast)
+    assert [proxy for proxy in output if proxy["from"] == "farm-blackhole"] == \
+        [dict(proxy, response_time=0.7) for proxy in known]
+    assert scheduler.unprobed == len(blackhole)
+    assert scheduler.carried_over == len(known)
+
+    # Unfinished probes are not failures: the known records are untouched, the unknown never recorded
+    for proxy in known:
+        assert store.records[health_key(proxy)] == [checked, 3, 0.7]
+    for proxy in unknown:
+        assert health_key(proxy) not in store.records
+    for proxy in fast:
+        assert store.records[health_key(proxy)][STREAK] == 1
+    assert vu.stage_counters["http_check"]["unfinished"] == len(blackhole)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+
+import pytest
+
+import scoring
+from metrics import metrics
+
+JUDGE_URL = "http://judge.invalid/get"
+
+
+@pytest.fixture
+def misbehaving():
+    """serve(send) answers every connection by calling send(conn); returns a proxy record"""
+    sockets = []
+
+    def serve(send):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        sockets.append(server)
+
+        def handle(conn):
+            with conn:
+                conn.recv(65536)
+                try:
+                    send(conn)
+                    conn.recv(65536)  # Hold the connection until the client gives up
+                except OSError:
+                    pass
+
+        def accept():
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        return {"host": "127.0.0.1", "port": server.getsockname()[1], "type": "http"}
+
+    yield serve
+    for server in sockets:
+        server.close()
+
+
+def test_malformed_responses_fail_only_their_own_proxy(farm, misbehaving):
+    (good,) = farm({"fast": 1})
+    garbage = misbehaving(lambda conn: conn.sendall(b"garbage\r\n\r\n"))
+    oversized = misbehaving(lambda conn: conn.sendall(
+        b"HTTP/1.1 200 OK\r\nX-Padding: " + b"a" * (scoring.MAX_HEADER_BYTES + 1024)))
+    truncated = misbehaving(lambda conn: (conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n{}"),
+                                          conn.shutdown(socket.SHUT_WR)))
+    errors = metrics.value("score_outcomes_total", outcome="error")
+    short = metrics.value("score_outcomes_total", outcome="short_body")
+
+    scored = scoring.score_proxies([garbage, good, oversized, truncated], JUDGE_URL, deadline=None)
+
+    assert [proxy["port"] for proxy in scored] == [good["port"]]
+    assert all(scored[0][field] is not None for field in scoring.SCORE_FIELDS)
+    assert metrics.value("score_outcomes_total", outcome="error") - errors == 2
+    assert metrics.value("score_outcomes_total", outcome="short_body") - short == 1
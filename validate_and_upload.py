@@ -2,31 +2,162 @@
 # -*- coding: utf-8 -*-
 
 import os
+import ssl
 import sys
+import gzip
 import json
 import time
+import zlib
+import base64
+import shutil
+import asyncio
+import tempfile
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from getproxy.github_api import get_content, update_content, create_file
+import concurrent.futures
+from array import array
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from github_api import get_contents, update_content, create_file, commit_files, prune_files, default_client, \
+    git_blob_sha, GithubError, NotFoundError, RateLimitError
+from health_store import HealthStore, HEALTH_DB_PATH, UNKNOWN_LATENCY
+from judges import JudgePool, JUDGE_URLS, extract_origin, parse_http_response
+from metrics import metrics, METRICS_FILE
+from scheduler import RunScheduler, RUN_BUDGET
+import networks
+from networks import NETWORK_THROTTLE, NetworkThrottle, network_of, interleave
+from delta_feed import DELTA_FEED, DELTA_DIR, MANIFEST as DELTA_MANIFEST, update_feed
+from scoring import THROUGHPUT_SCORING, score_proxies
+import jsonl
+from keys import proxy_key, sql_key
+from spool import spool_db
+from sharding import (VALIDATION_SHARD, VALIDATION_REDUCE, VALIDATE_PROCESSES, PARTIAL_DIR, parse_shard,
+                      iter_shard, split_shards, shard_key, shard_store_path, write_partial, partial_paths)
 import requests
+import urllib3
 
 # Test configuration
 TEST_TIMEOUT = 5  # seconds
-TEST_URL = "http://httpbin.org/get"
+TEST_URL = JUDGE_URLS[0]  # First judge; see judges.JUDGE_URLS for the full pool
 MAX_WORKERS = 50  # Concurrent test threads
 MAX_RESPONSE_TIME = 3.0  # Max acceptable response time in seconds
 
+# Validation engine: "thread" (ThreadPoolExecutor + requests) or "async" (asyncio streams)
+VALIDATION_MODE = os.getenv('VALIDATION_MODE', 'thread')
+ASYNC_CONCURRENCY = int(os.getenv('ASYNC_CONCURRENCY', '1000'))  # Max in-flight async probes
+MAX_RESPONSE_BYTES = 64 * 1024  # Upper bound on a judge response body read by either engine
+BODY_CHUNK_BYTES = 16 * 1024  # Largest read between two deadline checks in the threaded engine
+
+# Stage 1: raw TCP connect pre-filter, run before the full HTTP/origin check
+TCP_PREFILTER = os.getenv('TCP_PREFILTER', '1') == '1'
+PREFILTER_TIMEOUT = float(os.getenv('PREFILTER_TIMEOUT', '1.5'))  # seconds
+PREFILTER_CONCURRENCY = int(os.getenv('PREFILTER_CONCURRENCY', '2000'))  # Max in-flight connects
+
+# Persistent health store: only probe fresh and stale proxies each run
+HEALTH_STORE = os.getenv('HEALTH_STORE', '1') == '1'
+
+# Adaptive deadlines: stop a probe as soon as it can no longer beat MAX_RESPONSE_TIME
+ADAPTIVE_TIMEOUTS = os.getenv('ADAPTIVE_TIMEOUTS', '1') == '1'
+MIN_CONNECT_TIMEOUT = 0.5  # seconds, floor for the tuned connect deadline
+CONNECT_TIMEOUT_FACTOR = 2.0  # Connect deadline = p95 of observed connect times * factor
+MIN_LATENCY_SAMPLES = 20  # Samples needed before the connect deadline is tuned
+LATENCY_WINDOW = 1000  # Most recent connect samples kept for tuning
+
+# Streaming pipeline: candidates are validated in batches and written straight to OUTPUT_DIR
+VALIDATE_BATCH = int(os.getenv('VALIDATE_BATCH', '5000'))  # Candidates held in memory at once
+MERGE_MEMORY_RECORDS = int(os.getenv('MERGE_MEMORY_RECORDS', '200000'))  # Unique proxies merged in memory before spilling to disk
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', 'output')
+OUTPUT_FILES = ('proxyinfo.json', 'proxyinfo.txt', 'db.json')
+
+# Outputs are ordered fastest first; tier files hold the proxies at or under each response_time threshold
+SORT_BY_LATENCY = os.getenv('SORT_BY_LATENCY', '1') == '1'  # 0: order by (host, port, type) as before
+LATENCY_TIERS = [float(t) for t in os.getenv('LATENCY_TIERS', '0.5,1,3').split(',') if t.strip()]  # seconds
+TIER_DIR = 'tiers'
+STATS_FILE = 'stats.json'  # Counts and latency percentiles of the written set
+STATS_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Optional sharded copy of proxyinfo.json next to the flat files: "" (off), "group" or "size"
+SHARD_LAYOUT = os.getenv('SHARD_LAYOUT', '')
+SHARD_GZIP = os.getenv('SHARD_GZIP', '1') == '1'
+SHARD_MAX_BYTES = int(os.getenv('SHARD_MAX_BYTES', str(512 * 1024)))  # Uncompressed budget per "size" shard
+SHARD_DIR = 'shards'
+
+# Publish all artifacts as one Git Data API commit instead of one contents PUT per file
+BATCH_COMMIT = os.getenv('BATCH_COMMIT', '1') == '1'
+
+# Per-stage counters of the last validation run: {stage: {"in": n, "out": n, "unfinished": n}}
+stage_counters = {}
+
 def parse_json_lines(content):
-    """Parse JSON lines into a list of objects"""
-    proxies = []
-    for line in content.strip().split('\n'):
-        line = line.strip()
-        if line:
-            try:
-                proxies.append(json.loads(line))
-            except:
-                pass
-    return proxies
+    """Parse JSON lines into a list of objects; malformed lines are counted and reported"""
+    return list(jsonl.iter_text(content))
+
+def iter_json_lines(lines, source="lines"):
+    """Lazily parse an iterable of JSON lines (e.g. an open file); malformed lines are counted and reported"""
+    return jsonl.iter_lines(lines, source=source)
+
+def iter_batches(iterable, size):
+    """Yield lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class LatencyTracker:
+    """Thread-safe record of connect latencies and early-cut probes in the current run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connect_samples = []
+        self._since_refresh = 0
+        self._connect_timeout = None
+        self.cut_early = 0
+        self.seconds_saved = 0.0
+
+    def add_connect_sample(self, seconds):
+        with self._lock:
+            self._connect_samples.append(seconds)
+            if len(self._connect_samples) > LATENCY_WINDOW:
+                del self._connect_samples[:len(self._connect_samples) - LATENCY_WINDOW]
+            self._since_refresh += 1
+
+    def record_cut(self, elapsed):
+        """
+        A probe was abandoned at its deadline. It only counts as cut early, saving the
+        rest of TEST_TIMEOUT, if it was abandoned before TEST_TIMEOUT was up.
+        """
+        if elapsed >= TEST_TIMEOUT:
+            return
+        with self._lock:
+            self.cut_early += 1
+            self.seconds_saved += TEST_TIMEOUT - elapsed
+
+    def deadlines(self):
+        """
+        Deadlines for the next probe
+        Returns: (connect_timeout, total_timeout)
+        """
+        if not ADAPTIVE_TIMEOUTS:
+            return TEST_TIMEOUT, TEST_TIMEOUT
+        total_timeout = min(TEST_TIMEOUT, MAX_RESPONSE_TIME)
+        with self._lock:
+            # Re-sort the window only every so often, not on every probe
+            if self._connect_timeout is None or self._since_refresh >= 50:
+                self._since_refresh = 0
+                if len(self._connect_samples) >= MIN_LATENCY_SAMPLES:
+                    ordered = sorted(self._connect_samples)
+                    p95 = ordered[int(len(ordered) * 0.95) - 1]
+                    self._connect_timeout = min(max(p95 * CONNECT_TIMEOUT_FACTOR, MIN_CONNECT_TIMEOUT), total_timeout)
+                else:
+                    self._connect_timeout = total_timeout
+            return self._connect_timeout, total_timeout
+
+latency_tracker = LatencyTracker()
+judge_pool = JudgePool(JUDGE_URLS)
+network_throttle = NetworkThrottle()
+network_baseline = {}  # Throttle counters at the start of the run
 
 def test_proxy(proxy):
     """
@@ -51,37 +182,555 @@ def test_proxy(proxy):
         'https': proxy_url
     }
 
+    judge_url = judge_pool.pick()
+    connect_timeout, total_timeout = latency_tracker.deadlines()
+    start_time = time.time()
     try:
-        start_time = time.time()
+        # Stream so a response whose headers already arrive too late is dropped unread
         response = requests.get(
-            TEST_URL,
+            judge_url,
             proxies=proxies,
-            timeout=TEST_TIMEOUT,
-            verify=False
+            timeout=(connect_timeout, total_timeout),
+            verify=False,
+            stream=True
         )
-        elapsed = time.time() - start_time
+        with response:
+            if ADAPTIVE_TIMEOUTS and time.time() - start_time > MAX_RESPONSE_TIME:
+                latency_tracker.record_cut(time.time() - start_time)
+                record_probe("too_slow", time.time() - start_time)
+                return proxy, False
 
-        # Check if proxy actually works
-        if response.status_code == 200:
-            response_json = response.json()
-
-            # Verify the proxy is actually routing through the proxy
-            origin = response_json.get('origin', '')
-            if host in origin and elapsed <= MAX_RESPONSE_TIME:
-                # Add actual response time
-                proxy_copy = proxy.copy()
-                proxy_copy['response_time'] = round(elapsed, 2)
-                return proxy_copy, True
+            if response.status_code == 200:
+                origin = extract_origin(_read_body(response, start_time + total_timeout))
+                elapsed = time.time() - start_time
+                judge_pool.report(judge_url, origin is not None, elapsed)
+                return check_probe_result(proxy, host, origin, elapsed)
 
+            judge_pool.report(judge_url, False)
+            record_probe("http_error", time.time() - start_time)
+        return proxy, False
+    except requests.exceptions.Timeout:
+        if ADAPTIVE_TIMEOUTS:
+            latency_tracker.record_cut(time.time() - start_time)
+        record_probe("timeout", time.time() - start_time)
         return proxy, False
     except Exception as e:
+        record_probe(failure_outcome(e), time.time() - start_time)
+        return proxy, False
+
+def _read_body(response, deadline):
+    """
+    Read a streamed response body, at most MAX_RESPONSE_BYTES, by a wall-clock deadline.
+    requests' read timeout bounds each socket read, not the whole body, so a proxy
+    trickling bytes would hold the worker indefinitely. read1() returns whatever has
+    arrived, up to BODY_CHUNK_BYTES, without waiting for a full chunk, so the clock is
+    checked whenever data arrives at the cost of one loop pass per chunk; a read that
+    stalls completely still ends at the read timeout.
+    Raises: requests.exceptions.ReadTimeout once the deadline has passed
+    """
+    body = bytearray()
+    raw = response.raw
+    while len(body) < MAX_RESPONSE_BYTES:
+        try:
+            chunk = raw.read1(BODY_CHUNK_BYTES, decode_content=True)
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e) from e
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e) from e
+        if not chunk:
+            break
+        body += chunk
+        if time.time() > deadline:
+            raise requests.exceptions.ReadTimeout("Response body not complete by the probe deadline")
+    return bytes(body[:MAX_RESPONSE_BYTES])
+
+def check_probe_result(proxy, host, origin, elapsed):
+    """
+    Decide whether the origin a judge saw proves the proxy works
+    Returns: (proxy, is_valid)
+    """
+    # Verify the proxy is actually routing through the proxy
+    valid = bool(origin) and host in origin and elapsed <= MAX_RESPONSE_TIME
+    if NETWORK_THROTTLE:
+        network_throttle.observe(host, origin, valid)
+    if valid:
+        record_probe("valid", elapsed)
+        # Add actual response time
+        proxy_copy = proxy.copy()
+        proxy_copy['response_time'] = round(elapsed, 2)
+        return proxy_copy, True
+    record_probe("too_slow" if origin and host in origin else "bad_origin", elapsed)
+    return proxy, False
+
+def throttled_test_proxy(proxy, deadline=None):
+    """
+    test_proxy within the per-host and per-network caps. A proxy whose host is skipped,
+    or whose slot only frees up after the deadline, is not probed: it is neither valid nor
+    failed, and the caller hands it back as unfinished. The slot goes back to the throttle
+    it came from, even if begin_validation replaced it while the probe ran (a probe
+    abandoned at a round deadline may outlive its round).
+    Returns: (proxy, is_valid), is_valid None when not probed
+    """
+    throttle = network_throttle
+    keys = throttle.acquire(proxy.get('host'), deadline)
+    if keys is None:
+        return proxy, None
+    try:
+        return test_proxy(proxy)
+    finally:
+        throttle.release(keys)
+
+async def throttled_async_test_proxy(proxy, semaphore, ssl_context=None):
+    """async_test_proxy within the per-host and per-network caps, see throttled_test_proxy"""
+    throttle = network_throttle
+    keys = await throttle.acquire_async(proxy.get('host'))
+    if keys is None:
+        return proxy, None
+    try:
+        return await async_test_proxy(proxy, semaphore, ssl_context)
+    finally:
+        throttle.release(keys)
+
+def record_probe(outcome, elapsed):
+    """Count one probe outcome (valid, timeout, refused, bad_origin, too_slow, http_error, error)"""
+    metrics.inc("probe_outcomes_total", outcome=outcome)
+    metrics.observe("probe_seconds", elapsed, outcome=outcome)
+
+def failure_outcome(error):
+    """Classify a failed probe by walking the exception chain: timeout, refused or error"""
+    while error is not None:
+        if isinstance(error, (TimeoutError, requests.exceptions.Timeout)):
+            return "timeout"
+        if isinstance(error, ConnectionRefusedError):
+            return "refused"
+        error = error.__cause__ or error.__context__
+    return "error"
+
+def _insecure_ssl_context():
+    """SSL context matching requests' verify=False"""
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+async def _fetch_via_proxy(host, port, ssl_context, url, connect_timeout):
+    """Send one absolute-form GET through an HTTP(S) proxy and read the full response"""
+    target = urlsplit(url)
+    connect_start = time.time()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, int(port), ssl=ssl_context),
+        timeout=connect_timeout
+    )
+    latency_tracker.add_connect_sample(time.time() - connect_start)
+    try:
+        request = (
+            f"GET {url} HTTP/1.1\r\n"
+            f"Host: {target.netloc}\r\n"
+            f"User-Agent: python-requests/{requests.__version__}\r\n"
+            "Accept: */*\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(request.encode('ascii'))
+        await writer.drain()
+        raw = await reader.read(MAX_RESPONSE_BYTES)
+        while len(raw) < MAX_RESPONSE_BYTES:
+            chunk = await reader.read(MAX_RESPONSE_BYTES - len(raw))
+            if not chunk:
+                break
+            raw += chunk
+        return parse_http_response(raw)
+    finally:
+        writer.close()
+
+async def async_test_proxy(proxy, semaphore, ssl_context=None):
+    """
+    Async counterpart of test_proxy, bounded by a shared semaphore
+    Returns: (proxy, is_valid)
+    """
+    host = proxy.get('host')
+    port = proxy.get('port')
+    proxy_type = proxy.get('type', 'http')
+
+    if not host or not port:
         return proxy, False
 
-def validate_proxies(proxies, max_workers=MAX_WORKERS):
+    # Same proxy URL scheme rules as test_proxy: https proxies are reached over TLS
+    use_tls = proxy_type.lower() == 'https'
+
+    async with semaphore:
+        # Absolute-form GET only works for http:// judges (https would need CONNECT)
+        judge_url = judge_pool.pick(http_only=True)
+        connect_timeout, total_timeout = latency_tracker.deadlines()
+        start_time = time.time()
+        try:
+            status_code, _, body = await asyncio.wait_for(
+                _fetch_via_proxy(host, port, ssl_context if use_tls else None, judge_url, connect_timeout),
+                timeout=total_timeout
+            )
+            elapsed = time.time() - start_time
+
+            if status_code == 200:
+                origin = extract_origin(body)
+                judge_pool.report(judge_url, origin is not None, elapsed)
+                return check_probe_result(proxy, host, origin, elapsed)
+
+            judge_pool.report(judge_url, False)
+            record_probe("http_error", elapsed)
+            return proxy, False
+        except asyncio.TimeoutError:
+            if ADAPTIVE_TIMEOUTS:
+                latency_tracker.record_cut(time.time() - start_time)
+            record_probe("timeout", time.time() - start_time)
+            return proxy, False
+        except Exception as e:
+            record_probe(failure_outcome(e), time.time() - start_time)
+            return proxy, False
+
+def record_stage(stage, count_in, count_out, unfinished=0):
+    """
+    Add one batch's counts to a validation stage. unfinished counts proxies that entered
+    the stage but were never checked (e.g. left at the run deadline); they are not dropped.
+    """
+    counter = stage_counters.setdefault(stage, {"in": 0, "out": 0, "unfinished": 0})
+    counter["in"] += count_in
+    counter["out"] += count_out
+    counter["unfinished"] += unfinished
+    metrics.inc("stage_proxies_total", count_in, stage=stage, side="in")
+    metrics.inc("stage_proxies_total", count_out, stage=stage, side="out")
+    if unfinished:
+        metrics.inc("stage_proxies_total", unfinished, stage=stage, side="unfinished")
+
+async def _tcp_connect(host, port, semaphore, timeout):
+    """Return True if host:port accepts a TCP connection within timeout"""
+    async with semaphore:
+        start_time = time.time()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout=timeout)
+        except Exception as e:
+            metrics.inc("prefilter_outcomes_total", outcome=failure_outcome(e))
+            return False
+        metrics.inc("prefilter_outcomes_total", outcome="reachable")
+        # Connect times seen here tune the probe connect deadline
+        latency_tracker.add_connect_sample(time.time() - start_time)
+        writer.close()
+        return True
+
+async def _tcp_prefilter(proxies, max_concurrency, timeout):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(*[
+        _tcp_connect(proxy['host'], proxy['port'], semaphore, timeout) for proxy in proxies
+    ])
+    return [proxy for proxy, reachable in zip(proxies, results) if reachable]
+
+def tcp_prefilter(proxies, max_concurrency=PREFILTER_CONCURRENCY, timeout=PREFILTER_TIMEOUT):
+    """
+    Cheap first pass: keep only proxies whose host:port accepts a TCP connection
+    Returns: list of reachable proxies
+    """
+    candidates = [proxy for proxy in proxies if proxy.get('host') and proxy.get('port')]
+    print(f"[*] TCP pre-filter: connecting to {len(candidates)} proxies (timeout={timeout}s, concurrency={max_concurrency})...")
+    if not candidates:
+        return []
+    return asyncio.run(_tcp_prefilter(candidates, max_concurrency, timeout))
+
+def _report_progress(completed, total):
+    """Print the progress line every 10 completions"""
+    if completed % 10 == 0 or completed == total:
+        print(f"[*] Progress: {completed}/{total} ({completed*100//total}%)")
+
+async def _validate_proxies_async(proxies, max_concurrency, deadline=None, unfinished=None):
+    """
+    Run async_test_proxy over all proxies with at most max_concurrency in flight.
+    At the deadline (epoch seconds) outstanding probes are cancelled; their proxies, and
+    the ones the network throttle skipped, are appended to unfinished.
+    """
+    valid_proxies = []
+    total = len(proxies)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    ssl_context = _insecure_ssl_context()
+
+    probe = throttled_async_test_proxy if NETWORK_THROTTLE else async_test_proxy
+    start = len(unfinished) if unfinished is not None else 0
+    tasks = [asyncio.ensure_future(probe(proxy, semaphore, ssl_context)) for proxy in proxies]
+    completed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=None if deadline is None else max(deadline - time.time(), 0)):
+            proxy, is_valid = await next_done
+            completed += 1
+            _report_progress(completed, total)
+
+            if is_valid:
+                valid_proxies.append(proxy)
+            elif is_valid is None and unfinished is not None:
+                unfinished.append(proxy)
+    except asyncio.TimeoutError:
+        # Probes that finished but were not yet collected still count
+        valid_proxies = []
+        if unfinished is not None:
+            del unfinished[start:]
+        for task, proxy in zip(tasks, proxies):
+            if task.done():
+                checked, is_valid = task.result()
+                if is_valid:
+                    valid_proxies.append(checked)
+                elif is_valid is None and unfinished is not None:
+                    unfinished.append(proxy)
+            else:
+                task.cancel()
+                if unfinished is not None:
+                    unfinished.append(proxy)
+        print(f"[-] Deadline reached: {total - completed} probes cancelled")
+
+    return valid_proxies
+
+def validate_proxies_async(proxies, max_concurrency=ASYNC_CONCURRENCY, deadline=None, unfinished=None):
+    """
+    Validate all proxies on a single asyncio event loop
+    Returns: list of valid proxies
+    """
+    total = len(proxies)
+    print(f"[*] Testing {total} proxies with up to {max_concurrency} async probes in flight...")
+    if not proxies:
+        valid_proxies = []
+    else:
+        valid_proxies = asyncio.run(_validate_proxies_async(proxies, max_concurrency, deadline, unfinished))
+
+    print(f"[✓] Validation complete: {len(valid_proxies)}/{total} proxies passed")
+    return valid_proxies
+
+def begin_validation(mode):
     """
-    Validate all proxies concurrently
+    Reset the trackers shared by all probes: stage counters, adaptive timeouts, judge pool
+    and network throttle. Called once per run, and by a long-running caller whenever its
+    trackers should stop reflecting old probes.
+    Raises: ValueError for an unknown mode
+    """
+    global latency_tracker, judge_pool, network_throttle, network_baseline
+    if mode not in ('thread', 'async'):
+        raise ValueError(f"Unknown VALIDATION_MODE: {mode}")
+    stage_counters.clear()
+    latency_tracker = LatencyTracker()
+    judge_pool = JudgePool(JUDGE_URLS)
+    network_throttle = NetworkThrottle()
+    network_baseline = networks.counters()
+
+def validate_batch(proxies, mode, max_workers, scale=1.0, deadline=None, unfinished=None):
+    """
+    Pre-filter and probe one batch of candidates, then with THROUGHPUT_SCORING score the
+    ones that passed. scale multiplies the thread or async concurrency; proxies whose
+    probe the deadline cut off or the network throttle skipped are appended to unfinished.
+    Call begin_validation first; end_validation prints what the batches since then saw.
     Returns: list of valid proxies
     """
+    candidates = proxies
+    if TCP_PREFILTER:
+        candidates = tcp_prefilter(proxies)
+        record_stage("tcp_connect", len(proxies), len(candidates))
+    if NETWORK_THROTTLE:
+        # Spread the batch over networks so the per-network caps rarely leave workers waiting
+        candidates = interleave(candidates)
+
+    cut_off = []
+    if mode == 'async':
+        valid_proxies = validate_proxies_async(candidates, max(int(ASYNC_CONCURRENCY * scale), 1), deadline, cut_off)
+    else:
+        valid_proxies = _validate_proxies_threaded(candidates, max(int(max_workers * scale), 1), deadline, cut_off)
+    if unfinished is not None:
+        unfinished.extend(cut_off)
+
+    record_stage("http_check", len(candidates), len(valid_proxies), len(cut_off))
+
+    if THROUGHPUT_SCORING and valid_proxies and (deadline is None or time.time() < deadline):
+        try:
+            judge_url = judge_pool.pick(http_only=True)
+        except ValueError as e:
+            print(f"[-] Warning: Throughput scoring skipped: {e}")
+        else:
+            scored = score_proxies(valid_proxies, judge_url, _insecure_ssl_context(), deadline=deadline)
+            record_stage("throughput", len(valid_proxies), len(scored))
+            valid_proxies = scored
+    return valid_proxies
+
+def end_validation():
+    """Print the stage, deadline and judge summaries since begin_validation"""
+    for stage, counter in stage_counters.items():
+        dropped = counter['in'] - counter['out'] - counter['unfinished']
+        unfinished = f", {counter['unfinished']} unfinished" if counter['unfinished'] else ""
+        print(f"[*] Stage {stage}: kept {counter['out']}/{counter['in']} (dropped {dropped}{unfinished})")
+    if ADAPTIVE_TIMEOUTS:
+        connect_timeout, total_timeout = latency_tracker.deadlines()
+        print(f"[*] Adaptive deadlines: connect={connect_timeout:.2f}s, total={total_timeout:.2f}s; "
+              f"{latency_tracker.cut_early} probes cut early, "
+              f"~{latency_tracker.seconds_saved:.1f} worker-seconds saved vs TEST_TIMEOUT={TEST_TIMEOUT}s")
+    for line in judge_pool.summary():
+        print(f"[*] Judge {line}")
+    if NETWORK_THROTTLE:
+        print(f"[*] Network throttle: {networks.summary(network_baseline)}")
+
+def _probe_shard(proxies, mode, max_workers, scale=1.0, deadline=None):
+    """
+    Worker-process entry: validate one shard of a batch. The worker's trackers are set up
+    once by begin_validation (the pool initializer) and keep learning across batches.
+    Returns: (valid proxies, unfinished proxies, stage counters, metrics snapshot, (cut_early, seconds_saved),
+    judge stats for this shard: answers counted since it started, current ewma and dropped flag)
+    """
+    stage_counters.clear()
+    metrics.reset()
+    cut_early, seconds_saved = latency_tracker.cut_early, latency_tracker.seconds_saved
+    answers = {url: (stat["ok"], stat["errors"]) for url, stat in judge_pool.stats.items()}
+    unfinished = []
+    valid_proxies = validate_batch(proxies, mode, max_workers, scale, deadline, unfinished)
+    judge_stats = {
+        url: {"ok": stat["ok"] - answers[url][0], "errors": stat["errors"] - answers[url][1],
+              "ewma": stat["ewma"], "dropped": stat["dropped"]}
+        for url, stat in judge_pool.stats.items()
+    }
+    return valid_proxies, unfinished, dict(stage_counters), metrics.snapshot(), \
+        (latency_tracker.cut_early - cut_early, latency_tracker.seconds_saved - seconds_saved), judge_stats
+
+def _validate_batch_processes(proxies, mode, max_workers, pool, processes, scale=1.0, deadline=None, unfinished=None):
+    """Split one batch across worker processes by shard and fold their counters back in"""
+    # Whole networks per worker, so each network's probe cap holds across processes
+    key = (lambda proxy: network_of(proxy.get('host'))) if NETWORK_THROTTLE else shard_key
+    futures = [pool.submit(_probe_shard, shard, mode, max_workers, scale, deadline)
+               for shard in split_shards(proxies, processes, key=key) if shard]
+    valid_proxies = []
+    for future in futures:
+        valid, cut_off, counters, snapshot, (cut_early, seconds_saved), judge_stats = future.result()
+        valid_proxies.extend(valid)
+        if unfinished is not None:
+            unfinished.extend(cut_off)
+        for stage, counter in counters.items():
+            total = stage_counters.setdefault(stage, {"in": 0, "out": 0, "unfinished": 0})
+            for side in total:
+                total[side] += counter[side]
+        metrics.merge(snapshot)
+        latency_tracker.cut_early += cut_early
+        latency_tracker.seconds_saved += seconds_saved
+        judge_pool.merge(judge_stats)
+    return valid_proxies
+
+def validate_proxies(proxies, max_workers=MAX_WORKERS, mode=None, processes=VALIDATE_PROCESSES):
+    """
+    Validate all proxies concurrently, in worker processes when processes > 1
+    Returns: list of valid proxies
+    """
+    return list(iter_validated(proxies, batch_size=max(len(proxies), 1), max_workers=max_workers,
+                               mode=mode, processes=processes))
+
+def iter_prioritized(proxies, store=None, scheduler=None, spool_dir=None):
+    """
+    Yield candidates in probe priority order (HealthStore.priority): proxies new from a
+    source first, then ones that passed last time by latency, then failing ones, so
+    whatever a run deadline leaves unprobed is the least valuable work.
+    Without a store every proxy counts as new, ordered by advertised response_time.
+    Spooled through an on-disk SQLite table; sets scheduler.total to the candidate count.
+    """
+    with spool_db(spool_dir) as db:
+        db.execute("CREATE TABLE queue (tier INTEGER, rank REAL, line TEXT)")
+        count = 0
+        for batch in iter_batches(proxies, 10000):
+            rows = []
+            for proxy in batch:
+                if store is not None:
+                    tier, rank = store.priority(proxy)
+                else:
+                    latency = proxy.get('response_time')
+                    tier, rank = 0, latency if isinstance(latency, (int, float)) else UNKNOWN_LATENCY
+                rows.append((tier, rank, json.dumps(proxy)))
+            db.executemany("INSERT INTO queue VALUES (?, ?, ?)", rows)
+            count += len(rows)
+        db.commit()
+        if scheduler is not None:
+            scheduler.total = count
+        for (line,) in db.execute("SELECT line FROM queue ORDER BY tier, rank, rowid"):
+            yield json.loads(line)
+
+def iter_validated(proxies, store=None, batch_size=VALIDATE_BATCH, max_workers=MAX_WORKERS, mode=None,
+                   processes=VALIDATE_PROCESSES, scheduler=None):
+    """
+    Validate a stream of candidates batch by batch, yielding valid proxies as each batch finishes.
+    With a health store, recently good proxies are yielded without being probed.
+    With processes > 1 each batch is split by shard over that many worker processes,
+    each running its own thread pool or event loop (max_workers threads per process).
+    With a RunScheduler, candidates are probed in priority order with concurrency scaled
+    to the time left; at the deadline probing stops. Proxies left unprobed, by the deadline
+    or by the network throttle, are kept only if the store saw them pass recently
+    (HealthStore.carry_over), and do not count as failures in the store.
+    """
+    mode = mode or VALIDATION_MODE
+    begin_validation(mode)
+    if scheduler is not None:
+        proxies = iter_prioritized(proxies, store, scheduler)
+    pool = None
+    if processes > 1:
+        print(f"[*] Validating in {processes} worker processes")
+        pool = ProcessPoolExecutor(processes, initializer=begin_validation, initargs=(mode,))
+    try:
+        for batch in iter_batches(proxies, batch_size):
+            to_probe, carried_over = batch, []
+            if store is not None:
+                to_probe, carried_over = store.select(batch)
+                # Carried-over proxies are kept without a probe; only those in backoff are dropped
+                record_stage("health_store", len(batch), len(to_probe) + len(carried_over))
+                for outcome, count in store.last_selection.items():
+                    metrics.inc("health_store_selected_total", count, outcome=outcome)
+
+            unfinished = []
+            if scheduler is not None and scheduler.expired():
+                # Out of time: the rest of the queue is only checked for carry-over
+                valid_proxies, unfinished = [], to_probe
+                record_stage("http_check", len(to_probe), 0, len(to_probe))
+            else:
+                scale = 1.0 if scheduler is None else scheduler.plan()
+                deadline = None if scheduler is None else scheduler.deadline
+                start_time = time.time()
+                if pool is not None:
+                    valid_proxies = _validate_batch_processes(to_probe, mode, max_workers, pool, processes,
+                                                              scale, deadline, unfinished)
+                else:
+                    valid_proxies = validate_batch(to_probe, mode, max_workers, scale, deadline, unfinished)
+                if scheduler is not None:
+                    scheduler.record_batch(len(to_probe) - len(unfinished), time.time() - start_time, scale)
+
+            probed = to_probe
+            if unfinished:
+                unfinished_keys = {proxy_key(proxy) for proxy in unfinished}
+                probed = [proxy for proxy in to_probe if proxy_key(proxy) not in unfinished_keys]
+                rescued = []
+                if store is not None:
+                    rescued = [proxy for proxy in map(store.carry_over, unfinished) if proxy is not None]
+                carried_over = carried_over + rescued
+                metrics.inc("deadline_unprobed_total", len(unfinished))
+                metrics.inc("deadline_carried_over_total", len(rescued))
+                if scheduler is not None:
+                    scheduler.unprobed += len(unfinished)
+                    scheduler.carried_over += len(rescued)
+
+            if store is not None:
+                store.update(probed, valid_proxies)
+            if scheduler is not None:
+                scheduler.processed += len(batch)
+
+            yield from valid_proxies
+            yield from carried_over
+    finally:
+        if pool is not None:
+            # Past the deadline, workers may still be finishing abandoned probes; don't wait for them
+            pool.shutdown(wait=scheduler is None or not scheduler.expired(), cancel_futures=True)
+    end_validation()
+    if store is not None:
+        print(f"[*] Health store totals: {store.summary()}")
+    if scheduler is not None:
+        print(f"[*] {scheduler.summary()}")
+
+def _validate_proxies_threaded(proxies, max_workers, deadline=None, unfinished=None):
+    """
+    Run test_proxy over all proxies in a thread pool.
+    At the deadline (epoch seconds) queued probes are cancelled and in-flight ones are
+    abandoned; their proxies, and the ones the network throttle skipped, are appended
+    to unfinished.
+    """
     valid_proxies = []
     total = len(proxies)
     print(f"[*] Testing {total} proxies with {max_workers} threads...")
@@ -89,38 +738,387 @@ def validate_proxies(proxies, max_workers=MAX_WORKERS):
     # Disable warnings
     requests.packages.urllib3.disable_warnings()
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    start = len(unfinished) if unfinished is not None else 0
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
         # Submit all tasks
-        future_to_proxy = {executor.submit(test_proxy, proxy): proxy for proxy in proxies}
+        if NETWORK_THROTTLE:
+            future_to_proxy = {executor.submit(throttled_test_proxy, proxy, deadline): proxy for proxy in proxies}
+        else:
+            future_to_proxy = {executor.submit(test_proxy, proxy): proxy for proxy in proxies}
 
         completed = 0
-        for future in as_completed(future_to_proxy):
-            proxy, is_valid = future.result()
-            completed += 1
-
-            if completed % 10 == 0 or completed == total:
-                print(f"[*] Progress: {completed}/{total} ({completed*100//total}%)")
+        try:
+            for future in as_completed(future_to_proxy, timeout=None if deadline is None else max(deadline - time.time(), 0)):
+                proxy, is_valid = future.result()
+                completed += 1
+                _report_progress(completed, total)
 
-            if is_valid:
-                valid_proxies.append(proxy)
+                if is_valid:
+                    valid_proxies.append(proxy)
+                elif is_valid is None and unfinished is not None:
+                    unfinished.append(proxy)
+        except concurrent.futures.TimeoutError:
+            # Probes that finished but were not yet collected still count
+            valid_proxies = []
+            if unfinished is not None:
+                del unfinished[start:]
+            for future, proxy in future_to_proxy.items():
+                if future.done() and not future.cancelled():
+                    checked, is_valid = future.result()
+                    if is_valid:
+                        valid_proxies.append(checked)
+                    elif is_valid is None and unfinished is not None:
+                        unfinished.append(proxy)
+                elif unfinished is not None:
+                    unfinished.append(proxy)
+            print(f"[-] Deadline reached: {total - completed} probes cancelled")
+    finally:
+        # At a deadline don't wait for in-flight probes; they end within TEST_TIMEOUT on their own
+        executor.shutdown(wait=deadline is None or time.time() < deadline, cancel_futures=True)
 
     print(f"[✓] Validation complete: {len(valid_proxies)}/{total} proxies passed")
     return valid_proxies
 
+def completeness(proxy):
+    """Number of fields carrying a value; the merge keeps the more complete record"""
+    score = 0
+    for value in proxy.values():
+        if value is not None and value != '' and value != [] and value != {}:
+            score += 1
+    return score
+
+class ProxyIndex:
+    """
+    Incremental dedupe index keyed by proxy_key.
+    Tie-break policy when the same key is added twice:
+        1. the record with the higher completeness() wins. A published record carries
+           response_time (and score fields) that a fresh scrape lacks, so in a merge of
+           ip_ports with proxy.list.out the published record usually wins
+        2. on equal completeness the later record wins
+    Output order is the order in which each key was first seen.
+    """
+
+    def __init__(self, proxies=()):
+        self._records = {}
+        self.update(proxies)
+
+    def add(self, proxy):
+        self.update((proxy,))
+
+    def update(self, proxies):
+        records = self._records
+        for proxy in proxies:
+            # proxy_key() inlined: this loop runs once per candidate
+            get = proxy.get
+            port = get('port')
+            if port.__class__ is str and port.isdigit():
+                port = int(port)
+            key = (get('host'), port, get('type', 'http'))
+
+            # Scores are only computed on a collision
+            current = records.get(key)
+            if current is None or completeness(proxy) >= completeness(current):
+                records[key] = proxy
+        return self
+
+    def get(self, key):
+        return self._records.get(key)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, key):
+        return key in self._records
+
+    def values(self):
+        return list(self._records.values())
+
+    def discard(self, key):
+        self._records.pop(key, None)
+
 def merge_proxies(existing_proxies, new_proxies):
-    """Merge proxy lists, removing duplicates"""
-    merged = {}
-    all_proxies = existing_proxies + new_proxies
+    """Merge proxy lists, removing duplicates (see ProxyIndex for the tie-break policy)"""
+    return ProxyIndex(existing_proxies).update(new_proxies).values()
 
-    for proxy in all_proxies:
-        # Create unique key based on host, port, and type
-        key = f"{proxy.get('host')}:{proxy.get('port')}:{proxy.get('type', 'http')}"
+def iter_merged(existing_proxies, new_proxies, spool_dir=None, memory_records=MERGE_MEMORY_RECORDS):
+    """
+    Streaming merge_proxies: same ProxyIndex tie-break policy and output order (the more
+    complete record wins, on a tie the one from new_proxies). Merged in a ProxyIndex while
+    it holds at most memory_records unique proxies; past that the index spills to an
+    on-disk SQLite table and the rest of the input is merged there, so memory stays flat
+    however large the input grows.
+    """
+    counts = [0, 0]
+    index = ProxyIndex()
+    sources = [iter_batches(existing_proxies, 10000), iter_batches(new_proxies, 10000)]
+    for position, batches in enumerate(sources):
+        for batch in batches:
+            counts[position] += len(batch)
+            index.update(batch)
+            if len(index) > memory_records:
+                spooled = _iter_spooled_merge(index, sources, position, counts, spool_dir)
+                index = None  # Only the spool holds the records from here on
+                yield from spooled
+                return
+    _print_merge_counts(counts, len(index))
+    yield from index.values()
+
+def _iter_spooled_merge(index, sources, position, counts, spool_dir):
+    """iter_merged past the memory budget: continue from sources[position] on disk"""
+    with spool_db(spool_dir) as db:
+        db.execute("CREATE TABLE merged (host, port, type, score INTEGER, line BLOB, PRIMARY KEY (host, port, type))")
+        # Keys are unique and in first-seen order, so rowids continue ProxyIndex order
+        for batch in iter_batches(index.values(), 10000):
+            db.executemany("INSERT INTO merged VALUES (?, ?, ?, ?, ?)",
+                           [sql_key(proxy) + (completeness(proxy), jsonl.dumps(proxy)) for proxy in batch])
+        del index
+        for source in range(position, len(sources)):
+            for batch in sources[source]:
+                counts[source] += len(batch)
+                # Rowid is fixed by the first insert of a key, preserving merge_proxies order
+                db.executemany(
+                    "INSERT INTO merged VALUES (?, ?, ?, ?, ?) ON CONFLICT(host, port, type) DO UPDATE "
+                    "SET score = excluded.score, line = excluded.line WHERE excluded.score >= merged.score",
+                    [sql_key(proxy) + (completeness(proxy), jsonl.dumps(proxy)) for proxy in batch]
+                )
+        db.commit()
+
+        _print_merge_counts(counts, db.execute('SELECT COUNT(*) FROM merged').fetchone()[0])
+        for (line,) in db.execute("SELECT line FROM merged ORDER BY rowid"):
+            yield jsonl.loads(line)
+
+def _print_merge_counts(counts, unique):
+    print(f"[*] Found {counts[0]} existing proxies")
+    print(f"[*] Found {counts[1]} new proxies")
+    print(f"[*] Merged to {unique} unique proxies")
+
+def response_time(proxy):
+    """A proxy's response_time, or None if it has no numeric one"""
+    latency = proxy.get('response_time')
+    return latency if isinstance(latency, (int, float)) and not isinstance(latency, bool) else None
+
+def iter_sorted(proxies, spool_dir=None, by_latency=None):
+    """
+    Yield proxies fastest first (no response_time last), ties broken by (host, port, type),
+    or only by (host, port, type) with by_latency=False. Either order is total, so unchanged
+    data produces byte-identical artifacts run after run. Sorting happens in an on-disk
+    SQLite table to keep memory flat.
+    """
+    by_latency = SORT_BY_LATENCY if by_latency is None else by_latency
+    with spool_db(spool_dir) as db:
+        db.execute("CREATE TABLE sorted (latency REAL, host, port, type, line TEXT)")
+        for batch in iter_batches(proxies, 10000):
+            db.executemany("INSERT INTO sorted VALUES (?, ?, ?, ?, ?)", [
+                (response_time(proxy),) + sql_key(proxy) + (json.dumps(proxy),)
+                for proxy in batch
+            ])
+        db.commit()
+        order = "latency IS NULL, latency, host, port, type, line" if by_latency else "host, port, type, line"
+        for (line,) in db.execute(f"SELECT line FROM sorted ORDER BY {order}"):
+            yield json.loads(line)
+
+def tier_name(threshold):
+    """Repo path of the tier file for a response_time threshold in seconds"""
+    return f"{TIER_DIR}/max-{threshold:g}s.json"
+
+def output_names(tiers=None):
+    """
+    Repo paths written by write_outputs
+    Returns: flat files, tier files, stats sidecar
+    """
+    tiers = LATENCY_TIERS if tiers is None else tiers
+    return list(OUTPUT_FILES) + [tier_name(threshold) for threshold in tiers] + [STATS_FILE]
+
+class OutputStats:
+    """Counts and latency figures of a proxy stream, gathered while it is written"""
 
-        # Keep the proxy with more complete information
-        if key not in merged or len(json.dumps(proxy)) > len(json.dumps(merged[key])):
-            merged[key] = proxy
+    def __init__(self, tiers=()):
+        self.count = 0
+        self.by_type = {}
+        self.by_anonymity = {}
+        self.by_type_anonymity = {}  # Keyed like the db.json groups and "group" shards: type_anonymity
+        self.by_country = {}
+        self.latencies = array('d')
+        self.tiers = {threshold: 0 for threshold in tiers}
 
-    return list(merged.values())
+    def add(self, proxy):
+        self.count += 1
+        proxy_type, anonymity = proxy.get('type', 'http'), proxy.get('anonymity', 'transparent')
+        for counts, value in ((self.by_type, proxy_type),
+                              (self.by_anonymity, anonymity),
+                              (self.by_type_anonymity, f"{proxy_type}_{anonymity}"),
+                              (self.by_country, proxy.get('country') or '--')):
+            counts[value] = counts.get(value, 0) + 1
+        latency = response_time(proxy)
+        if latency is not None:
+            self.latencies.append(latency)
+            for threshold in self.tiers:
+                if latency <= threshold:
+                    self.tiers[threshold] += 1
+
+    def to_dict(self):
+        ordered = sorted(self.latencies)  # Already sorted when the stream is latency-ordered: a linear pass
+        latency = {"samples": len(ordered), "unknown": self.count - len(ordered)}
+        if ordered:
+            latency.update({"min": ordered[0], "max": ordered[-1], "mean": round(sum(ordered) / len(ordered), 3)})
+            for fraction in STATS_PERCENTILES:
+                latency[f"p{fraction * 100:g}"] = ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+        return {
+            "count": self.count,
+            "sorted_by": "response_time" if SORT_BY_LATENCY else "host",
+            "by_type": self.by_type,
+            "by_anonymity": self.by_anonymity,
+            "by_type_anonymity": self.by_type_anonymity,
+            "by_country": self.by_country,
+            "latency": latency,
+            "tiers": [{"path": tier_name(threshold), "max_response_time": threshold, "count": count}
+                      for threshold, count in self.tiers.items()],
+        }
+
+def write_outputs(proxies, out_dir=OUTPUT_DIR, tiers=None):
+    """
+    Write proxyinfo.json, proxyinfo.txt, db.json, the latency tier files and the stats
+    sidecar in one pass over a proxy stream. Fed by iter_sorted, every file is fastest
+    first, so a consumer can stop reading once proxies get too slow for it.
+    db.json groups are spooled to one temp file each and stitched together at the end,
+    producing the same bytes as generate_db_json.
+    Returns: number of proxies written
+    """
+    tiers = sorted(LATENCY_TIERS if tiers is None else tiers)
+    os.makedirs(out_dir, exist_ok=True)
+    if tiers:
+        os.makedirs(os.path.join(out_dir, TIER_DIR), exist_ok=True)
+    count = 0
+    groups = {}
+    stats = OutputStats(tiers)
+    tier_files = []
+    group_dir = tempfile.mkdtemp(dir=out_dir)
+    try:
+        tier_files = [(threshold, open(os.path.join(out_dir, tier_name(threshold)), 'w')) for threshold in tiers]
+        with open(os.path.join(out_dir, 'proxyinfo.json'), 'w') as json_file, \
+                open(os.path.join(out_dir, 'proxyinfo.txt'), 'w') as txt_file:
+            for proxy in proxies:
+                count += 1
+                line = json.dumps(proxy) + '\n'
+                json_file.write(line)
+                stats.add(proxy)
+                latency = response_time(proxy)
+                if latency is not None:
+                    for threshold, tier_file in tier_files:
+                        if latency <= threshold:
+                            tier_file.write(line)
+
+                host = proxy.get('host')
+                port = proxy.get('port')
+                if host and port:
+                    txt_file.write(f"{host}:{port}\n")
+
+                key = f"{proxy.get('type', 'http')}_{proxy.get('anonymity', 'transparent')}"
+                proxy_copy = {k: v for k, v in proxy.items() if k != 'export_address'}
+                if key not in groups:
+                    groups[key] = open(os.path.join(group_dir, str(len(groups))), 'w+')
+                else:
+                    groups[key].write(',\n')
+                groups[key].write('    ' + json.dumps(proxy_copy, indent=2).replace('\n', '\n    '))
+
+            if count == 0:
+                json_file.write('\n')
+                txt_file.write('\n')
+            for threshold, tier_file in tier_files:
+                if not stats.tiers[threshold]:
+                    tier_file.write('\n')
+
+        with open(os.path.join(out_dir, 'db.json'), 'w') as db_file:
+            if not groups:
+                db_file.write('{}')
+            else:
+                db_file.write('{\n')
+                for index, (key, group_file) in enumerate(groups.items()):
+                    db_file.write(f'  {json.dumps(key)}: [\n')
+                    group_file.seek(0)
+                    shutil.copyfileobj(group_file, db_file)
+                    db_file.write('\n  ]' + (',\n' if index < len(groups) - 1 else '\n'))
+                db_file.write('}')
+
+        # No timestamp: unchanged data must keep producing the same bytes
+        with open(os.path.join(out_dir, STATS_FILE), 'w') as stats_file:
+            stats_file.write(json.dumps(stats.to_dict(), indent=2, sort_keys=True))
+    finally:
+        for group_file in groups.values():
+            group_file.close()
+        for _, tier_file in tier_files:
+            tier_file.close()
+        shutil.rmtree(group_dir, ignore_errors=True)
+    return count
+
+def shard_bucket_count(total_bytes, max_bytes=SHARD_MAX_BYTES):
+    """
+    Number of hash buckets for the "size" layout: the smallest power of two keeping the
+    average shard under max_bytes. It only changes when the data doubles or halves, and
+    then every bucket splits (or pairs up) cleanly, so most shards keep their content.
+    """
+    count = 1
+    while total_bytes > count * max_bytes:
+        count *= 2
+    return count
+
+def write_shards(out_dir=OUTPUT_DIR, layout=SHARD_LAYOUT, use_gzip=SHARD_GZIP, max_bytes=SHARD_MAX_BYTES):
+    """
+    Split the proxyinfo.json written by write_outputs into JSON-lines shards under
+    out_dir/shards, plus an index.json manifest listing each shard's path, record count,
+    size and git blob sha. layout "group" makes one shard per type_anonymity (the db.json
+    groups); "size" hashes (host, port, type) into shard_bucket_count buckets, so a proxy
+    stays in the same shard between runs and only shards whose members changed differ.
+    gzip output is byte-for-byte reproducible (no timestamp in the header).
+    Returns: repo paths of the shards followed by the manifest
+    """
+    if layout not in ("group", "size"):
+        raise ValueError(f"Unknown shard layout: {layout!r}")
+    source = os.path.join(out_dir, 'proxyinfo.json')
+    shard_dir = os.path.join(out_dir, SHARD_DIR)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.makedirs(shard_dir)
+
+    buckets = shard_bucket_count(os.path.getsize(source), max_bytes) if layout == "size" else 0
+    suffix = '.jsonl.gz' if use_gzip else '.jsonl'
+    shards = {}
+    try:
+        with open(source, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                proxy = json.loads(line)
+                if layout == "group":
+                    name = f"{proxy.get('type', 'http')}_{proxy.get('anonymity', 'transparent')}"
+                else:
+                    key = f"{proxy.get('host')}:{proxy.get('port')}:{proxy.get('type', 'http')}"
+                    name = f"part-{zlib.crc32(key.encode('utf-8')) % buckets:04d}"
+                if name not in shards:
+                    path = os.path.join(shard_dir, name + suffix)
+                    shards[name] = [gzip.GzipFile(path, 'wb', mtime=0) if use_gzip else open(path, 'wb'), 0]
+                shards[name][0].write(line.encode('utf-8'))
+                shards[name][1] += 1
+    finally:
+        for shard_file, _ in shards.values():
+            shard_file.close()
+
+    entries = []
+    for name in sorted(shards):
+        path = f"{SHARD_DIR}/{name}{suffix}"
+        with open(os.path.join(out_dir, path), 'rb') as f:
+            data = f.read()
+        entries.append({"path": path, "count": shards[name][1], "bytes": len(data), "sha": git_blob_sha(data)})
+    manifest = {
+        "layout": layout,
+        "gzip": use_gzip,
+        "count": sum(entry["count"] for entry in entries),
+        "shards": entries,
+    }
+    index_path = f"{SHARD_DIR}/index.json"
+    with open(os.path.join(out_dir, index_path), 'w') as f:
+        f.write(json.dumps(manifest, indent=2))
+    return [entry["path"] for entry in entries] + [index_path]
 
 def generate_proxyinfo_json(proxies):
     """Generate proxyinfo.json (JSON lines format)"""
@@ -156,92 +1154,114 @@ def generate_db_json(proxies):
 
     return json.dumps(db, indent=2)
 
-def validate_merge_and_upload(token):
+def read_output(name, out_dir=OUTPUT_DIR):
+    """Read one generated artifact back for upload; gzip shards come back as bytes"""
+    with open(os.path.join(out_dir, name), 'rb' if name.endswith('.gz') else 'r') as f:
+        return f.read()
+
+def reduce_partials(directory=PARTIAL_DIR, out_dir=OUTPUT_DIR):
     """
-    Download existing data from ip_ports, merge with new data,
-    validate proxies through testing, and upload only valid ones
+    Reduce step of sharded validation: union the partial results written by the shard
+    runners (deduplicated like any merge) and write the sorted outputs
+    Returns: number of proxies written
     """
-    print("[*] Starting validation, merge and upload process...")
+    paths = partial_paths(directory)
+    print(f"[*] Reducing {len(paths)} partial results from {directory}/")
+
+    def iter_partial_proxies():
+        for path in paths:
+            yield from jsonl.iter_file(path)
 
+    return write_outputs(iter_sorted(iter_merged(iter([]), iter_partial_proxies())), out_dir)
+
+def validate_and_write(token, shard=None, scheduler=None):
+    """
+    Download existing data from ip_ports, merge with new data and validate, within the
+    scheduler's run budget if one is given.
+    Without a shard, the sorted outputs are written to OUTPUT_DIR; with shard=(index, count)
+    only that shard is validated and its valid proxies are written as a partial.
+    Returns: number of proxies written, or None if there is no candidate list
+    """
     # Download existing data from ip_ports
     print("[*] Downloading existing data from ip_ports...")
     try:
-        existing_json = get_content("parserpp", "ip_ports", "/proxyinfo.json", token)
-        existing_txt = get_content("parserpp", "ip_ports", "/proxyinfo.txt", token)
-        existing_db = get_content("parserpp", "ip_ports", "/db.json", token)
+        # Only proxyinfo.json is merged; the txt and db.json outputs are regenerated from it.
+        # Served from the local ETag cache when unchanged since the last run
+        with metrics.timer("download"):
+            existing_json = get_contents("parserpp", "ip_ports", ["/proxyinfo.json"], token)["/proxyinfo.json"]
         print("[✓] Downloaded existing data")
-    except Exception as e:
+    except GithubError as e:
         print(f"[-] Warning: Could not download existing data: {e}")
         print("    Will create new files from scratch")
         existing_json = ""
-        existing_txt = ""
-        existing_db = "{}"
-
-    # Parse existing data
-    existing_proxies = parse_json_lines(existing_json)
-    print(f"[*] Found {len(existing_proxies)} existing proxies")
 
     # Read new data from proxy.list.out
     if not os.path.exists('proxy.list.out'):
         print("[-] Error: proxy.list.out not found")
-        return False
-
-    with open('proxy.list.out', 'r') as f:
-        new_json = f.read()
+        return None
 
-    new_proxies = parse_json_lines(new_json)
-    print(f"[*] Found {len(new_proxies)} new proxies")
+    store = None
+    if HEALTH_STORE:
+        # Each shard runner caches its own store; sticky shards keep it relevant between runs
+        with metrics.timer("health_store"):
+            store = HealthStore.load(HEALTH_DB_PATH if shard is None else shard_store_path(HEALTH_DB_PATH, shard[0]))
 
-    # Merge proxies (without validation first to reduce API calls)
-    merged_proxies = merge_proxies(existing_proxies, new_proxies)
-    print(f"[*] Merged to {len(merged_proxies)} unique proxies")
-
-    # Validate ALL proxies through testing
-    print(f"[*] Starting proxy validation (timeout={TEST_TIMEOUT}s, max_response_time={MAX_RESPONSE_TIME}s)...")
-    valid_proxies = validate_proxies(merged_proxies, MAX_WORKERS)
+    # Stream parse -> merge -> validate -> write; recently good proxies are carried over by the store.
+    # Each stage is timed on the items it produces, so nested generators are not double counted.
+    print(f"[*] Starting proxy validation (mode={VALIDATION_MODE}, judges={len(JUDGE_URLS)}, timeout={TEST_TIMEOUT}s, max_response_time={MAX_RESPONSE_TIME}s)...")
+    # mmap-backed, parallel for large files; malformed lines are counted and reported
+    existing_proxies = metrics.timed_iter("parse", jsonl.iter_text(existing_json, source="proxyinfo.json"))
+    new_proxies = metrics.timed_iter("parse", jsonl.iter_file('proxy.list.out'))
+    merged_proxies = metrics.timed_iter("merge", iter_merged(existing_proxies, new_proxies))
+    if shard is not None:
+        print(f"[*] Validating shard {shard[0]} of {shard[1]}")
+        merged_proxies = iter_shard(merged_proxies, *shard)
+    valid_proxies = metrics.timed_iter("validate", iter_validated(merged_proxies, store, scheduler=scheduler))
+    with metrics.timer("generate"):
+        if shard is not None:
+            # Unsorted: the reduce step sorts the union
+            valid_count = write_partial(valid_proxies, shard[0])
+            print(f"[*] Wrote {valid_count} validated proxies to {PARTIAL_DIR}/")
+        else:
+            valid_count = write_outputs(metrics.timed_iter("sort", iter_sorted(valid_proxies)), OUTPUT_DIR)
+            print(f"[*] Wrote {valid_count} validated proxies to {OUTPUT_DIR}/")
 
-    if not valid_proxies:
-        print("[-] No valid proxies found. Nothing to upload.")
-        return False
+    if store is not None:
+        try:
+            with metrics.timer("health_store"):
+                store.save()
+        except OSError as e:
+            print(f"[-] Warning: Could not save health store: {e}")
+    return valid_count
 
-    # Generate output files from VALID proxies only
-    print("[*] Generating output files from validated proxies...")
-    proxyinfo_json = generate_proxyinfo_json(valid_proxies)
-    proxyinfo_txt = generate_proxyinfo_txt(valid_proxies)
-    db_json = generate_db_json(valid_proxies)
+def validate_merge_and_upload(token):
+    """
+    Download existing data from ip_ports, merge with new data,
+    validate proxies through testing, and upload only valid ones.
+    With VALIDATION_SHARD set, only validate one shard and leave a partial for the
+    reduce step; with VALIDATION_REDUCE set, upload the union of the partials.
+    """
+    print("[*] Starting validation, merge and upload process...")
+    # Validation stops early enough to leave UPLOAD_RESERVE for writing and uploading
+    scheduler = RunScheduler() if RUN_BUDGET > 0 else None
 
-    # Upload files to ip_ports
-    print("[*] Uploading proxyinfo.json...")
-    try:
-        success, status = upload_or_create(
-            "parserpp", "ip_ports", "/proxyinfo.json", token,
-            proxyinfo_json, "GitHubAction: Update validated proxy list"
-        )
-        print(f"[✓] {status} proxyinfo.json")
-    except Exception as e:
-        print(f"[-] Failed to upload proxyinfo.json: {e}")
-        return False
+    shard = parse_shard(VALIDATION_SHARD)
+    if VALIDATION_REDUCE:
+        with metrics.timer("generate"):
+            valid_count = reduce_partials()
+    else:
+        valid_count = validate_and_write(token, shard, scheduler)
+        if valid_count is None:
+            return False
+        if shard is not None:
+            # Uploading is left to the reduce step
+            return True
 
-    print("[*] Uploading proxyinfo.txt...")
-    try:
-        success, status = upload_or_create(
-            "parserpp", "ip_ports", "/proxyinfo.txt", token,
-            proxyinfo_txt, "GitHubAction: Update validated proxy list"
-        )
-        print(f"[✓] {status} proxyinfo.txt")
-    except Exception as e:
-        print(f"[-] Failed to upload proxyinfo.txt: {e}")
+    if not valid_count:
+        print("[-] No valid proxies found. Nothing to upload.")
         return False
 
-    print("[*] Uploading db.json...")
-    try:
-        success, status = upload_or_create(
-            "parserpp", "ip_ports", "/db.json", token,
-            db_json, "GitHubAction: Update validated proxy list"
-        )
-        print(f"[✓] {status} db.json")
-    except Exception as e:
-        print(f"[-] Failed to upload db.json: {e}")
+    if not publish_outputs(token):
         return False
 
     # Clean up local files
@@ -256,24 +1276,132 @@ def validate_merge_and_upload(token):
     except Exception as e:
         print(f"[-] Warning: Failed to delete local files: {e}")
 
-    print(f"[*] All tasks completed successfully! Uploaded {len(valid_proxies)} validated proxies.")
+    print_github_stats()
+    print(f"[*] All tasks completed successfully! Uploaded {valid_count} validated proxies.")
     return True
 
+def publish_outputs(token):
+    """
+    Upload the outputs written to OUTPUT_DIR to ip_ports, with shards and the delta
+    feed when enabled: one atomic commit, falling back to per-file contents PUTs
+    Returns: True if everything was published
+    """
+    # Flat files, tiers and stats always; shards (manifest last) when a sharded layout is enabled
+    upload_names = output_names()
+    if SHARD_LAYOUT:
+        with metrics.timer("generate"):
+            shard_names = write_shards(OUTPUT_DIR)
+        print(f"[*] Wrote {len(shard_names) - 1} {SHARD_LAYOUT} shards to {OUTPUT_DIR}/{SHARD_DIR}/")
+        upload_names += shard_names
+
+    # Delta feed against the snapshot being replaced (a 304 from the download cache)
+    delta_names, kept_deltas = [], []
+    if DELTA_FEED:
+        def fetch(paths):
+            contents = get_contents("parserpp", "ip_ports", ["/" + path for path in paths], token)
+            return {path: contents["/" + path] for path in paths}
+
+        try:
+            with metrics.timer("download"):
+                published = fetch(["proxyinfo.json", DELTA_MANIFEST])
+            with metrics.timer("generate"):
+                delta_names, kept_deltas = update_feed(OUTPUT_DIR, published["proxyinfo.json"],
+                                                       published[DELTA_MANIFEST], fetch)
+        except GithubError as e:
+            print(f"[-] Warning: Could not update the delta feed, skipping it this run: {e}")
+        upload_names += delta_names
+
+    # Upload files to ip_ports: one atomic commit, falling back to per-file contents PUTs
+    commit_msg = "GitHubAction: Update validated proxy list"
+    commit_sha = ""
+    # Shards and tiers not written this run are removed, also when the layout or the tiers were
+    # switched off since the last run. Deltas compacted or expired out of the feed go too, and
+    # the whole feed once DELTA_FEED is off; after a failed feed update it stays
+    prune = (SHARD_DIR + "/", TIER_DIR + "/") + ((DELTA_DIR + "/",) if delta_names or not DELTA_FEED else ())
+    if BATCH_COMMIT:
+        print(f"[*] Committing {len(upload_names)} files in one commit...")
+        files = {name: read_output(name) for name in upload_names}
+        # In the same commit: the remote tree lists them either way, so pruning costs no extra call
+        try:
+            with metrics.timer("upload"):
+                commit_sha = commit_files("parserpp", "ip_ports", files, token, commit_msg,
+                                          _prune_prefix=prune, _keep=kept_deltas)
+            print(f"[✓] Published {len(upload_names)} files, ip_ports is at {commit_sha[:7]}")
+        except RateLimitError as e:
+            # Per-file uploads would need more calls than the commit, not fewer
+            print(f"[-] Warning: {e}; deferring the publish to the next run")
+            return False
+        except GithubError as e:
+            print(f"[-] Batch commit failed ({e}), falling back to per-file upload")
+        files = None
+
+    if not commit_sha:
+        for name in upload_names:
+            print(f"[*] Uploading {name}...")
+            with metrics.timer("upload"):
+                success, status = upload_or_create(
+                    "parserpp", "ip_ports", "/" + name, token,
+                    read_output(name), commit_msg
+                )
+            if not success:
+                print(f"[-] Failed to upload {name}: {status}")
+                return False
+            print(f"[✓] {status} {name}")
+        # After the uploads, so consumers never see a manifest pointing at deleted files
+        try:
+            with metrics.timer("upload"):
+                pruned = prune_files("parserpp", "ip_ports", prune, upload_names + kept_deltas, token, commit_msg)
+        except GithubError as e:
+            print(f"[-] Warning: Could not prune stale files: {e}")
+        else:
+            if pruned:
+                print(f"[✓] Deleted {len(pruned)} files no longer published")
+    return True
+
+def print_github_stats():
+    """Print the GitHub client's connection reuse, skipped uploads and rate-limit figures"""
+    stats = default_client().stats()
+    saved = "" if stats['latency_saved_seconds'] is None else \
+        f", ~{stats['latency_saved_seconds']:.2f}s at {stats['handshake_seconds'] * 1000:.0f} ms per connection setup"
+    print(f"[*] GitHub API: {stats['requests']} requests over {stats['connections']} connections "
+          f"({stats['handshakes_saved']} TCP/TLS handshakes saved by keep-alive{saved})")
+    print(f"[*] Unchanged artifacts: {stats['files_skipped']} files / {stats['bytes_skipped']} bytes "
+          f"not re-uploaded, {stats['calls_skipped']} API calls saved")
+    if stats['rate_limited'] or stats['rate_wait_seconds']:
+        print(f"[*] GitHub rate limit: {stats['rate_limited']} throttled responses, "
+              f"{stats['rate_wait_seconds']}s spent waiting")
+
+def report_metrics(run_seconds, path=METRICS_FILE):
+    """Print where the run's time went and write the metrics file"""
+    metrics.inc("run_seconds_total", run_seconds)
+    stages = metrics.stage_seconds()
+    untimed = max(run_seconds - sum(stages.values()), 0.0)
+    timings = [f"{stage} {seconds:.1f}s" for stage, seconds in stages.items()] + [f"other {untimed:.1f}s"]
+    print(f"[*] Run took {run_seconds:.1f}s: {', '.join(timings)}")
+    try:
+        metrics.write(path)
+        if path:
+            print(f"[*] Metrics written to {path}")
+    except OSError as e:
+        print(f"[-] Warning: Could not write metrics: {e}")
+
 def upload_or_create(owner, repo, path, token, content, commit_msg):
-    """Try to update file, if it doesn't exist, create it"""
+    """Try to update file, if it doesn't exist, create it; bytes content is sent as-is"""
+    if isinstance(content, bytes):
+        content_kwargs = {"_content_base64ed": str(base64.b64encode(content), "utf-8")}
+    else:
+        content_kwargs = {"_content_not_base64": content}
     try:
-        update_content(owner, repo, path, _token=token, _content_not_base64=content, _commit_msg=commit_msg)
+        update_content(owner, repo, path, _token=token, _commit_msg=commit_msg, **content_kwargs)
         return True, "Updated"
-    except Exception as e:
-        error_msg = str(e)
-        if "'sha'" in error_msg or "Not Found" in error_msg or "does not exist" in error_msg:
-            try:
-                create_file(owner, repo, path, _token=token, _content_not_base64=content, _commit_msg=commit_msg)
-                return True, "Created"
-            except Exception as e2:
-                return False, f"Failed to create: {e2}"
-        else:
-            return False, f"Failed to update: {error_msg}"
+    except NotFoundError:
+        try:
+            create_file(owner, repo, path, _token=token, _commit_msg=commit_msg, **content_kwargs)
+            return True, "Created"
+        except GithubError as e:
+            return False, f"Failed to create: {e}"
+    except GithubError as e:
+        return False, f"Failed to update: {e}"
 
 if __name__ == "__main__":
     token = os.getenv('GTOKEN') or os.getenv('GITHUB_TOKEN')
@@ -281,5 +1409,9 @@ if __name__ == "__main__":
         print("[-] Error: No GitHub token found")
         sys.exit(1)
 
-    success = validate_merge_and_upload(token)
+    run_start = time.perf_counter()
+    try:
+        success = validate_merge_and_upload(token)
+    finally:
+        report_metrics(time.perf_counter() - run_start)
     sys.exit(0 if success else 1)
\ No newline at end of file